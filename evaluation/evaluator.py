@@ -5,6 +5,8 @@ Evaluator for comparing agent output with SWDE groundtruth
 import json
 from pathlib import Path
 from typing import Dict, List, Any, Optional
+from web2json.utils.result_store import iter_results
+
 from .groundtruth_loader import GroundtruthLoader
 from .metrics import ExtractionMetrics
 
@@ -250,7 +252,7 @@ class SWDEEvaluator:
         Args:
             vertical: Vertical name
             website: Website name
-            output_dir: Directory containing agent output JSON files
+            output_dir: Agent result directory (per-page JSON files or result shards)
 
         Returns:
             Evaluation results for this website
@@ -262,23 +264,15 @@ class SWDEEvaluator:
         page_results = []
         errors = []
 
-        for page_id in sorted(page_ids):
-            # Look for agent output file
-            json_file = output_dir / f"{page_id}.json"
-
-            if not json_file.exists():
-                errors.append({
-                    'page_id': page_id,
-                    'error': 'Output file not found'
-                })
-                continue
+        # Agent output keyed by source page id (the stem of the result file or of the source HTML path)
+        agent_outputs = {Path(source).stem: data for source, data in iter_results(output_dir) if source}
 
-            # Load agent output
-            agent_output = self.load_agent_output(json_file)
+        for page_id in sorted(page_ids):
+            agent_output = agent_outputs.get(page_id)
             if agent_output is None:
                 errors.append({
                     'page_id': page_id,
-                    'error': 'Failed to parse JSON'
+                    'error': 'Output not found'
                 })
                 continue
 
@@ -27,6 +27,7 @@ from evaluation.evaluator import SWDEEvaluator
 from evaluation.visualization import EvaluationReporter
 from evaluation.schema_generator import SchemaGenerator
 from web2json.config.settings import settings
+from web2json.utils.result_store import result_files
 
 
 # SWDE dataset configuration
@@ -236,15 +237,15 @@ class SWDEEvaluationRunner:
         output_dir = self.output_root / vertical / website
         result_dir = output_dir / "result"
 
-        # Check if result directory exists and has JSON files
+        # Check if result directory exists and has result files (the parse manifest is not a result)
         if not result_dir.exists():
             return False
 
-        json_files = list(result_dir.glob("*.json"))
-        if not json_files:
+        files = result_files(result_dir)
+        if not files:
             return False
 
-        print(f"  ✓ Agent output found: {len(json_files)} result files")
+        print(f"  ✓ Agent output found: {len(files)} result files")
         return True
 
     def _is_evaluation_completed(self, vertical: str, website: str) -> bool:
@@ -296,7 +297,7 @@ class SWDEEvaluationRunner:
         result_dir = output_dir / "result"
         eval_dir = output_dir / "evaluation"
 
-        has_results = result_dir.exists() and list(result_dir.glob("*.json"))
+        has_results = result_dir.exists() and result_files(result_dir)
         has_eval = (eval_dir / "evaluation_report.json").exists()
 
         if has_results and has_eval:
@@ -9,6 +9,7 @@ from typing import List
 import pytest
 
 from web2json.tools import cluster_html_layouts, get_feature
+from web2json.tools.cluster import select_representative_samples
 
 
 class TestCluster:
@@ -296,6 +297,19 @@ class TestCluster:
         assert sim_mat.shape == (1, 1)
         assert sim_mat[0, 0] == 1.0
 
+    @pytest.mark.unit
+    def test_select_representative_samples_prefers_distinct_layouts(self):
+        """测试: 代表样本选取 - 近似重复的页面只选一个"""
+        article = "<html><body><div class='nav'></div><div class='article'><h1>t</h1><p>{}</p></div></body></html>"
+        listing = "<html><body><ul class='list'><li>a</li><li>b</li></ul><table class='grid'><tr><td>1</td></tr></table></body></html>"
+        html_list = [article.format(i) for i in range(4)] + [listing]
+
+        selected = select_representative_samples(html_list, 2)
+
+        assert len(selected) == 2
+        assert 4 in selected
+        assert select_representative_samples(html_list, 10) == list(range(5))
+
 
 if __name__ == "__main__":
     # 允许直接运行测试文件
@@ -0,0 +1,68 @@
+"""
+代码生成流式校验测试
+"""
+import pytest
+
+from web2json.tools.code_stream_validator import CodeStreamValidator
+from web2json.utils.llm_client import GenerationAborted
+
+TARGET = {"title": {"type": "string"}, "price": {"type": "string"}}
+
+VALID_CODE = '''```python
+import json
+import sys
+from lxml import etree
+
+
+class WebPageParser:
+    def parse(self, html):
+        tree = etree.HTML(html)
+        return {"title": self._extract_title(tree), "price": self._extract_price(tree)}
+
+    def _extract_title(self, tree):
+        values = tree.xpath("//title/text()")
+        return values[0].strip() if values else ""
+
+    def _extract_price(self, tree):
+        values = tree.xpath("//span[@class='price']/text()")
+        return values[0].strip() if values else ""
+
+
+def main():
+    print(json.dumps(WebPageParser().parse(open(sys.argv[1]).read())))
+
+
+if __name__ == "__main__":
+    main()
+```
+'''
+
+
+def _feed(validator, text, chunk_size=7):
+    for end in range(chunk_size, len(text) + chunk_size, chunk_size):
+        validator(text[:end])
+
+
+def test_valid_code_passes_and_reports_progress():
+    reports = []
+    _feed(CodeStreamValidator(TARGET, progress=reports.append), VALID_CODE)
+
+    assert reports[-1]["fields_done"] == 2
+    assert reports[-1]["fields_total"] == 2
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("当然可以！下面是解析代码的思路：\n首先分析页面结构，\n然后逐个字段提取。\n", "不是代码"),
+    ("import json\n\n\ndef main():\n    pass\n", "WebPageParser"),
+    ("import json\n\n" + "    value = value.strip()\n" * 40, "重复"),
+    (
+        "import json\n\nclass WebPageParser:\n    def parse(self, html):\n        return {\n\n"
+        "    def _extract_title(self, tree):\n        return ''\n\n"
+        "    def _extract_price(self, tree):\n        return ''\n\n"
+        "    def _extract_other(self, tree):\n        return ''\n",
+        "语法错误",
+    ),
+])
+def test_broken_generation_is_aborted(text, reason):
+    with pytest.raises(GenerationAborted, match=reason):
+        _feed(CodeStreamValidator(TARGET), text)
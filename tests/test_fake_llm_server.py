@@ -0,0 +1,109 @@
+"""
+离线LLM模拟服务测试
+"""
+import json
+
+import httpx
+import pytest
+
+from web2json.config.settings import settings
+from web2json.prompts.code_generator import CodeGeneratorPrompts
+from web2json.tools.schema_extraction import _build_extraction_messages, _build_merge_messages
+from web2json.utils.fake_llm_server import FakeLLMBackend, FakeLLMConfig, FakeLLMServer
+from web2json.utils.llm_client import LLMClient
+
+HTML = "<html><head><title>Demo Page</title></head><body><h1>Hello</h1><p>World</p></body></html>"
+
+
+@pytest.fixture
+def server():
+    with FakeLLMServer(FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, seed=0)) as srv:
+        yield srv
+
+
+def _chat(server, messages):
+    response = httpx.post(f"{server.base_url}/chat/completions", json={"model": "m", "messages": messages})
+    return response
+
+
+def test_schema_extraction_is_deterministic(server):
+    messages = _build_extraction_messages(HTML)
+    first = _chat(server, messages).json()
+    second = _chat(server, messages).json()
+
+    content = first["choices"][0]["message"]["content"]
+    assert content == second["choices"][0]["message"]["content"]
+    schema = json.loads(content.strip("`").removeprefix("json"))
+    assert schema["title"]["value_sample"] == "Demo Page"
+    assert first["usage"]["prompt_tokens"] > 0
+
+
+def test_merge_unions_xpaths():
+    schemas = [
+        {"title": {"type": "string", "description": "", "value_sample": "a", "xpath": "//title/text()"}},
+        {"title": {"type": "string", "description": "", "value_sample": "b", "xpath": "//h1/text()"}},
+    ]
+    backend = FakeLLMBackend(FakeLLMConfig())
+    messages = _build_merge_messages(schemas)
+
+    assert backend.classify(messages) == "schema_merge"
+    merged = json.loads(backend.build_content("schema_merge", messages).strip("`").removeprefix("json"))
+    assert merged["title"]["xpaths"] == ["//title/text()", "//h1/text()"]
+
+
+def test_error_rate_returns_503():
+    config = FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, error_rate=1.0)
+    with FakeLLMServer(config) as srv:
+        response = _chat(srv, [{"role": "user", "content": "ping"}])
+
+    assert response.status_code == 503
+    assert srv.backend.get_stats()["errors"] == 1
+
+
+def test_code_generation_prompts_share_cached_prefix(server, monkeypatch):
+    schema = {"title": {"type": "string", "description": "标题"}}
+    first = CodeGeneratorPrompts.get_initial_generation_messages(HTML, schema)
+    second = CodeGeneratorPrompts.get_initial_generation_messages(HTML.replace("Demo", "Other"), schema)
+    assert first[:-1] == second[:-1]
+
+    # 开启 cache_control 提示后，前缀消息变为带标记的 content 块，最后一条消息保持原样
+    monkeypatch.setattr(settings, "llm_prompt_cache_hints", True)
+    hinted = LLMClient._apply_cache_hints(second)
+    assert all(msg["content"][0]["cache_control"] == {"type": "ephemeral"} for msg in hinted[:-1])
+    assert hinted[-1] == second[-1]
+
+    assert _chat(server, first).json()["usage"]["prompt_tokens_details"]["cached_tokens"] == 0
+    usage = _chat(server, hinted).json()["usage"]
+    assert 0 < usage["prompt_tokens_details"]["cached_tokens"] < usage["prompt_tokens"]
+
+
+def test_chat_json_falls_back_when_json_mode_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "llm_structured_output", "json_object")
+    config = FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, json_mode_supported=False)
+    with FakeLLMServer(config) as srv:
+        client = LLMClient(api_key="fake", api_base=srv.base_url, model="no-json-mode", temperature=0.1)
+        messages = _build_extraction_messages(HTML)
+
+        for _ in range(2):
+            schema = client.chat_json(messages, use_cache=False)
+            assert schema["title"]["value_sample"] == "Demo Page"
+
+        # 只被拒绝一次，之后直接使用普通输出
+        assert srv.backend.get_stats()["json_mode_rejected"] == 1
+
+
+def test_stream_completion_aborts_degenerate_generation(monkeypatch):
+    from web2json.tools.code_stream_validator import CodeStreamValidator
+    from web2json.utils.llm_client import GenerationAborted
+
+    schema = {"title": {"type": "string", "description": "标题"}}
+    messages = CodeGeneratorPrompts.get_initial_generation_messages(HTML, schema)
+    config = FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, seed=0)
+    with FakeLLMServer(config) as srv:
+        client = LLMClient(api_key="fake", api_base=srv.base_url, model="stream", temperature=0.1)
+        streamed = client.stream_completion(messages, on_text=CodeStreamValidator(schema), use_cache=False)
+        assert streamed == client.chat_completion(messages, use_cache=False)
+
+        srv.backend.config.degenerate_code_rate = 1.0
+        with pytest.raises(GenerationAborted, match="重复"):
+            client.stream_completion(messages, on_text=CodeStreamValidator(schema), use_cache=False)
@@ -0,0 +1,36 @@
+"""
+输入清单测试
+"""
+import os
+
+from web2json.utils.input_manifest import file_digest, read_input_manifest, write_input_manifest
+
+
+def test_manifest_records_hashes_without_copying(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    page = src / "a.html"
+    page.write_text("<html>a</html>", encoding="utf-8")
+
+    out = tmp_path / "out"
+    manifest_path = write_input_manifest([str(page)], out, materialize_dir=out / "input_html")
+
+    entries = read_input_manifest(manifest_path)
+    assert entries == [{
+        "path": str(page.absolute()),
+        "name": "a.html",
+        "sha256": file_digest(str(page)),
+        "size": page.stat().st_size,
+    }]
+    assert not (out / "input_html").exists()
+
+
+def test_hardlink_materialization_shares_inode(tmp_path):
+    page = tmp_path / "a.html"
+    page.write_text("<html>a</html>", encoding="utf-8")
+
+    out = tmp_path / "out"
+    manifest_path = write_input_manifest([str(page)], out, materialize_dir=out / "input_html", mode="hardlink")
+
+    stored = read_input_manifest(manifest_path)[0]["stored"]
+    assert os.path.samefile(stored, page)
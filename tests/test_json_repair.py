@@ -0,0 +1,36 @@
+"""
+容错JSON解析测试
+"""
+import pytest
+
+from web2json.utils.json_repair import IncrementalJSONParser, JSONRepairError, parse_json_tolerant
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('结果如下：\n```json\n{"a": 1, "b": [1, 2,],}\n```\n以上。', {"a": 1, "b": [1, 2]}),
+    ('{"title": {"xpath": "//h1/text()"}\n  "author": {"xpath": "//span"}}',
+     {"title": {"xpath": "//h1/text()"}, "author": {"xpath": "//span"}}),
+    ("{'a': True, 'b': None, c: 'x', // 注释\n 'd': .5}", {"a": True, "b": None, "c": "x", "d": 0.5}),
+    ('{"a": "line1\nline2", "b": "say "hi" ok"}', {"a": "line1\nline2", "b": 'say "hi" ok'}),
+    ('{"a": {"b": [1, 2, {"c": "trunc', {"a": {"b": [1, 2, {"c": "trunc"}]}}),
+    ('{"a": 1, "b"', {"a": 1, "b": None}),
+])
+def test_repairs_common_llm_output_defects(text, expected):
+    assert parse_json_tolerant(text) == expected
+
+
+def test_incremental_feed_matches_whole_input():
+    text = '```json\n{"title": {"xpath": "//a/@href", "v": [1, 2]}, "more": "abc"}\n```'
+    parser = IncrementalJSONParser()
+    previews = []
+    for start in range(0, len(text), 3):
+        parser.feed(text[start:start + 3])
+        previews.append(parser.partial())
+
+    assert parser.finish() == {"title": {"xpath": "//a/@href", "v": [1, 2]}, "more": "abc"}
+    assert {"title": {"xpath": "//a/@href", "v": [1]}} in previews
+
+
+def test_no_json_raises():
+    with pytest.raises(JSONRepairError):
+        parse_json_tolerant("抱歉，我无法完成这个任务。")
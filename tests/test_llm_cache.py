@@ -0,0 +1,96 @@
+"""
+LLM响应缓存测试
+"""
+import time
+
+import pytest
+
+from web2json.utils.llm_cache import LLMResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMResponseCache(str(tmp_path / "llm.sqlite"), ttl_seconds=0, max_entries=0)
+
+
+def test_key_is_content_addressed():
+    messages = [{"role": "user", "content": "hello"}]
+    key1 = LLMResponseCache.make_key("model-a", 0.1, messages)
+    key2 = LLMResponseCache.make_key("model-a", 0.1, [dict(m) for m in messages])
+
+    assert key1 == key2
+    assert key1 != LLMResponseCache.make_key("model-b", 0.1, messages)
+    assert key1 != LLMResponseCache.make_key("model-a", 0.3, messages)
+
+
+def test_hit_and_miss_counters(cache):
+    key = LLMResponseCache.make_key("m", 0.1, [{"role": "user", "content": "x"}])
+
+    assert cache.get(key) is None
+    cache.set(key, "m", "response")
+    assert cache.get(key) == "response"
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_ttl_expiry(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), ttl_seconds=1)
+    cache.set("k", "m", "v")
+    cache._conn.execute("UPDATE llm_responses SET created_at = ?", (time.time() - 10,))
+
+    assert cache.get("k") is None
+
+
+def test_size_eviction_keeps_recent(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), max_entries=2)
+    cache.set("a", "m", "1")
+    time.sleep(0.01)
+    cache.set("b", "m", "2")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", "m", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_key_covers_max_tokens_and_request_params():
+    messages = [{"role": "user", "content": "hello"}]
+    base = LLMResponseCache.make_key("m", 0.1, messages)
+
+    assert base == LLMResponseCache.make_key("m", 0.1, messages, None, {})
+    assert base != LLMResponseCache.make_key("m", 0.1, messages, max_tokens=16)
+    assert LLMResponseCache.make_key("m", 0.1, messages, max_tokens=16) != \
+        LLMResponseCache.make_key("m", 0.1, messages, max_tokens=4096)
+    assert base != LLMResponseCache.make_key("m", 0.1, messages, params={"response_format": {"type": "json_object"}})
+    # 请求参数的顺序不影响缓存键
+    assert LLMResponseCache.make_key("m", 0.1, messages, params={"a": 1, "b": 2}) == \
+        LLMResponseCache.make_key("m", 0.1, messages, params={"b": 2, "a": 1})
+
+
+def test_client_does_not_share_entries_across_max_tokens_or_response_format(tmp_path, monkeypatch):
+    from web2json.config.settings import settings
+    from web2json.utils.fake_llm_server import FakeLLMConfig, FakeLLMServer
+    from web2json.utils.llm_client import JSON_OBJECT_FORMAT, LLMClient
+
+    monkeypatch.setattr(settings, "llm_cache_enabled", True)
+    monkeypatch.setattr(LLMClient, "_response_cache", LLMResponseCache(str(tmp_path / "llm.sqlite")))
+    messages = [{"role": "user", "content": "hello"}]
+
+    with FakeLLMServer(FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, seed=0)) as srv:
+        client = LLMClient(api_key="fake", api_base=srv.base_url, model="m")
+        client.chat_completion(messages, max_tokens=16)
+        client.chat_completion(messages, max_tokens=16)
+        client.chat_completion(messages, max_tokens=4096)
+        client.chat_completion(messages, max_tokens=4096, response_format=JSON_OBJECT_FORMAT)
+        requests = srv.backend.get_stats()["requests"]
+
+    assert requests == 3
+    assert LLMClient._response_cache.get_stats()["entries"] == 3
@@ -0,0 +1,106 @@
+"""
+LLM容错层测试（重试、熔断、对冲）
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from web2json.utils.llm_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMResilience,
+    ResiliencePolicy,
+    classify_error,
+)
+
+
+def _policy(max_retries=3, hedge_enabled=False, hedge_min_samples=5):
+    return ResiliencePolicy(
+        max_retries=max_retries,
+        base_delay=0.0,
+        max_delay=0.0,
+        hedge_enabled=hedge_enabled,
+        hedge_min_samples=hedge_min_samples,
+    )
+
+
+def test_classify_error():
+    request = httpx.Request("POST", "http://llm/v1/chat/completions")
+    assert classify_error(httpx.ConnectError("refused", request=request)) == "connection"
+    assert classify_error(httpx.ReadTimeout("slow", request=request)) == "timeout"
+    assert classify_error(ValueError("bad json")) == "client"
+
+
+def test_retry_transient_then_succeed():
+    resilience = LLMResilience()
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("refused")
+        return "ok"
+
+    assert resilience.call(flaky, _policy(), "http://llm", "k") == "ok"
+    assert len(calls) == 3
+    assert resilience.get_stats()["retries"] == 2
+
+
+def test_non_retryable_error_raises_immediately():
+    resilience = LLMResilience()
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        resilience.call(broken, _policy(), "http://llm", "k")
+    assert len(calls) == 1
+
+
+def test_circuit_breaker_open_and_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    # 冷却期结束后只放行一个探测请求
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_rejects_calls():
+    resilience = LLMResilience()
+    breaker = resilience.get_breaker("http://down")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        resilience.call(lambda: "ok", _policy(), "http://down", "k")
+
+
+def test_hedge_takes_first_answer():
+    resilience = LLMResilience()
+    for _ in range(5):
+        resilience.record_latency("k", 0.01)
+    calls = []
+
+    async def slow_then_fast():
+        calls.append(1)
+        await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    started = time.monotonic()
+    result = asyncio.run(resilience.acall(slow_then_fast, _policy(hedge_enabled=True), "http://llm", "k"))
+
+    assert result == 2
+    assert time.monotonic() - started < 0.5
+    assert resilience.get_stats()["hedge_wins"] == 1
@@ -0,0 +1,82 @@
+"""
+模型路由测试
+"""
+import pytest
+
+from web2json.config.settings import settings
+from web2json.tools.schema_extraction import _build_extraction_messages
+from web2json.utils.fake_llm_server import FakeLLMConfig, FakeLLMServer
+from web2json.utils.model_router import TIER_DEFAULT, TIER_SMALL, model_router
+from web2json.utils.usage_ledger import PHASE_MERGE, PHASE_XPATH, UsageLedger, use_ledger
+
+
+@pytest.fixture
+def tiers(monkeypatch):
+    monkeypatch.setattr(settings, "small_model", "small-m")
+    monkeypatch.setattr(settings, "default_model", "default-m")
+    monkeypatch.setattr(settings, "code_gen_model", "default-m")
+    monkeypatch.setattr(settings, "llm_routes", "merge:small,xpath:small,code:large")
+    monkeypatch.setattr(settings, "llm_route_fallback", True)
+    monkeypatch.setattr(settings, "llm_tier_prices", "small:1/2,default:10/20")
+
+
+def test_escalation_chain_skips_tiers_with_same_model(tiers, monkeypatch):
+    assert [tier.name for tier in model_router.escalation(PHASE_XPATH)] == [TIER_SMALL, TIER_DEFAULT]
+    assert [tier.name for tier in model_router.escalation("schema")] == [TIER_DEFAULT]
+
+    monkeypatch.setattr(settings, "llm_route_fallback", False)
+    assert [tier.name for tier in model_router.escalation(PHASE_MERGE)] == [TIER_SMALL]
+
+    assert model_router.tier(TIER_SMALL).cost(1_000_000, 500_000) == pytest.approx(2.0)
+
+
+def test_rejected_answer_escalates_to_bigger_tier(tiers, monkeypatch):
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    monkeypatch.setattr(settings, "llm_structured_output", "off")
+    calls = []
+
+    def validate(result):
+        calls.append(result)
+        if len(calls) == 1:
+            raise ValueError("不合格")
+        return result
+
+    config = FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, seed=0)
+    with FakeLLMServer(config) as srv:
+        monkeypatch.setattr(settings, "openai_api_base", srv.base_url)
+        monkeypatch.setattr(settings, "openai_api_key", "fake")
+        ledger = UsageLedger()
+        with use_ledger(ledger):
+            result = model_router.chat_json(
+                PHASE_MERGE, _build_extraction_messages("<html><title>T</title></html>"), validate=validate
+            )
+
+    assert result["title"]["value_sample"] == "T"
+    usage = ledger.to_dict()
+    assert usage["tiers"][TIER_SMALL]["fallbacks"] == 1
+    assert usage["tiers"][TIER_DEFAULT]["calls"] == 1
+    assert usage["tiers"][TIER_DEFAULT]["cost_usd"] > usage["tiers"][TIER_SMALL]["cost_usd"] > 0
+    assert usage["phases"][PHASE_MERGE]["calls"] == 2
+
+
+def test_final_rejection_is_not_left_in_cache(tiers, monkeypatch, tmp_path):
+    from web2json.utils.llm_cache import LLMResponseCache
+    from web2json.utils.llm_client import LLMClient
+
+    monkeypatch.setattr(settings, "llm_route_fallback", False)
+    monkeypatch.setattr(settings, "llm_cache_enabled", True)
+    monkeypatch.setattr(LLMClient, "_response_cache", LLMResponseCache(str(tmp_path / "llm.sqlite")))
+
+    def reject(result):
+        raise ValueError("不合格")
+
+    config = FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, seed=0)
+    with FakeLLMServer(config) as srv:
+        monkeypatch.setattr(settings, "openai_api_base", srv.base_url)
+        monkeypatch.setattr(settings, "openai_api_key", "fake")
+        with pytest.raises(ValueError):
+            model_router.chat_json(
+                PHASE_MERGE, _build_extraction_messages("<html><title>T</title></html>"), validate=reject
+            )
+
+    assert LLMClient._response_cache.get_stats()["entries"] == 0
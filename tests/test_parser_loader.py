@@ -0,0 +1,80 @@
+"""
+解析器加载器测试
+"""
+import sys
+import threading
+
+from web2json.utils.parser_loader import CANDIDATE_PREFIX, MODULE_PREFIX, ParserLoader
+
+PARSER_TEMPLATE = '''
+with open({counter!r}, "a") as counter:
+    counter.write("x")
+
+
+class WebPageParser:
+    def parse(self, html):
+        return {{"version": {version!r}}}
+'''
+
+
+def _write(path, counter, version):
+    path.write_text(PARSER_TEMPLATE.format(counter=str(counter), version=version), encoding="utf-8")
+    return str(path)
+
+
+def test_parsers_are_isolated_by_content_and_evicted(tmp_path):
+    counter = tmp_path / "loads.txt"
+    loader = ParserLoader(max_size=2)
+
+    a = loader.get(_write(tmp_path / "a.py", counter, "a"))
+    b = loader.get(_write(tmp_path / "b.py", counter, "b"))
+    assert a.parse("") == {"version": "a"} and b.parse("") == {"version": "b"}
+    # 相同内容（即使路径不同）复用同一个实例，不重新执行模块
+    assert loader.get(_write(tmp_path / "a_copy.py", counter, "a")) is a
+    assert counter.read_text() == "xx"
+
+    # 同一路径被改写后加载新版本；缓存上限为 2，最久未使用的 b 被淘汰
+    assert loader.get(_write(tmp_path / "a.py", counter, "c")).parse("") == {"version": "c"}
+    stats = loader.get_stats()
+    assert (stats["cached"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 3, 1)
+    assert sum(name.startswith(MODULE_PREFIX) for name in sys.modules) >= 2
+    assert type(b).__module__ not in sys.modules
+
+    loader.clear()
+    assert type(a).__module__ not in sys.modules
+
+
+def test_concurrent_first_load_executes_module_once(tmp_path):
+    counter = tmp_path / "loads.txt"
+    parser_path = _write(tmp_path / "parser.py", counter, "shared")
+    loader = ParserLoader(max_size=4)
+    barrier = threading.Barrier(8)
+    parsers = []
+
+    def load():
+        barrier.wait()
+        parsers.append(loader.get(parser_path))
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.read_text() == "x"
+    assert len({id(parser) for parser in parsers}) == 1
+
+
+def test_uncached_load_leaves_cache_and_modules_untouched(tmp_path):
+    counter = tmp_path / "loads.txt"
+    loader = ParserLoader(max_size=1)
+    final = loader.get(_write(tmp_path / "final.py", counter, "final"))
+    modules = set(sys.modules)
+
+    for round_no in range(3):
+        candidate = loader.load(_write(tmp_path / f"parser_round_{round_no}.py", counter, round_no), cache=False)
+        assert candidate.parse("") == {"version": round_no}
+
+    assert not any(name.startswith(CANDIDATE_PREFIX) for name in set(sys.modules) - modules)
+    assert loader.get(str(tmp_path / "final.py")) is final
+    assert loader.get_stats()["evictions"] == 0
@@ -0,0 +1,235 @@
+"""
+批量解析测试
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+from web2json.agent.processors import ParserProcessor
+from web2json.config.settings import settings
+from web2json.utils.result_store import iter_results
+
+PARSER_CODE = '''
+import re
+
+
+class WebPageParser:
+    def parse(self, html):
+        if "broken" in html:
+            raise ValueError("boom")
+        title = re.search(r"<title>(.*?)</title>", html)
+        return {"title": title.group(1) if title else None}
+'''
+
+
+def _run(tmp_path, name, files, parser_path):
+    result_dir = tmp_path / name
+    result_dir.mkdir()
+    return ParserProcessor(result_dir).process({"html_files": files, "parser_path": str(parser_path)})
+
+
+def test_parallel_batch_matches_serial(tmp_path, monkeypatch):
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text(PARSER_CODE, encoding="utf-8")
+    files = []
+    for i in range(7):
+        path = tmp_path / f"page_{i}.html"
+        path.write_text("broken" if i == 3 else f"<title>Page – {i}</title>", encoding="utf-8")
+        files.append(str(path))
+
+    monkeypatch.setattr(settings, "parse_chunk_size", 2)
+    monkeypatch.setattr(settings, "parse_workers", 1)
+    serial = _run(tmp_path, "serial", files, parser_path)
+    monkeypatch.setattr(settings, "parse_workers", 2)
+    parallel = _run(tmp_path, "parallel", files, parser_path)
+
+    for report in (serial, parallel):
+        assert report["success"]
+        assert [r["html_file"] for r in report["parsed_files"]] == [f for i, f in enumerate(files) if i != 3]
+        assert [(r["html_file"], r["error"]) for r in report["failed_files"]] == [(files[3], "boom")]
+    with open(parallel["parsed_files"][0]["json_file"], encoding="utf-8") as f:
+        assert json.load(f) == {"title": "Page - 0"}
+
+
+def test_sharded_output_from_worker_processes(tmp_path, monkeypatch):
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text(PARSER_CODE, encoding="utf-8")
+    files = []
+    for i in range(5):
+        path = tmp_path / f"page_{i}.html"
+        path.write_text(f"<title>Page {i}</title>", encoding="utf-8")
+        files.append(str(path))
+
+    monkeypatch.setattr(settings, "parse_chunk_size", 2)
+    monkeypatch.setattr(settings, "parse_workers", 2)
+    monkeypatch.setattr(settings, "result_format", "jsonl")
+    monkeypatch.setattr(settings, "result_compression", "gzip")
+    report = _run(tmp_path, "sharded", files, parser_path)
+
+    assert report["result_store"]["records"] == 5 and report["result_store"]["shards"] == ["part-00000.jsonl.gz"]
+    assert all(record["shard"] == "part-00000.jsonl.gz" for record in report["parsed_files"])
+    assert not list((tmp_path / "sharded").glob("page_*.json"))
+    assert sorted(iter_results(tmp_path / "sharded")) == [(str(Path(path).absolute()), {"title": f"Page {i}"}) for i, path in enumerate(files)]
+
+
+@pytest.mark.parametrize("result_format", ["json", "jsonl"])
+def test_incremental_parsing_only_touches_the_delta(tmp_path, monkeypatch, result_format):
+    monkeypatch.setattr(settings, "parse_workers", 1)
+    monkeypatch.setattr(settings, "parse_incremental", True)
+    monkeypatch.setattr(settings, "result_format", result_format)
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text(PARSER_CODE, encoding="utf-8")
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    for i in range(3):
+        (pages / f"page_{i}.html").write_text(f"<title>Page {i}</title>", encoding="utf-8")
+    result_dir = tmp_path / "result"
+    result_dir.mkdir()
+
+    def run():
+        files = sorted(str(path) for path in pages.glob("*.html"))
+        return ParserProcessor(result_dir).process({"html_files": files, "parser_path": str(parser_path)})
+
+    assert run()["incremental"] == {"skipped": 0, "parsed": 3, "failed": 0, "removed": 0, "full": False}
+    assert run()["incremental"]["skipped"] == 3
+
+    (pages / "page_1.html").write_text("<title>Changed</title>", encoding="utf-8")
+    (pages / "page_2.html").unlink()
+    (pages / "page_3.html").write_text("<title>New</title>", encoding="utf-8")
+    report = run()
+    assert report["incremental"] == {"skipped": 1, "parsed": 2, "failed": 0, "removed": 1, "full": False}
+    assert len(report["parsed_files"]) == 3
+    suffix = ".html" if result_format == "jsonl" else ".json"
+    assert sorted((Path(source).name, data) for source, data in iter_results(result_dir)) == [
+        (f"page_0{suffix}", {"title": "Page 0"}), (f"page_1{suffix}", {"title": "Changed"}), (f"page_3{suffix}", {"title": "New"}),
+    ]
+
+    parser_path.write_text(PARSER_CODE + "\n# v2\n", encoding="utf-8")
+    assert run()["incremental"] == {"skipped": 0, "parsed": 3, "failed": 0, "removed": 0, "full": True}
+
+
+def test_incremental_reports_deleted_input_as_failed_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "parse_workers", 1)
+    monkeypatch.setattr(settings, "parse_incremental", True)
+    monkeypatch.setattr(settings, "result_format", "json")
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text(PARSER_CODE, encoding="utf-8")
+    files = []
+    for i in range(2):
+        page = tmp_path / f"page_{i}.html"
+        page.write_text(f"<title>Page {i}</title>", encoding="utf-8")
+        files.append(str(page))
+    result_dir = tmp_path / "result"
+    result_dir.mkdir()
+
+    def run():
+        return ParserProcessor(result_dir).process({"html_files": files, "parser_path": str(parser_path)})
+
+    run()
+    Path(files[1]).unlink()
+    report = run()
+
+    assert report["incremental"]["skipped"] == 1
+    assert [record["html_file"] for record in report["failed_files"]] == [files[1]]
+    assert "No such file" in report["failed_files"][0]["error"]
+
+
+def test_incremental_shards_keep_same_named_pages_apart(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "parse_workers", 1)
+    monkeypatch.setattr(settings, "parse_incremental", True)
+    monkeypatch.setattr(settings, "result_format", "jsonl")
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text(PARSER_CODE, encoding="utf-8")
+    files = []
+    for site in ("a", "b"):
+        (tmp_path / site).mkdir()
+        page = tmp_path / site / "index.html"
+        page.write_text(f"<title>Site {site}</title>", encoding="utf-8")
+        files.append(str(page))
+    result_dir = tmp_path / "result"
+    result_dir.mkdir()
+
+    def run():
+        return ParserProcessor(result_dir).process({"html_files": files, "parser_path": str(parser_path)})
+
+    run()
+    assert run()["incremental"]["skipped"] == 2
+    assert sorted(iter_results(result_dir)) == [
+        (str(Path(files[0]).absolute()), {"title": "Site a"}), (str(Path(files[1]).absolute()), {"title": "Site b"}),
+    ]
+
+
+WATCHDOG_PARSER_CODE = '''
+import os
+import time
+
+
+class WebPageParser:
+    def parse(self, html):
+        if "hang" in html:
+            time.sleep(60)
+        if "hog" in html:
+            blob = b"x" * (600 * 1024 * 1024)
+            time.sleep(60)
+        if "crash" in html:
+            os._exit(3)
+        return {"title": html}
+'''
+
+
+LEAKY_PARSER_CODE = '''
+import time
+
+_BALLAST = b"x" * (150 * 1024 * 1024)
+_LEAKED = []
+
+
+class WebPageParser:
+    def parse(self, html):
+        _LEAKED.append(b"x" * (60 * 1024 * 1024))
+        time.sleep(0.3)
+        return {"title": html}
+'''
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="RSS 监控依赖 /proc")
+def test_watchdog_memory_limit_counts_only_the_page_growth(tmp_path, monkeypatch):
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text(LEAKY_PARSER_CODE, encoding="utf-8")
+    files = []
+    for i in range(3):
+        path = tmp_path / f"page_{i}.html"
+        path.write_text(f"page {i}", encoding="utf-8")
+        files.append(str(path))
+
+    monkeypatch.setattr(settings, "parse_workers", 1)
+    monkeypatch.setattr(settings, "parse_page_max_rss_mb", 100)
+    report = _run(tmp_path, "leaky", files, parser_path)
+
+    # 初始化占用 150MB、之前页面留下的内存都不计入后续页面
+    assert report["failed_files"] == []
+    assert len(report["parsed_files"]) == 3
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="RSS 监控依赖 /proc")
+def test_watchdog_kills_hanging_and_oversized_pages(tmp_path, monkeypatch):
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text(WATCHDOG_PARSER_CODE, encoding="utf-8")
+    files = []
+    for name in ["ok_1", "hang", "ok_2", "hog", "crash", "ok_3"]:
+        path = tmp_path / f"{name}.html"
+        path.write_text(name, encoding="utf-8")
+        files.append(str(path))
+
+    monkeypatch.setattr(settings, "parse_workers", 2)
+    monkeypatch.setattr(settings, "parse_page_timeout", 2)
+    monkeypatch.setattr(settings, "parse_page_max_rss_mb", 400)
+    monkeypatch.setattr(settings, "parse_slowest_n", 3)
+    report = _run(tmp_path, "watchdog", files, parser_path)
+
+    assert [Path(r["html_file"]).stem for r in report["parsed_files"]] == ["ok_1", "ok_2", "ok_3"]
+    reasons = {Path(r["html_file"]).stem: r["reason"] for r in report["failed_files"]}
+    assert reasons == {"hang": "timeout", "hog": "memory", "crash": "crash"}
+    assert report["slowest_files"][0]["status"] == "timeout" and len(report["slowest_files"]) == 3
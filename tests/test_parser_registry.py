@@ -0,0 +1,27 @@
+"""
+解析器注册表测试
+"""
+from web2json.agent.parser_registry import ParserRegistry
+from web2json.tools.cluster import layout_signature
+
+ARTICLE = "<html><body><div class='nav'></div><div class='article'><h1>{}</h1><p>text</p></div></body></html>"
+LISTING = "<html><body><ul class='list'><li>a</li></ul><table class='grid'><tr><td>1</td></tr></table></body></html>"
+
+
+def test_register_and_find_by_layout_signature(tmp_path):
+    parser_path = tmp_path / "final_parser.py"
+    parser_path.write_text("class WebPageParser: pass\n", encoding="utf-8")
+    schema_path = tmp_path / "final_schema.json"
+    schema_path.write_text('{"title": {}}', encoding="utf-8")
+
+    registry = ParserRegistry(str(tmp_path / "registry"))
+    signature = layout_signature([ARTICLE.format(i) for i in range(3)])
+    entry_id = registry.register(signature, "auto", ["title"], str(parser_path), str(schema_path), fill_rate=1.0)
+
+    hits = registry.find(layout_signature([ARTICLE.format("other")]), "auto", threshold=0.9)
+    assert [hit["id"] for hit in hits] == [entry_id]
+    assert (tmp_path / "registry" / entry_id / "final_parser.py").exists()
+
+    assert registry.find(layout_signature([LISTING]), "auto", threshold=0.9) == []
+    assert registry.find(signature, "predefined", threshold=0.9) == []
+    assert registry.find(signature, "auto", fields=["price"], threshold=0.9) == []
@@ -0,0 +1,37 @@
+"""
+LLM限流器测试
+"""
+from web2json.utils.rate_limiter import RateLimiter
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter(rpm=0, tpm=0)
+
+    assert not limiter.enabled
+    assert all(limiter.reserve(10 ** 6) == 0 for _ in range(100))
+
+
+def test_rpm_burst_then_wait():
+    limiter = RateLimiter(rpm=60)
+
+    assert all(limiter.reserve(0) == 0 for _ in range(60))
+    # 第61个请求需要等待约1秒补充一个令牌，后续请求依次排在其后
+    assert 0.9 < limiter.reserve(0) <= 1.0
+    assert 1.9 < limiter.reserve(0) <= 2.0
+
+    stats = limiter.get_stats()
+    assert stats["requests"] == 62
+    assert stats["waited_requests"] == 2
+    assert stats["max_wait_seconds"] <= 2.0
+
+
+def test_tpm_reservation_and_reconcile():
+    limiter = RateLimiter(tpm=6000)
+
+    assert limiter.reserve(5000) == 0
+    # 剩余1000，再预约2000需要等待约10秒（100 token/s）
+    assert 9.9 < limiter.reserve(2000) <= 10.0
+
+    # 实际消耗比预估少时退还额度，缩短后续等待
+    limiter.reconcile(estimated_tokens=2000, actual_tokens=1000)
+    assert limiter.reserve(0) == 0
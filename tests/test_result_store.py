@@ -0,0 +1,75 @@
+"""
+批量解析结果分片存储测试
+"""
+import json
+
+import pytest
+
+from web2json.utils.result_store import (
+    INDEX_FILENAME,
+    ResultReader,
+    ResultShardWriter,
+    create_result_writer,
+    iter_results,
+    read_result,
+    result_files,
+)
+
+SCHEMA = {"title": {"type": "string"}, "price": {"type": "number"}, "tags": {"type": "array"}}
+
+
+def _records(n):
+    return [(f"page_{i}.html", {"title": f"标题 {i}", "price": str(i), "tags": ["a", i]}) for i in range(n)]
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_jsonl_shards_roll_and_index(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    records = _records(30)
+    with ResultShardWriter(tmp_path, "jsonl", compression, shard_size_mb=0.001) as writer:
+        for source, data in records:
+            writer.write(source, data)
+
+    assert len(writer.shards) > 1
+    assert list(iter_results(tmp_path)) == records
+    assert [path.name for path in result_files(tmp_path)] == writer.shards + [INDEX_FILENAME]
+    with open(tmp_path / INDEX_FILENAME, encoding="utf-8") as f:
+        assert len(f.readlines()) == 30
+    assert read_result(tmp_path, "page_17.html") == records[17][1]
+    assert read_result(tmp_path, "missing.html") is None
+
+
+def test_same_file_name_in_different_directories(tmp_path):
+    with ResultShardWriter(tmp_path, "jsonl", "gzip") as writer:
+        first = writer.write("/crawl/a/index.html", {"title": "A"})
+        writer.write("/crawl/b/index.html", {"title": "B"})
+    assert first["name"] == "index.html"
+
+    reader = ResultReader(tmp_path)
+    assert reader.get("/crawl/a/index.html") == {"title": "A"}
+    # 索引只在首次查询时加载
+    (tmp_path / INDEX_FILENAME).unlink()
+    assert reader.get("/crawl/b/index.html") == {"title": "B"}
+    assert reader.get("/crawl/c/index.html") is None
+
+
+def test_json_format_reads_per_file_results_and_clears_shards(tmp_path):
+    with ResultShardWriter(tmp_path, "jsonl") as writer:
+        writer.write("old.html", {"title": "old"})
+    assert create_result_writer(tmp_path, "json") is None
+    (tmp_path / "page.json").write_text(json.dumps({"title": "new"}), encoding="utf-8")
+
+    assert list(iter_results(tmp_path)) == [("page.json", {"title": "new"})]
+
+
+def test_parquet_columns_follow_schema(tmp_path):
+    pytest.importorskip("pyarrow")
+    with ResultShardWriter(tmp_path, "parquet", "zstd", schema=SCHEMA) as writer:
+        for source, data in _records(3):
+            writer.write(source, data)
+        writer.write("bad.html", {"title": "x", "price": "n/a"})
+
+    rows = list(iter_results(tmp_path))
+    assert rows[1] == ("page_1.html", {"title": "标题 1", "price": 1.0, "tags": ["a", "1"]})
+    assert rows[3][1]["price"] is None and writer.coerce_failures == {"price": 1}
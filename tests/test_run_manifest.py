@@ -0,0 +1,53 @@
+"""
+运行清单（断点续跑）测试
+"""
+from web2json.agent.run_manifest import RunManifest, content_digest
+
+
+def test_resume_reuses_completed_steps_with_same_inputs(tmp_path):
+    artifact = tmp_path / "parser_round_1.py"
+    artifact.write_text("code", encoding="utf-8")
+
+    manifest = RunManifest(tmp_path)
+    inputs = content_digest({"html": "a", "schema": {"title": {}}})
+    manifest.complete("code/1", inputs, {"parser_path": str(artifact)})
+    # 未开启续跑时不复用
+    assert manifest.lookup("code/1", inputs) is None
+
+    resumed = RunManifest(tmp_path, resume=True)
+    assert resumed.lookup("code/1", inputs) == {"parser_path": str(artifact)}
+    assert resumed.lookup("code/1", content_digest({"html": "b"})) is None
+    assert resumed.reused_steps == ["code/1"]
+
+    artifact.unlink()
+    assert resumed.lookup("code/1", inputs) is None
+
+
+def test_fresh_run_discards_previous_manifest(tmp_path):
+    RunManifest(tmp_path).complete("schema_merge", "x", {})
+    assert RunManifest(tmp_path, resume=True).lookup("schema_merge", "x") == {}
+
+    RunManifest(tmp_path).mark_phase("plan", "done")
+    assert RunManifest(tmp_path, resume=True).lookup("schema_merge", "x") is None
+
+
+def test_record_run_hashes_only_changed_inputs_on_resume(tmp_path, monkeypatch):
+    from web2json.agent import run_manifest
+
+    page = tmp_path / "a.html"
+    page.write_text("<html>a</html>", encoding="utf-8")
+    hashed = []
+    monkeypatch.setattr(run_manifest, "file_digest", lambda path: hashed.append(path) or "digest")
+
+    RunManifest(tmp_path).record_run([str(page)])
+    entry = RunManifest(tmp_path, resume=True).data['inputs']['files'][str(page)]
+    assert set(entry) == {'size', 'mtime_ns'}
+
+    RunManifest(tmp_path, resume=True).record_run([str(page)])
+    assert hashed == []
+
+    page.write_text("<html>changed</html>", encoding="utf-8")
+    resumed = RunManifest(tmp_path, resume=True)
+    resumed.record_run([str(page)])
+    assert hashed == [str(page)]
+    assert resumed.data['inputs']['files'][str(page)]['sha256'] == "digest"
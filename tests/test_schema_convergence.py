@@ -0,0 +1,43 @@
+"""
+Schema 收敛检测测试
+"""
+from web2json.agent.schema_convergence import SchemaConvergenceTracker
+
+HTML = "<html><body><h1>{title}</h1><p class='price'>{price}</p></body></html>"
+SCHEMA = {
+    "title": {"xpath": "//h1/text()"},
+    "price": {"xpath": "//p[@class='price']/text()"},
+}
+
+
+def test_converges_after_window_of_agreeing_samples():
+    tracker = SchemaConvergenceTracker(window=2, min_samples=2)
+    assert tracker.samples_needed() == 3
+
+    tracker.add(1, SCHEMA, HTML.format(title="A", price="1"))
+    assert not tracker.converged
+    tracker.add(2, SCHEMA, HTML.format(title="B", price="2"))
+    assert not tracker.converged
+    record = tracker.add(3, SCHEMA, HTML.format(title="C", price="3"))
+
+    assert record["agrees"]
+    assert tracker.converged
+    assert tracker.samples_needed() == 0
+
+
+def test_new_fields_and_inconsistent_xpaths_reset_streak():
+    tracker = SchemaConvergenceTracker(window=2, min_samples=2)
+    tracker.add(1, SCHEMA, HTML.format(title="A", price="1"))
+    tracker.add(2, SCHEMA, HTML.format(title="B", price="2"))
+
+    extended = {**SCHEMA, "author": {"xpath": "//span/text()"}}
+    record = tracker.add(3, extended, HTML.format(title="C", price="3"))
+    assert record["new_fields"] == ["author"]
+    assert tracker.agreeing_streak == 0
+    assert tracker.samples_needed() == 2
+
+    # 已知的 author xpath 在新样本上取不到值
+    record = tracker.add(4, extended, HTML.format(title="D", price="4"))
+    assert record["inconsistent_fields"] == ["author"]
+    assert not tracker.converged
+    assert tracker.to_dict()["fields"] == ["author", "price", "title"]
@@ -0,0 +1,124 @@
+"""
+Schema 阶段流水线测试（精简进程池、失败处理和断点续跑）
+"""
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from web2json.agent.phases.schema_phase import SchemaPhase
+from web2json.agent.run_manifest import RunManifest
+from web2json.config.settings import settings
+
+
+class StubHtmlProcessor:
+    """按文件内容返回精简结果；内容为 die 时在精简子进程中直接退出，内容为 fail 时返回失败"""
+
+    def __init__(self, out_dir: Path):
+        self.out_dir = out_dir
+        self.parent_pid = os.getpid()
+        self.calls = []
+
+    def process(self, input_data):
+        html_file, idx = input_data['html_file'], input_data['idx']
+        content = Path(html_file).read_text(encoding='utf-8')
+        if content == "die" and os.getpid() != self.parent_pid:
+            os._exit(1)
+        self.calls.append(idx)
+        if content == "fail":
+            return {'success': False, 'idx': idx, 'html_file': html_file}
+        html_path = self.out_dir / f"simplified_{idx}.html"
+        html_path.write_text(content, encoding='utf-8')
+        return {
+            'success': True,
+            'idx': idx,
+            'html_file': html_file,
+            'html_content': content,
+            'html_original_path': html_file,
+            'html_path': str(html_path),
+        }
+
+
+class StubSchemaProcessor:
+    def __init__(self, out_dir: Path):
+        self.schemas_dir = out_dir
+        self.schema_template = None
+        self.calls = []
+
+    def process(self, input_data):
+        idx = input_data['idx']
+        self.calls.append(idx)
+        schema = {"title": {"value_sample": input_data['html_content']}}
+        schema_path = self.schemas_dir / f"schema_{idx}.json"
+        schema_path.write_text(json.dumps(schema), encoding='utf-8')
+        return {'success': True, 'idx': idx, 'schema': schema, 'schema_path': str(schema_path)}
+
+    def merge_schemas(self, schemas):
+        (self.schemas_dir / "final_schema.json").write_text(json.dumps(schemas[0]), encoding='utf-8')
+        return schemas[0]
+
+
+def _phase(tmp_path):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir(exist_ok=True)
+    return SchemaPhase(StubHtmlProcessor(out_dir), StubSchemaProcessor(out_dir))
+
+
+def _pages(tmp_path, contents):
+    files = []
+    for i, content in enumerate(contents, 1):
+        path = tmp_path / f"page_{i}.html"
+        path.write_text(content, encoding='utf-8')
+        files.append(str(path))
+    return files
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pipeline_extracts_every_sample_in_order(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(settings, "html_simplify_workers", workers)
+    result = _phase(tmp_path).execute(_pages(tmp_path, ["a", "b", "c"]))
+
+    assert result['success']
+    assert [r['round'] for r in result['rounds']] == [1, 2, 3]
+    assert [r['schema']['title']['value_sample'] for r in result['rounds']] == ["a", "b", "c"]
+
+
+def test_broken_simplify_pool_falls_back_to_current_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "html_simplify_workers", 2)
+    phase = _phase(tmp_path)
+    result = phase.execute(_pages(tmp_path, ["a", "die", "c"]))
+
+    assert result['success']
+    assert [r['schema']['title']['value_sample'] for r in result['rounds']] == ["a", "die", "c"]
+    # 进程池损坏后在当前进程重新精简的样本
+    assert 2 in phase.html_processor.calls
+
+
+def test_first_sample_failure_stops_the_phase(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "html_simplify_workers", 1)
+    monkeypatch.setattr(settings, "max_concurrent_extractions", 1)
+    phase = _phase(tmp_path)
+    result = phase.execute(_pages(tmp_path, ["fail", "b", "c"]))
+
+    assert not result['success']
+    assert result['rounds'] == []
+    assert result['final_schema'] is None
+
+
+def test_resume_reuses_completed_samples(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "html_simplify_workers", 1)
+    files = _pages(tmp_path, ["a", "b"])
+
+    first = _phase(tmp_path)
+    first.manifest = RunManifest(tmp_path)
+    assert first.execute(files)['success']
+
+    resumed = _phase(tmp_path)
+    resumed.manifest = RunManifest(tmp_path, resume=True)
+    result = resumed.execute(files)
+
+    assert result['success']
+    assert resumed.html_processor.calls == [] and resumed.schema_processor.calls == []
+    assert "schema/1" in resumed.manifest.reused_steps and "schema_merge" in resumed.manifest.reused_steps
+    assert [r['schema']['title']['value_sample'] for r in result['rounds']] == ["a", "b"]
@@ -0,0 +1,91 @@
+"""
+LLM用量台账测试
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from web2json.utils.usage_ledger import (
+    PHASE_CODE,
+    PHASE_SCHEMA,
+    BudgetExceededError,
+    UsageLedger,
+    get_current_ledger,
+    use_ledger,
+)
+
+
+def test_records_are_grouped_by_phase():
+    ledger = UsageLedger()
+    ledger.record(PHASE_SCHEMA, input_tokens=100, completion_tokens=20, latency=1.5)
+    ledger.record(PHASE_SCHEMA, cached=True)
+    ledger.record(PHASE_CODE, input_tokens=50, completion_tokens=30, latency=0.5)
+
+    usage = ledger.to_dict()
+    assert usage["total"]["calls"] == 3
+    assert usage["total"]["total_tokens"] == 200
+    assert usage["phases"][PHASE_SCHEMA]["cache_hits"] == 1
+    assert usage["phases"][PHASE_SCHEMA]["total_tokens"] == 120
+    assert usage["phases"][PHASE_CODE]["max_latency_seconds"] == 0.5
+
+
+def test_budget_check_aborts_before_request():
+    ledger = UsageLedger(budget_tokens=1000)
+    ledger.record(PHASE_SCHEMA, input_tokens=800, completion_tokens=100)
+
+    ledger.check_budget(50)
+    with pytest.raises(BudgetExceededError):
+        ledger.check_budget(200)
+    assert ledger.budget_exceeded
+
+
+def test_ledger_follows_copied_context_into_threads():
+    ledger = UsageLedger()
+
+    def work():
+        get_current_ledger().record(PHASE_SCHEMA, input_tokens=1, completion_tokens=1)
+
+    with use_ledger(ledger):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, work) for _ in range(200)]
+            for future in futures:
+                future.result()
+
+    assert get_current_ledger() is None
+    total = ledger.to_dict()["total"]
+    assert total["calls"] == 200
+    assert total["total_tokens"] == 400
+
+
+def test_late_hedge_attempt_is_charged_to_the_ledger(monkeypatch):
+    import threading
+
+    from web2json.config.settings import settings
+    from web2json.utils import llm_client
+    from web2json.utils.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    release = threading.Event()
+    losers = []
+
+    def call_with_slow_hedge(fn, **kwargs):
+        # 模拟同步对冲：胜出的请求先返回，落后的请求在调用记账之后才完成
+        losers.append(threading.Thread(target=lambda: (release.wait(), fn())))
+        losers[-1].start()
+        return fn()
+
+    monkeypatch.setattr(llm_client.llm_resilience, "call", call_with_slow_hedge)
+    ledger = UsageLedger()
+    with FakeLLMServer(FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, seed=0)) as srv:
+        client = llm_client.LLMClient(api_key="fake", api_base=srv.base_url, model="m")
+        with use_ledger(ledger):
+            client.chat_completion([{"role": "user", "content": "hello"}], phase=PHASE_CODE)
+        single = ledger.to_dict()["total"]["total_tokens"]
+        release.set()
+        losers[0].join()
+
+    total = ledger.to_dict()["total"]
+    assert single > 0
+    assert total["calls"] == 1
+    assert total["total_tokens"] == 2 * single
@@ -0,0 +1,106 @@
+"""
+解析器本地验证测试
+"""
+from web2json.agent.processors import ValidationProcessor
+
+PARSER_CODE = '''
+import re
+
+
+class WebPageParser:
+    def parse(self, html):
+        if "broken" in html:
+            raise ValueError("boom")
+        title = re.search(r"<title>(.*?)</title>", html)
+        return {"title": title.group(1) if title else None, "price": None}
+'''
+
+
+def _sample(tmp_path, idx, html, schema):
+    path = tmp_path / f"sample_{idx}.html"
+    path.write_text(html, encoding="utf-8")
+    return {"idx": idx, "html_path": str(path), "schema": schema}
+
+
+def test_report_counts_fill_rate_and_failures(tmp_path):
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text(PARSER_CODE, encoding="utf-8")
+    samples = [
+        _sample(tmp_path, 1, "<title>  Hello   World </title>", {
+            "title": {"value_sample": "hello world"},
+            "price": {"value_sample": "$10"},
+        }),
+        _sample(tmp_path, 2, "<title>Other</title>", {"title": {"value_sample": "Other"}}),
+        _sample(tmp_path, 3, "broken", {"title": {"value_sample": "x"}}),
+    ]
+
+    report = ValidationProcessor().process({
+        "parser_path": str(parser_path),
+        "fields": ["title", "price"],
+        "samples": samples,
+    })
+
+    assert report["success"] and not report["all_satisfied"]
+    assert report["fields"]["title"] == {
+        "checked": 3, "filled": 2, "matched": 2, "fill_rate": 0.667, "match_rate": 0.667,
+    }
+    # 样本 2 的 Schema 没有 price，不要求有值
+    assert report["fields"]["price"]["matched"] == 1
+    assert {(f["idx"], f["field"]) for f in report["failures"]} == {(1, "price"), (3, "title"), (3, "price")}
+    assert report["errors"][0]["idx"] == 3
+    assert ValidationProcessor.failing_samples(report) == [3, 1]
+
+
+def test_unloadable_parser_is_reported(tmp_path):
+    parser_path = tmp_path / "parser.py"
+    parser_path.write_text("class WebPageParser(:\n", encoding="utf-8")
+
+    report = ValidationProcessor().process({"parser_path": str(parser_path), "fields": ["title"], "samples": []})
+
+    assert not report["success"]
+    assert report["errors"][0]["idx"] is None
+
+
+class StubCodeProcessor:
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+
+    def process(self, input_data):
+        parser_path = self.tmp_path / f"parser_round_{input_data['idx']}.py"
+        parser_path.write_text(PARSER_CODE, encoding="utf-8")
+        return {"success": True, "code": PARSER_CODE, "parser_path": str(parser_path)}
+
+    def save_final_parser(self, code, output_dir, config):
+        return {"parser_path": str(self.tmp_path / "final_parser.py")}
+
+
+class StubValidationProcessor:
+    """第一轮后报告样本 3 失败，第二轮后全部通过"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def process(self, input_data):
+        self.calls += 1
+        failures = [{"idx": 3, "field": "title"}] if self.calls == 1 else []
+        return {"success": True, "all_satisfied": not failures, "score": 0.5 * self.calls,
+                "fields": {}, "failures": failures, "errors": []}
+
+
+def test_code_rounds_record_the_reordered_sample(tmp_path, monkeypatch):
+    from web2json.agent.phases.code_phase import CodePhase
+    from web2json.config.settings import settings
+
+    monkeypatch.setattr(settings, "code_validation_enabled", True)
+    schema_rounds = []
+    for idx in (1, 2, 3):
+        sample = _sample(tmp_path, idx, f"<title>page {idx}</title>", {"title": {"value_sample": f"page {idx}"}})
+        schema_rounds.append({"success": True, "url": f"page_{idx}", "html_path": sample["html_path"]})
+    phase = CodePhase(StubCodeProcessor(tmp_path), tmp_path, validation_processor=StubValidationProcessor())
+    monkeypatch.setattr(phase, "_extract_xpaths", lambda parser_path, output_path: False)
+
+    result = phase.execute({"title": {}}, schema_rounds)
+
+    assert result["success"]
+    # 第二轮改用第一轮验证失败的样本 3，记录的是样本编号和对应 URL
+    assert [(r["round"], r["sample"], r["url"]) for r in result["rounds"]] == [(1, 1, "page_1"), (2, 3, "page_3")]
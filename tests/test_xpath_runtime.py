@@ -0,0 +1,87 @@
+"""
+XPath 运行时测试
+"""
+from pathlib import Path
+
+from web2json.tools.xpath_runtime import XPathRuntime, _run_html_files, benchmark
+
+TEST_DATA = Path(__file__).parent / "test_data" / "html_simplifier"
+
+SCHEMA = {
+    "title": {"type": "string"},
+    "tags": {"type": "array"},
+    "price": {"type": "string"},
+}
+
+PAGE = """<html><body>
+<h1> Hello <b>World</b> </h1>
+<ul><li>a</li><li> </li><li>b</li></ul>
+<span class="cost">$5</span>
+</body></html>"""
+
+
+class FakeParser:
+    def __init__(self):
+        self.calls = 0
+
+    def parse(self, html):
+        self.calls += 1
+        return {"title": "Hello World", "tags": ["a", "b"], "price": "$5"}
+
+
+def test_runtime_evaluates_fields_and_falls_back_only_for_empty():
+    fallback = FakeParser()
+    runtime = XPathRuntime(
+        {"title": "//h1", "tags": "//li/text()", "price": ["//span[@class='price']/text()", "//*[@id='x']"]},
+        schema=SCHEMA,
+        fallback_parser=fallback,
+    )
+
+    assert runtime.parse(PAGE) == {"title": "Hello World", "tags": ["a", "b"], "price": "$5"}
+    assert runtime.last_fallback == ["price"] and fallback.calls == 1
+
+    # 所有字段都有值时不调用生成类
+    runtime.compiled["price"] = XPathRuntime({"price": "//span/text()"}).compiled["price"]
+    runtime.parse(PAGE)
+    assert runtime.last_fallback == [] and fallback.calls == 1
+
+
+def test_benchmark_reports_rates_and_agreement():
+    parser = FakeParser()
+    runtime = XPathRuntime({"title": "//h1", "tags": "//li/text()"}, schema=SCHEMA, fallback_parser=parser)
+
+    report = benchmark([PAGE] * 5, parser, runtime, repeat=2)
+
+    assert report["pages"] == 5 and report["parser_pages_per_sec"] > 0 and report["xpath_pages_per_sec"] > 0
+    assert report["fallback_pages"] == 5 and report["fallback_fields"] == {"price": 5}
+    assert report["agreement"] == 1.0
+
+
+def test_single_run_output_lists_its_input_pages(tmp_path, monkeypatch):
+    from web2json.agent.orchestrator import ParserAgent
+    from web2json.config.settings import settings
+    from web2json.utils.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+    monkeypatch.setattr(settings, "input_materialize", "manifest")
+    monkeypatch.setattr(settings, "parser_registry_enabled", False)
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    html_files = [str(path) for path in sorted(TEST_DATA.glob("*.html"))[:2]]
+
+    with FakeLLMServer(FakeLLMConfig(latency_distribution="fixed", latency_median=0.0, seed=0)) as srv:
+        monkeypatch.setattr(settings, "openai_api_base", srv.base_url)
+        monkeypatch.setattr(settings, "openai_api_key", "fake")
+        result = ParserAgent(output_dir=str(tmp_path)).generate_parser(html_files=html_files, iteration_rounds=2)
+
+    assert result["success"]
+    assert not list((tmp_path / "html_original").glob("*.htm*"))
+    assert _run_html_files(tmp_path) == [str(Path(path).absolute()) for path in html_files]
+
+
+def test_schema_fields_without_xpath_fall_back_to_parser():
+    # xpaths.json 的键来自 _extract_xxx 方法名，可能与 Schema 字段不一致
+    fallback = FakeParser()
+    runtime = XPathRuntime({"title": "//h1", "tag_list": "//li/text()"}, schema=SCHEMA, fallback_parser=fallback)
+
+    assert runtime.uncovered_fields == ["tags", "price"]
+    assert runtime.parse(PAGE) == {"title": "Hello World", "tags": ["a", "b"], "price": "$5"}
+    assert runtime.last_fallback == ["tags", "price"]
@@ -2,18 +2,26 @@
 Agent 执行器
 负责阶段编排和流程控制
 """
+import json
+import shutil
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from loguru import logger
 
+from web2json.config.settings import settings
+from web2json.tools.cluster import layout_signature
+
 from .processors import (
     HtmlProcessor,
     SchemaProcessor,
     CodeProcessor,
     ParserProcessor,
+    ValidationProcessor,
 )
 from .phases import SchemaPhase, CodePhase
+from .parser_registry import PARSER_FILENAME, SCHEMA_FILENAME, XPATHS_FILENAME, parser_registry
+from .run_manifest import RunManifest
 
 
 class AgentExecutor:
@@ -88,6 +96,8 @@ class AgentExecutor:
             result_dir=self.result_dir,
         )
 
+        self.validation_processor = ValidationProcessor()
+
     def _init_phases(self):
         """初始化阶段管理器"""
         self.schema_phase = SchemaPhase(
@@ -101,9 +111,10 @@ class AgentExecutor:
             code_processor=self.code_processor,
             output_dir=self.output_dir,
             progress_callback=self.progress_callback,
+            validation_processor=self.validation_processor,
         )
 
-    def execute_plan(self, plan: Dict) -> Dict:
+    def execute_plan(self, plan: Dict, manifest: Optional[RunManifest] = None) -> Dict:
         """
         执行计划 - 两阶段迭代
 
@@ -112,11 +123,14 @@ class AgentExecutor:
 
         Args:
             plan: 执行计划
+            manifest: 运行清单（可选，提供时记录各步骤的完成情况，续跑时跳过已完成的步骤）
 
         Returns:
             执行结果
         """
         logger.info("开始执行计划...")
+        self.schema_phase.manifest = manifest
+        self.code_phase.manifest = manifest
 
         results = {
             'plan': plan,
@@ -129,17 +143,25 @@ class AgentExecutor:
         sample_urls = plan['sample_urls']
 
         # ============ 阶段 1: Schema 迭代 ============
-        schema_result = self.schema_phase.execute(sample_urls)
+        if manifest is not None:
+            manifest.mark_phase('schema', 'running')
+        schema_result = self.schema_phase.execute(sample_urls, candidate_files=plan.get('candidate_files'))
         results['schema_phase'] = schema_result
 
         if not schema_result['success']:
             logger.error("Schema阶段失败")
+            if manifest is not None:
+                manifest.mark_phase('schema', 'failed')
             return results
+        if manifest is not None:
+            manifest.mark_phase('schema', 'done')
 
         final_schema = schema_result['final_schema']
         logger.success(f"Schema阶段完成，最终Schema包含 {len(final_schema)} 个字段")
 
         # ============ 阶段 2: 代码迭代 ============
+        if manifest is not None:
+            manifest.mark_phase('code', 'running')
         code_result = self.code_phase.execute(
             final_schema=final_schema,
             schema_phase_rounds=schema_result['rounds']
@@ -151,21 +173,155 @@ class AgentExecutor:
             results['success'] = True
         else:
             logger.error("代码迭代阶段失败")
+        if manifest is not None:
+            manifest.mark_phase('code', 'done' if code_result['success'] else 'failed')
 
         return results
 
-    def parse_all_html_files(self, html_files: List[str], parser_path: str) -> Dict:
+    def _registry_fields(self) -> Optional[List[str]]:
+        """注册表匹配要求的字段：预定义模式为模板字段，自动模式不限制"""
+        if self.schema_mode == "predefined" and self.schema_template:
+            return list(self.schema_template.keys())
+        return None
+
+    def _fill_rate(self, parser_path: str, fields: List[str], html_files: List[str]) -> Optional[float]:
+        """解析器在样本上的平均字段填充率；加载失败或有样本解析出错时返回 None"""
+        report = self.validation_processor.process({
+            'parser_path': parser_path,
+            'fields': fields,
+            'samples': [{'idx': idx, 'html_path': path, 'schema': {}} for idx, path in enumerate(html_files, 1)],
+        })
+        if not report['success'] or report['errors'] or not report['fields']:
+            return None
+        rates = [stats['fill_rate'] for stats in report['fields'].values()]
+        return sum(rates) / len(rates)
+
+    def reuse_registered_parser(self, plan: Dict) -> Optional[Dict]:
+        """
+        在解析器注册表中查找布局相似的解析器，并在样本上验证
+
+        验证通过（无解析错误，字段填充率不低于登记时的 parser_registry_min_fill_ratio 倍）时，
+        将解析器、Schema 和 XPath 复制到输出目录，返回与 execute_plan 结构一致的执行结果
+
+        Args:
+            plan: 执行计划（计算的布局签名保存到 plan['layout_signature']，供生成后登记使用）
+
+        Returns:
+            命中时的执行结果，未命中时返回 None
+        """
+        if not settings.parser_registry_enabled:
+            return None
+
+        try:
+            html_list = [Path(path).read_text(encoding='utf-8', errors='ignore') for path in plan['sample_files']]
+            plan['layout_signature'] = layout_signature(html_list)
+        except Exception as e:
+            logger.warning(f"计算布局签名失败，跳过解析器注册表: {e}")
+            return None
+
+        candidates = parser_registry.find(plan['layout_signature'], self.schema_mode, self._registry_fields())
+        if not candidates:
+            logger.info("解析器注册表: 未找到布局相似的解析器")
+            return None
+
+        validation_files = plan['sample_files'][:max(1, settings.parser_registry_validation_samples)]
+        for entry in candidates:
+            entry_dir = Path(entry['dir'])
+            fill_rate = self._fill_rate(str(entry_dir / PARSER_FILENAME), entry['fields'], validation_files)
+            required = entry.get('fill_rate', 0.0) * settings.parser_registry_min_fill_ratio
+            if fill_rate is None or fill_rate < required:
+                logger.info(
+                    f"解析器注册表: 候选 {entry['id']}（布局相似度 {entry['similarity']:.3f}）验证未通过"
+                    + (f"，填充率 {fill_rate:.0%} < {required:.0%}" if fill_rate is not None else "，样本解析出错")
+                )
+                continue
+
+            logger.success(
+                f"解析器注册表命中: {entry['id']}（布局相似度 {entry['similarity']:.3f}，样本填充率 {fill_rate:.0%}），"
+                f"跳过Schema和代码阶段"
+            )
+            parser_registry.record_hit(entry)
+            return self._install_registered_parser(plan, entry)
+
+        return None
+
+    def _install_registered_parser(self, plan: Dict, entry: Dict) -> Dict:
+        """将注册表条目的文件复制到输出目录，构造执行结果"""
+        entry_dir = Path(entry['dir'])
+        parser_path = self.output_dir / "final_parser.py"
+        schema_path = self.schemas_dir / "final_schema.json"
+        shutil.copy2(entry_dir / PARSER_FILENAME, parser_path)
+        shutil.copy2(entry_dir / SCHEMA_FILENAME, schema_path)
+
+        xpath_file = None
+        if (entry_dir / XPATHS_FILENAME).exists():
+            xpath_file = self.parsers_dir / "xpaths.json"
+            shutil.copy2(entry_dir / XPATHS_FILENAME, xpath_file)
+
+        with open(schema_path, 'r', encoding='utf-8') as f:
+            final_schema = json.load(f)
+        final_parser = {
+            'parser_path': str(parser_path),
+            'code': parser_path.read_text(encoding='utf-8'),
+            'config_path': None,
+            'config': final_schema,
+        }
+        return {
+            'plan': plan,
+            'schema_phase': {'success': True, 'rounds': [], 'final_schema': final_schema, 'final_schema_path': str(schema_path)},
+            'code_phase': {'success': True, 'rounds': [], 'final_parser': final_parser,
+                           **({'xpath_file': str(xpath_file)} if xpath_file else {})},
+            'final_parser': final_parser,
+            'registry_entry': entry['id'],
+            'success': True,
+        }
+
+    def register_parser(self, plan: Dict, execution_result: Dict) -> Optional[str]:
+        """将新生成的解析器登记到注册表（需先调用 reuse_registered_parser 计算布局签名）"""
+        signature = plan.get('layout_signature')
+        if not settings.parser_registry_enabled or not signature:
+            return None
+
+        final_parser = execution_result['final_parser']
+        schema_phase = execution_result['schema_phase']
+        fields = list(schema_phase['final_schema'].keys())
+        validation_files = plan['sample_files'][:max(1, settings.parser_registry_validation_samples)]
+        fill_rate = self._fill_rate(final_parser['parser_path'], fields, validation_files)
+        if fill_rate is None:
+            logger.warning("新解析器在样本上解析出错，不登记到解析器注册表")
+            return None
+
+        try:
+            return parser_registry.register(
+                signature=signature,
+                schema_mode=self.schema_mode,
+                fields=fields,
+                parser_path=final_parser['parser_path'],
+                schema_path=schema_phase['final_schema_path'],
+                xpaths_path=execution_result['code_phase'].get('xpath_file'),
+                fill_rate=fill_rate,
+                domain=plan.get('domain'),
+            )
+        except OSError as e:
+            logger.warning(f"登记解析器失败: {e}")
+            return None
+
+    def parse_all_html_files(self, html_files: List[str], parser_path: str, execution_result: Dict = None) -> Dict:
         """
         使用生成的解析器批量解析所有HTML文件
 
         Args:
             html_files: 所有HTML文件路径列表
             parser_path: 解析器文件路径
+            execution_result: 执行结果（提供 xpaths.json 和最终 Schema 路径，供 XPath 运行时使用）
 
         Returns:
             批量解析结果
         """
+        execution_result = execution_result or {}
         return self.parser_processor.process({
             'html_files': html_files,
             'parser_path': parser_path,
+            'xpaths_path': execution_result.get('code_phase', {}).get('xpath_file'),
+            'schema_path': execution_result.get('schema_phase', {}).get('final_schema_path'),
         })
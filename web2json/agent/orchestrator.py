@@ -8,7 +8,10 @@ from pathlib import Path
 from loguru import logger
 from .planner import AgentPlanner
 from .executor import AgentExecutor
+from .run_manifest import RunManifest
 from web2json.config.settings import settings
+from web2json.utils.input_manifest import write_input_manifest
+from web2json.utils.usage_ledger import UsageLedger, use_ledger
 
 
 class ParserAgent:
@@ -18,7 +21,8 @@ class ParserAgent:
     通过给定一组HTML文件，自动生成能够解析这些页面的Python代码
     """
 
-    def __init__(self, output_dir: str = "output", schema_mode: str = None, schema_template: Dict = None, progress_callback=None):
+    def __init__(self, output_dir: str = "output", schema_mode: str = None, schema_template: Dict = None, progress_callback=None,
+                 usage_ledger: Optional[UsageLedger] = None):
         """
         初始化Agent
 
@@ -27,6 +31,7 @@ class ParserAgent:
             schema_mode: Schema模式 (auto: 自动提取, predefined: 使用预定义模板)
             schema_template: 预定义的Schema模板（当schema_mode=predefined时使用）
             progress_callback: 进度回调函数 callback(phase, step, percentage)
+            usage_ledger: LLM用量台账（可选，不传时每次运行新建一个，预算取 settings.task_token_budget）
         """
         self.planner = AgentPlanner()
         self.schema_mode = schema_mode or settings.schema_mode
@@ -39,6 +44,7 @@ class ParserAgent:
             progress_callback=progress_callback
         )
         self.output_dir = Path(output_dir)
+        self.usage_ledger = usage_ledger
 
 
     def generate_parser(
@@ -47,7 +53,8 @@ class ParserAgent:
         domain: str = None,
         iteration_rounds: int = None,
         schema_mode: str = None,
-        schema_template: str = None
+        schema_template: str = None,
+        resume: bool = False
     ) -> Dict:
         """
         生成解析器
@@ -66,10 +73,50 @@ class ParserAgent:
             iteration_rounds: 迭代轮数（用于Schema学习的样本数量），默认为3
             schema_mode: Schema模式 (auto/predefined)，覆盖初始化时的设置
             schema_template: 预定义schema模板文件路径（JSON格式）
+            resume: 断点续跑，复用输出目录运行清单中输入未变的已完成步骤
 
         Returns:
-            生成结果
+            生成结果（包含 usage：本次运行按阶段统计的 LLM 用量；resumed_steps：续跑时复用的步骤）
         """
+        ledger = self.usage_ledger or UsageLedger(budget_tokens=settings.task_token_budget, name=domain or "")
+        manifest = RunManifest(self.output_dir, resume=resume)
+        self._write_input_manifest(html_files)
+        with use_ledger(ledger):
+            result = self._generate_parser(html_files, domain, iteration_rounds, schema_mode, schema_template, ledger, manifest)
+
+        result['resumed_steps'] = list(manifest.reused_steps)
+
+        result['usage'] = ledger.to_dict()
+        if ledger.budget_exceeded and not result['success']:
+            result['error'] = f"Token预算超限（预算 {ledger.budget_tokens}），已提前终止"
+            logger.error(result['error'])
+        return result
+
+    def _write_input_manifest(self, html_files: List[str]) -> None:
+        """记录本次运行的输入清单（按 input_materialize 配置决定是否在 input_html/ 放置链接或副本），
+        批量解析之外的下游（XPath 运行时对比、ZIP 打包）通过它找到输入页面"""
+        try:
+            manifest_path = write_input_manifest(
+                html_files,
+                self.output_dir,
+                materialize_dir=self.output_dir / "input_html",
+                mode=settings.input_materialize,
+            )
+            logger.info(f"已写入{len(html_files)}个HTML文件的输入清单: {manifest_path}")
+        except Exception as e:
+            logger.error(f"写入输入清单失败: {e}")
+
+    def _generate_parser(
+        self,
+        html_files: List[str],
+        domain: str,
+        iteration_rounds: int,
+        schema_mode: str,
+        schema_template: str,
+        ledger: UsageLedger,
+        manifest: RunManifest
+    ) -> Dict:
+        """generate_parser 的实际流程（在绑定了用量台账的上下文中执行）"""
         # 如果提供了schema_mode参数，更新模式
         if schema_mode:
             self.schema_mode = schema_mode
@@ -115,20 +162,27 @@ class ParserAgent:
         if self.progress_callback:
             self.progress_callback("planning", "创建执行计划", 5)
         plan = self.planner.create_plan(html_files, domain, iteration_rounds)
+        manifest.record_run(html_files, domain=domain, iteration_rounds=iteration_rounds, schema_mode=self.schema_mode)
+        manifest.mark_phase('plan', 'done')
 
         # 第二步：执行（两阶段迭代）
         logger.info("\n[步骤 2/4] 执行计划 - 两阶段迭代")
         if self.progress_callback:
             self.progress_callback("execution", "开始两阶段迭代", 10)
-        execution_result = self.executor.execute_plan(plan)
-
-        if not execution_result['success']:
-            logger.error("执行失败，无法生成解析器")
-            return {
-                'success': False,
-                'error': '执行失败',
-                'execution_result': execution_result
-            }
+        execution_result = self.executor.reuse_registered_parser(plan)
+        if execution_result is not None:
+            manifest.mark_phase('registry', 'hit')
+        else:
+            execution_result = self.executor.execute_plan(plan, manifest=manifest)
+
+            if not execution_result['success']:
+                logger.error("执行失败，无法生成解析器")
+                return {
+                    'success': False,
+                    'error': '执行失败',
+                    'execution_result': execution_result
+                }
+            self.executor.register_parser(plan, execution_result)
 
         # 第三步：批量解析所有HTML文件
         logger.info("\n[步骤 3/4] 批量解析所有HTML文件")
@@ -137,16 +191,19 @@ class ParserAgent:
         parser_path = execution_result['final_parser']['parser_path']
         all_html_files = plan['all_html_files']
 
+        manifest.mark_phase('parse', 'running')
         parse_result = self.executor.parse_all_html_files(
             html_files=all_html_files,
-            parser_path=parser_path
+            parser_path=parser_path,
+            execution_result=execution_result,
         )
+        manifest.mark_phase('parse', 'done' if parse_result['success'] else 'failed')
 
         # 第四步：总结
         logger.info("\n[步骤 4/4] 生成总结")
         if self.progress_callback:
             self.progress_callback("summary", "生成执行总结", 98)
-        summary = self._generate_summary(execution_result, parse_result)
+        summary = self._generate_summary(execution_result, parse_result, ledger, manifest)
 
         return {
             'success': True,
@@ -157,9 +214,11 @@ class ParserAgent:
             'parser_path': execution_result['final_parser']['parser_path'],
             'config_path': execution_result['final_parser'].get('config_path'),
             'results_dir': parse_result.get('output_dir'),
+            'registry_entry': execution_result.get('registry_entry'),
         }
 
-    def _generate_summary(self, execution_result: Dict, parse_result: Dict = None) -> str:
+    def _generate_summary(self, execution_result: Dict, parse_result: Dict = None, ledger: UsageLedger = None,
+                          manifest: RunManifest = None) -> str:
         """生成执行总结"""
         lines = []
         lines.append("\n" + "="*70)
@@ -179,6 +238,9 @@ class ParserAgent:
         if schema_phase.get('final_schema_path'):
             lines.append(f"  最终Schema路径: {schema_phase['final_schema_path']}")
 
+        if execution_result.get('registry_entry'):
+            lines.append(f"  复用注册表中的解析器: {execution_result['registry_entry']}（跳过Schema和代码阶段）")
+
         # 代码迭代阶段结果
         code_phase = execution_result.get('code_phase', {})
         code_rounds = code_phase.get('rounds', [])
@@ -195,8 +257,63 @@ class ParserAgent:
             lines.append(f"  成功解析: {len(parse_result.get('parsed_files', []))}/{parse_result.get('total_files', 0)} 个文件")
             if parse_result.get('failed_files'):
                 lines.append(f"  失败: {len(parse_result['failed_files'])} 个文件")
+            incremental = parse_result.get('incremental')
+            if incremental and (incremental['skipped'] or incremental['removed']):
+                lines.append(
+                    f"  增量解析: 跳过未变化 {incremental['skipped']}，解析 {incremental['parsed']}，"
+                    f"清理已删除 {incremental['removed']}"
+                )
             lines.append(f"  结果保存目录: {parse_result.get('output_dir', '')}")
 
+        if manifest is not None and manifest.reused_steps:
+            lines.append(f"\n断点续跑: 复用 {len(manifest.reused_steps)} 个已完成步骤（{', '.join(manifest.reused_steps)}）")
+
+        # LLM 调用统计
+        from web2json.utils.llm_client import LLMClient
+        pool_stats = LLMClient.get_pool_stats()
+        rate_stats = LLMClient.get_rate_limit_stats()
+        resilience_stats = LLMClient.get_resilience_stats()
+        lines.append(f"\nLLM调用统计:")
+        if ledger is not None:
+            usage = ledger.to_dict()
+            total = usage['total']
+            lines.append(
+                f"  调用数: {total['calls']}（缓存命中 {total['cache_hits']}）, 总Token: {total['total_tokens']}, "
+                f"累计耗时: {total['latency_seconds']:.1f}s"
+            )
+            for phase, bucket in usage['phases'].items():
+                lines.append(
+                    f"    - {phase}: {bucket['calls']} 次, Token {bucket['total_tokens']}, "
+                    f"耗时 {bucket['latency_seconds']:.1f}s（最长 {bucket['max_latency_seconds']:.1f}s）"
+                )
+            for tier, bucket in usage['tiers'].items():
+                lines.append(
+                    f"    - 档位 {tier}: {bucket['calls']} 次, Token {bucket['total_tokens']}, "
+                    f"耗时 {bucket['latency_seconds']:.1f}s, 费用 ${bucket['cost_usd']:.4f}"
+                    + (f", 校验未通过升级 {bucket['fallbacks']} 次" if bucket['fallbacks'] else "")
+                )
+            if total['cached_input_tokens']:
+                lines.append(
+                    f"  前缀缓存: 输入Token {total['input_tokens']} 中命中 {total['cached_input_tokens']} "
+                    f"({total['cached_input_tokens'] / max(total['input_tokens'], 1):.1%})"
+                )
+            if usage['budget_tokens']:
+                lines.append(f"  Token预算: {total['total_tokens']}/{usage['budget_tokens']}")
+        lines.append(
+            f"  HTTP连接: 新建 {pool_stats['new_connections']}, 复用 {pool_stats['reused_connections']} "
+            f"(复用率 {pool_stats['reuse_rate']:.1%})"
+        )
+        if resilience_stats['retries'] or resilience_stats['hedges']:
+            lines.append(
+                f"  重试: {resilience_stats['retries']} 次, 对冲: {resilience_stats['hedges']} 次"
+                f"（对冲胜出 {resilience_stats['hedge_wins']} 次）"
+            )
+        if rate_stats['enabled']:
+            lines.append(
+                f"  限流排队: {rate_stats['waited_requests']}/{rate_stats['requests']} 次请求等待, "
+                f"累计 {rate_stats['total_wait_seconds']:.1f}s, 最长 {rate_stats['max_wait_seconds']:.1f}s"
+            )
+
         lines.append("="*70)
 
         summary = "\n".join(lines)
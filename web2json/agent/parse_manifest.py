@@ -0,0 +1,152 @@
+"""
+增量批量解析清单
+在结果目录中记录每个输入文件的内容哈希、解析器哈希和结果位置（parse_manifest.json）。
+再次批量解析同一批输入时，只解析新增或内容变化的页面；解析器（或解析引擎、结果格式）变化时全部重新解析；
+已不在输入中的页面删除其结果。文件大小和修改时间都未变化时直接视为未变，不重新计算哈希
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from web2json.agent.run_manifest import content_digest
+from web2json.utils.input_manifest import file_digest
+from web2json.utils.result_store import PARSE_MANIFEST_FILENAME
+
+PARSE_MANIFEST_VERSION = 1
+
+
+def parser_digest(parser_path: str, *extra_paths: Optional[str], **params) -> str:
+    """解析器的哈希（解析器文件、影响输出的附加文件如 xpaths.json / Schema，以及引擎等参数）"""
+    return content_digest({
+        'parser': file_digest(parser_path),
+        'extra': [file_digest(path) if path and Path(path).exists() else None for path in extra_paths],
+        'params': params,
+    })
+
+
+class ParseManifest:
+    """结果目录的增量解析清单"""
+
+    def __init__(self, result_dir: Path):
+        """
+        Args:
+            result_dir: 批量解析结果目录（清单保存在其中）
+        """
+        self.path = Path(result_dir) / PARSE_MANIFEST_FILENAME
+        self.data = self._load() or {'version': PARSE_MANIFEST_VERSION, 'parser_hash': None, 'output': None, 'files': {}}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        # 最近一次 plan 的结论（是否全部重新解析、已删除页面数）
+        self.full = False
+        self.removed = 0
+        self._pending_hashes: Dict[str, Dict[str, Any]] = {}
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"增量解析清单无法读取，全部重新解析: {e}")
+            return None
+        if data.get('version') != PARSE_MANIFEST_VERSION:
+            return None
+        return data
+
+    @staticmethod
+    def key(html_file: str) -> str:
+        return str(Path(html_file).absolute())
+
+    def plan(self, html_files: Iterable[str], parser_hash: str, output: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        对比清单，划分需要解析的页面
+
+        Args:
+            html_files: 本次的全部输入文件
+            parser_hash: 解析器哈希（parser_digest）
+            output: 结果格式参数（格式变化时结果位置不可复用）
+
+        Returns:
+            {
+                'full': bool,            # 解析器或结果格式变化，全部重新解析
+                'unchanged': Dict,       # 未变化页面 -> 清单条目
+                'pending': List[str],    # 需要解析的页面
+                'stale': List[Dict],     # 内容变化或已删除页面的旧条目（旧结果需要清理）
+                'removed': int,          # 已不在输入中的页面数
+            }
+        """
+        previous = self.data.get('files', {})
+        full = bool(previous) and (self.data.get('parser_hash') != parser_hash or self.data.get('output') != output)
+        reusable = {} if full else previous
+
+        unchanged: Dict[str, Dict[str, Any]] = {}
+        pending: List[str] = []
+        current = set()
+        for html_file in html_files:
+            key = self.key(html_file)
+            current.add(key)
+            try:
+                stat = os.stat(html_file)
+                entry = reusable.get(key)
+                if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+                    unchanged[key] = entry
+                    continue
+                digest = file_digest(html_file)
+            except OSError:
+                # 缺失或无法读取的输入照常交给解析，由解析结果记录为失败（与非增量解析一致）
+                pending.append(html_file)
+                continue
+            if entry and entry.get('html_hash') == digest:
+                unchanged[key] = {**entry, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                continue
+            self._pending_hashes[key] = {'html_hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            pending.append(html_file)
+
+        stale = [entry for key, entry in previous.items() if key not in unchanged]
+        self.files = dict(unchanged)
+        self.data['parser_hash'] = parser_hash
+        self.data['output'] = output
+        self.full = full
+        self.removed = sum(1 for key in previous if key not in current)
+        return {
+            'full': full,
+            'unchanged': unchanged,
+            'pending': pending,
+            'stale': stale,
+            'removed': self.removed,
+        }
+
+    def record(self, html_file: str, location: Dict[str, Any], fields_count: int) -> None:
+        """记录解析成功的页面及其结果位置"""
+        key = self.key(html_file)
+        hashes = self._pending_hashes.get(key)
+        if hashes is None:
+            try:
+                stat = os.stat(html_file)
+                hashes = {'html_hash': file_digest(html_file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            except OSError as e:
+                logger.debug(f"输入文件无法读取，不记入增量解析清单: {html_file}: {e}")
+                return
+        self.files[key] = {**hashes, 'location': location, 'fields_count': fields_count}
+
+    def relocate(self, html_file: str, location: Dict[str, Any]) -> None:
+        """更新未变化页面的结果位置（分片输出中结果被搬运到新分片时）"""
+        self.files[self.key(html_file)]['location'] = location
+
+    def forget(self, html_file: str) -> None:
+        """移除页面（解析失败或结果已丢失，下次重新解析）"""
+        self.files.pop(self.key(html_file), None)
+
+    def save(self) -> None:
+        """原子写入清单"""
+        self.data['files'] = self.files
+        self.data['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,177 @@
+"""
+解析器注册表
+按布局签名（样本融合布局特征的质心）+ Schema 模式 + 字段，在本地保存已生成的
+final_parser.py / final_schema.json / xpaths.json。同一站点模板再次出现时，
+ParserAgent 先查注册表并在样本上验证候选解析器，命中则跳过 Schema 和代码阶段直接批量解析
+"""
+import hashlib
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from web2json.config.settings import settings
+from web2json.tools.cluster import signature_similarity
+
+ENTRY_FILENAME = "entry.json"
+PARSER_FILENAME = "final_parser.py"
+SCHEMA_FILENAME = "final_schema.json"
+XPATHS_FILENAME = "xpaths.json"
+
+# 指纹取权重最大的特征数
+_FINGERPRINT_FEATURES = 50
+
+
+def signature_fingerprint(signature: Dict[str, float]) -> str:
+    """布局签名的指纹（权重最大的特征名集合的哈希），用作注册表条目目录名的一部分"""
+    top = sorted(signature, key=lambda key: (-signature[key], key))[:_FINGERPRINT_FEATURES]
+    return hashlib.sha256("\n".join(sorted(top)).encode('utf-8')).hexdigest()
+
+
+def _fields_key(fields: Optional[List[str]]) -> str:
+    return hashlib.sha256(json.dumps(sorted(fields or [])).encode('utf-8')).hexdigest()
+
+
+class ParserRegistry:
+    """本地解析器注册表（目录结构: <registry_dir>/<条目ID>/{entry.json, final_parser.py, final_schema.json, xpaths.json}）"""
+
+    def __init__(self, registry_dir: Optional[str] = None):
+        """
+        Args:
+            registry_dir: 注册表目录（默认使用 settings.parser_registry_dir）
+        """
+        self._registry_dir = registry_dir
+        self._lock = threading.Lock()
+
+    @property
+    def registry_dir(self) -> Path:
+        return Path(self._registry_dir or settings.parser_registry_dir)
+
+    def _entries(self) -> List[Dict[str, Any]]:
+        entries = []
+        if not self.registry_dir.exists():
+            return entries
+        for entry_file in self.registry_dir.glob(f"*/{ENTRY_FILENAME}"):
+            try:
+                with open(entry_file, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"解析器注册表条目无法读取，忽略: {entry_file}: {e}")
+                continue
+            entry['dir'] = str(entry_file.parent)
+            entries.append(entry)
+        return entries
+
+    def find(
+        self,
+        signature: Dict[str, float],
+        schema_mode: str,
+        fields: Optional[List[str]] = None,
+        threshold: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        查找布局相似的已注册解析器
+
+        Args:
+            signature: 布局签名（layout_signature 的返回值）
+            schema_mode: Schema 模式，必须一致
+            fields: 需要的字段（预定义模式下必须与条目字段完全一致；为 None 时不限制）
+            threshold: 最低布局相似度（默认使用 settings.parser_registry_threshold）
+
+        Returns:
+            按相似度从高到低排列的条目列表（每个条目附带 'similarity' 和 'dir'）
+        """
+        if not signature:
+            return []
+        threshold = settings.parser_registry_threshold if threshold is None else threshold
+
+        candidates = []
+        for entry in self._entries():
+            if entry.get('schema_mode') != schema_mode:
+                continue
+            if fields is not None and sorted(entry.get('fields', [])) != sorted(fields):
+                continue
+            similarity = signature_similarity(signature, entry.get('signature', {}))
+            if similarity >= threshold:
+                entry['similarity'] = round(similarity, 4)
+                candidates.append(entry)
+        return sorted(candidates, key=lambda entry: -entry['similarity'])
+
+    def register(
+        self,
+        signature: Dict[str, float],
+        schema_mode: str,
+        fields: List[str],
+        parser_path: str,
+        schema_path: str,
+        xpaths_path: Optional[str] = None,
+        fill_rate: float = 0.0,
+        domain: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        登记（或覆盖）一个解析器
+
+        Args:
+            signature: 布局签名
+            schema_mode: Schema 模式
+            fields: 解析器输出的字段
+            parser_path: final_parser.py 路径
+            schema_path: final_schema.json 路径
+            xpaths_path: xpaths.json 路径（可选）
+            fill_rate: 解析器在学习样本上的平均字段填充率（命中时的验证基准）
+            domain: 域名（可选，仅用于记录）
+
+        Returns:
+            条目ID；签名为空时不登记，返回 None
+        """
+        if not signature:
+            return None
+
+        entry_id = f"{signature_fingerprint(signature)[:16]}_{schema_mode}_{_fields_key(fields)[:8]}"
+        entry_dir = self.registry_dir / entry_id
+        with self._lock:
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(parser_path, entry_dir / PARSER_FILENAME)
+            shutil.copy2(schema_path, entry_dir / SCHEMA_FILENAME)
+            if xpaths_path and Path(xpaths_path).exists():
+                shutil.copy2(xpaths_path, entry_dir / XPATHS_FILENAME)
+            else:
+                (entry_dir / XPATHS_FILENAME).unlink(missing_ok=True)
+
+            entry = {
+                'id': entry_id,
+                'schema_mode': schema_mode,
+                'fields': list(fields),
+                'fill_rate': round(fill_rate, 4),
+                'domain': domain,
+                'signature': signature,
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'hits': 0,
+            }
+            with open(entry_dir / ENTRY_FILENAME, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, indent=2)
+
+        logger.success(f"解析器已登记到注册表: {entry_id}")
+        return entry_id
+
+    def record_hit(self, entry: Dict[str, Any]) -> None:
+        """记录条目命中次数和最近使用时间"""
+        entry_file = Path(entry['dir']) / ENTRY_FILENAME
+        with self._lock:
+            try:
+                with open(entry_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data['hits'] = data.get('hits', 0) + 1
+                data['last_used_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+                with open(entry_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"更新注册表条目失败: {e}")
+
+
+# 全局注册表实例
+parser_registry = ParserRegistry()
@@ -3,11 +3,13 @@
 负责协调解析器代码的生成和优化流程
 """
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from loguru import logger
 
-from web2json.agent.processors import CodeProcessor
+from web2json.config.settings import settings
+from web2json.agent.processors import CodeProcessor, ValidationProcessor
+from web2json.agent.run_manifest import CODE_SETTINGS, RunManifest, content_digest, settings_snapshot
 from web2json.tools.xpath_extractor import XPathExtractor
 
 from .base_phase import BasePhase
@@ -16,7 +18,13 @@ from .base_phase import BasePhase
 class CodePhase(BasePhase):
     """代码迭代阶段管理器"""
 
-    def __init__(self, code_processor: CodeProcessor, output_dir: Path, progress_callback=None):
+    def __init__(
+        self,
+        code_processor: CodeProcessor,
+        output_dir: Path,
+        progress_callback=None,
+        validation_processor: Optional[ValidationProcessor] = None
+    ):
         """
         初始化代码阶段管理器
 
@@ -24,10 +32,101 @@ class CodePhase(BasePhase):
             code_processor: 代码处理器
             output_dir: 输出目录
             progress_callback: 进度回调函数 callback(phase, step, percentage)
+            validation_processor: 解析器验证处理器（可选，默认新建）
         """
         self.code_processor = code_processor
         self.output_dir = output_dir
         self.progress_callback = progress_callback
+        self.validation_processor = validation_processor or ValidationProcessor()
+        # 运行清单（断点续跑时由执行器设置）
+        self.manifest: Optional[RunManifest] = None
+
+    # 代码迭代进度：35-80%，每轮分配15%
+    _BASE_PROGRESS = 35
+    _PROGRESS_PER_ROUND = 15
+
+    def _generation_progress(self, idx: int, total_rounds: int):
+        """将流式生成的进度（已生成字段数）映射为本轮进度区间内的百分比"""
+        if not self.progress_callback:
+            return None
+
+        start = self._BASE_PROGRESS + (idx - 1) * self._PROGRESS_PER_ROUND
+
+        def on_progress(progress: Dict) -> None:
+            fields_total = progress['fields_total']
+            ratio = progress['fields_done'] / fields_total if fields_total else 0
+            # 生成完成前最多推进到本轮区间的 90%
+            percentage = start + int(self._PROGRESS_PER_ROUND * 0.9 * min(ratio, 1.0))
+            self.progress_callback(
+                "code_iteration",
+                f"代码迭代第 {idx}/{total_rounds} 轮：已生成 {progress['lines']} 行，"
+                f"{progress['fields_done']}/{fields_total} 个字段",
+                percentage,
+            )
+
+        return on_progress
+
+    def _generate_code(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """生成或优化一轮解析代码；输入（HTML、Schema、上一轮代码和验证反馈）未变时复用运行清单中的结果"""
+        if self.manifest is None:
+            return self.code_processor.process(input_data)
+
+        step = f"code/{input_data['idx']}"
+        inputs_hash = content_digest({
+            'html': input_data['html_content'],
+            'target_json': input_data['target_json'],
+            'previous_parser_code': input_data.get('previous_parser_code'),
+            'validation_feedback': input_data.get('validation_feedback'),
+            'settings': settings_snapshot(CODE_SETTINGS),
+        })
+        outputs = self.manifest.lookup(step, inputs_hash)
+        if outputs is not None:
+            with open(outputs['parser_path'], 'r', encoding='utf-8') as f:
+                code = f.read()
+            return {'success': True, 'idx': input_data['idx'], 'code': code, 'parser_path': outputs['parser_path']}
+
+        code_result = self.code_processor.process(input_data)
+        if code_result['success']:
+            self.manifest.complete(step, inputs_hash, {'parser_path': code_result['parser_path']})
+        return code_result
+
+    def _extract_xpaths(self, parser_path: str, output_path: Path) -> bool:
+        """从最终解析器提取 XPath；解析器代码未变时复用运行清单中的结果"""
+        inputs_hash = None
+        if self.manifest is not None:
+            with open(parser_path, 'r', encoding='utf-8') as f:
+                inputs_hash = content_digest({'parser_code': f.read(), 'settings': settings_snapshot(CODE_SETTINGS)})
+            if self.manifest.lookup("xpath", inputs_hash) is not None:
+                return True
+
+        success = XPathExtractor().extract_and_save_with_llm(parser_path=parser_path, output_path=str(output_path))
+        if success and self.manifest is not None:
+            self.manifest.complete("xpath", inputs_hash, {'xpath_path': str(output_path)})
+        return success
+
+    @staticmethod
+    def _validation_samples(schema_phase_rounds: List[Dict]) -> List[Dict]:
+        """验证用的样本：原始 HTML（与批量解析一致）和该样本的 Schema（含 value_sample）"""
+        return [
+            {
+                'idx': sample_no,
+                'html_path': schema_round.get('html_original_path') or schema_round['html_path'],
+                'schema': schema_round.get('html_schema') or {},
+            }
+            for sample_no, schema_round in enumerate(schema_phase_rounds, 1)
+            if schema_round.get('success') and (schema_round.get('html_original_path') or schema_round.get('html_path'))
+        ]
+
+    @staticmethod
+    def _next_round_position(pending_rounds: List[tuple], validation_report: Optional[Dict]) -> int:
+        """选择下一轮使用的样本：优先选上一轮验证中失败最多的样本，否则按原顺序"""
+        if validation_report:
+            ranking = ValidationProcessor.failing_samples(validation_report)
+            for sample_no in ranking:
+                for position, (pending_no, _) in enumerate(pending_rounds):
+                    if pending_no == sample_no:
+                        return position
+        return 0
 
     def execute(
         self,
@@ -41,6 +140,10 @@ class CodePhase(BasePhase):
         第一轮：基于最终 Schema 生成初始解析代码
         后续轮：基于验证结果优化代码
 
+        启用本地验证（code_validation_enabled）时，每轮生成后在所有样本上运行候选解析器并对比 value_sample：
+        全部字段满足即提前结束迭代；否则下一轮选用失败最多的样本，并只把未通过的字段反馈给模型。
+        最终解析器取验证匹配率最高的一轮
+
         Args:
             final_schema: 来自 Schema 迭代阶段的最终 Schema
             schema_phase_rounds: Schema 阶段的轮次数据（包含 HTML）
@@ -72,21 +175,33 @@ class CodePhase(BasePhase):
         current_parser_code = None
         current_parser_path = None
 
-        # 使用 Schema 阶段的轮次数据
+        validation_enabled = settings.code_validation_enabled
+        validation_samples = self._validation_samples(schema_phase_rounds) if validation_enabled else []
+        validation_report = None
+        best_parser = None  # (匹配率, 代码, 路径)
+
+        # 使用 Schema 阶段的轮次数据（启用验证时按失败情况调整样本顺序）
         total_rounds = len(schema_phase_rounds)
-        for idx, schema_round in enumerate(schema_phase_rounds, 1):
+        pending_rounds = list(enumerate(schema_phase_rounds, 1))
+        idx = 0
+        current_round = None  # 当前解析器所属的代码迭代轮次
+        while pending_rounds:
+            # idx 为代码迭代轮次；sample_no 为样本在 Schema 阶段的轮次（验证后样本顺序可能调整）
+            position = self._next_round_position(pending_rounds, validation_report)
+            sample_no, schema_round = pending_rounds.pop(position)
+            idx += 1
             if not schema_round.get('success'):
-                logger.warning(f"Schema阶段第 {idx} 轮失败，跳过代码生成")
+                logger.warning(f"Schema阶段第 {sample_no} 轮失败，跳过代码生成")
                 continue
 
             logger.info(f"\n{'─'*70}")
-            logger.info(f"代码迭代 - 第 {idx}/{len(schema_phase_rounds)} 轮")
+            logger.info(f"代码迭代 - 第 {idx}/{len(schema_phase_rounds)} 轮（样本 {sample_no}）")
             logger.info(f"{'─'*70}")
 
             # 更新代码迭代进度：35-80%，每轮分配15%
             if self.progress_callback:
-                base_progress = 35
-                progress_per_round = 15
+                base_progress = self._BASE_PROGRESS
+                progress_per_round = self._PROGRESS_PER_ROUND
                 start_progress = base_progress + (idx - 1) * progress_per_round
                 self.progress_callback("code_iteration", f"代码迭代第 {idx}/{total_rounds} 轮", start_progress)
 
@@ -94,23 +209,25 @@ class CodePhase(BasePhase):
                 # 复用 Schema 阶段的 HTML（精简后的）
                 html_path = schema_round.get('html_path')
                 if not html_path:
-                    logger.error(f"  ✗ Schema阶段第 {idx} 轮缺少HTML路径")
+                    logger.error(f"  ✗ Schema阶段第 {sample_no} 轮缺少HTML路径")
                     continue
 
                 with open(html_path, 'r', encoding='utf-8') as f:
                     html_content = f.read()
 
                 # 生成或优化解析代码
-                if idx == 1:
+                if current_round is None:
                     logger.info(f"  生成初始解析代码...")
                 else:
-                    logger.info(f"  优化解析代码（基于第 {idx-1} 轮）...")
-                code_result = self.code_processor.process({
+                    logger.info(f"  优化解析代码（基于第 {current_round} 轮）...")
+                code_result = self._generate_code({
                     'html_content': html_content,
                     'target_json': final_schema,
                     'idx': idx,
                     'previous_parser_code': current_parser_code,
                     'previous_parser_path': current_parser_path,
+                    'on_progress': self._generation_progress(idx, total_rounds),
+                    'validation_feedback': validation_report,
                 })
 
                 if not code_result['success']:
@@ -122,10 +239,12 @@ class CodePhase(BasePhase):
                 # 更新当前解析器
                 current_parser_code = code_result['code']
                 current_parser_path = code_result['parser_path']
+                current_round = idx
 
                 # 记录本轮结果（复用 Schema 阶段的数据）
                 round_result = {
                     'round': idx,
+                    'sample': sample_no,
                     'url': schema_round['url'],
                     'html_path': html_path,
                     'groundtruth_schema': schema_round.get('groundtruth_schema'),
@@ -143,6 +262,23 @@ class CodePhase(BasePhase):
                     end_progress = base_progress + idx * progress_per_round
                     self.progress_callback("code_iteration", f"代码迭代第 {idx}/{total_rounds} 轮完成", end_progress)
 
+                # 在所有样本上验证本轮解析器
+                if validation_enabled and validation_samples:
+                    validation_report = self.validation_processor.process({
+                        'parser_path': current_parser_path,
+                        'fields': list(final_schema.keys()),
+                        'samples': validation_samples,
+                    })
+                    round_result['validation'] = validation_report
+                    result['validation'] = validation_report
+                    if validation_report['success']:
+                        logger.info(f"  本地验证: {ValidationProcessor.summarize(validation_report)}")
+                        if best_parser is None or validation_report['score'] > best_parser[0]:
+                            best_parser = (validation_report['score'], current_parser_code, current_parser_path)
+                    if validation_report['all_satisfied']:
+                        logger.success(f"  ✓ 所有字段在 {len(validation_samples)} 个样本上均通过验证，提前结束代码迭代")
+                        break
+
             except Exception as e:
                 logger.error(f"代码迭代第 {idx} 轮失败: {str(e)}")
                 import traceback
@@ -150,6 +286,7 @@ class CodePhase(BasePhase):
 
                 round_result = {
                     'round': idx,
+                    'sample': sample_no,
                     'url': schema_round.get('url'),
                     'error': str(e),
                     'success': False,
@@ -160,6 +297,11 @@ class CodePhase(BasePhase):
                     # 第一轮失败则退出
                     return result
 
+        # 启用验证时，最终解析器取匹配率最高的一轮（后续轮次可能退化）
+        if best_parser is not None and best_parser[2] != current_parser_path:
+            logger.info(f"最终解析器使用验证匹配率最高的版本: {Path(best_parser[2]).name}（{best_parser[0]:.0%}）")
+            _, current_parser_code, current_parser_path = best_parser
+
         # 设置最终解析器
         if current_parser_code:
             final_parser = self.code_processor.save_final_parser(
@@ -179,13 +321,8 @@ class CodePhase(BasePhase):
                 if self.progress_callback:
                     self.progress_callback("xpath_extraction", "提取最优XPath表达式", 80)
 
-                xpath_extractor = XPathExtractor()
                 xpath_output_path = self.output_dir / "parsers" / "xpaths.json"
-
-                success = xpath_extractor.extract_and_save_with_llm(
-                    parser_path=final_parser['parser_path'],
-                    output_path=str(xpath_output_path)
-                )
+                success = self._extract_xpaths(final_parser['parser_path'], xpath_output_path)
 
                 if success:
                     logger.success(f"XPath提取完成: {xpath_output_path}")
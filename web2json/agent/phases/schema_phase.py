@@ -2,14 +2,19 @@
 Schema 迭代阶段管理器
 负责协调 HTML 处理和 Schema 提取/补充的完整流程
 """
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pathlib import Path
-from typing import Any, Dict, List
+import contextvars
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
 
 from loguru import logger
 
 from web2json.config.settings import settings
 from web2json.agent.processors import HtmlProcessor, SchemaProcessor
+from web2json.agent.run_manifest import SCHEMA_SETTINGS, RunManifest, content_digest, settings_snapshot
+from web2json.utils.input_manifest import file_digest
+from web2json.agent.schema_convergence import SchemaConvergenceTracker
 
 from .base_phase import BasePhase
 
@@ -37,18 +42,216 @@ class SchemaPhase(BasePhase):
         self.schema_processor = schema_processor
         self.schema_mode = schema_mode
         self.progress_callback = progress_callback
+        self._simplified_count = 0
+        self._completed_count = 0
+        # 运行清单（断点续跑时由执行器设置）
+        self.manifest: Optional[RunManifest] = None
+
+    def _sample_inputs_hash(self, html_file_path: str) -> str:
+        """单个样本精简 + Schema 提取步骤的输入哈希"""
+        return content_digest({
+            'html': file_digest(html_file_path),
+            'schema_template': self.schema_processor.schema_template,
+            'settings': settings_snapshot(SCHEMA_SETTINGS),
+        })
+
+    def _cached_sample(self, idx: int, html_file_path: str, inputs_hash: str) -> Optional[Tuple[Dict, Dict]]:
+        """从运行清单恢复已完成样本的精简结果和 Schema 结果"""
+        outputs = self.manifest.lookup(f"schema/{idx}", inputs_hash)
+        if outputs is None:
+            return None
+        try:
+            with open(outputs['html_path'], 'r', encoding='utf-8') as f:
+                html_content = f.read()
+            with open(outputs['schema_path'], 'r', encoding='utf-8') as f:
+                schema = json.load(f)
+        except (OSError, KeyError, json.JSONDecodeError) as e:
+            logger.warning(f"  [{idx}] 续跑产物读取失败，重新处理: {e}")
+            return None
+
+        simplified_data = {
+            'success': True,
+            'idx': idx,
+            'html_file': html_file_path,
+            'html_content': html_content,
+            'html_original_path': outputs['html_original_path'],
+            'html_path': outputs['html_path'],
+        }
+        schema_result = {'success': True, 'idx': idx, 'schema': schema, 'schema_path': outputs['schema_path']}
+        return simplified_data, schema_result
+
+    @staticmethod
+    def _simplify_workers(file_count: int) -> int:
+        """HTML 精简进程数（html_simplify_workers 为 0 时取 CPU 核数）"""
+        workers = settings.html_simplify_workers or os.cpu_count() or 1
+        return max(1, min(workers, file_count))
+
+    @staticmethod
+    def _create_simplify_executor(workers: int) -> Executor:
+        """创建 HTML 精简执行器：多于 1 个进程时使用进程池，无法创建进程池时退回单线程"""
+        if workers > 1:
+            try:
+                return ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"无法创建HTML精简进程池，改为单线程精简: {e}")
+        return ThreadPoolExecutor(max_workers=1)
+
+    def _simplify_result(self, future: Future, html_file_path: str, idx: int) -> Dict[str, Any]:
+        """取出精简结果；进程池异常退出（如子进程被杀）时在当前线程重新精简"""
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning(f"  [{idx}] 精简进程异常，改为在当前线程精简: {e}")
+            return self.html_processor.process({'html_file': html_file_path, 'idx': idx})
+
+    def _run_pipeline(self, files: List[Tuple[int, str]], total: int) -> Optional[Tuple[List[Dict], List[Dict]]]:
+        """流水线式精简并提取一批样本的 Schema
+
+        Args:
+            files: [(样本编号, HTML 文件路径)]
+            total: 本阶段样本总数（用于进度）
 
-    def execute(self, html_files: List[str]) -> Dict[str, Any]:
+        Returns:
+            (精简结果列表, Schema 结果列表)；第 1 个样本精简失败时返回 None
+        """
+        simplify_workers = self._simplify_workers(len(files))
+        max_workers = max(1, min(settings.max_concurrent_extractions, len(files)))
+        logger.info(f"\n{'═'*70}")
+        if self.schema_mode == "auto":
+            logger.info(f"阶段1-2/3: 精简HTML并提取 HTML Schema（{len(files)} 个样本，精简进程数: {simplify_workers}，提取并发数: {max_workers}）")
+        else:
+            logger.info(f"阶段1-2/3: 精简HTML并补充 xpath（{len(files)} 个样本，精简进程数: {simplify_workers}，提取并发数: {max_workers}）")
+        logger.info(f"{'═'*70}")
+
+        simplified_data_list = []
+        schema_results = []
+        simplified_count = self._simplified_count
+        completed_count = self._completed_count
+
+        simplify_executor = self._create_simplify_executor(simplify_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as extract_executor:
+                simplify_futures = {}
+                inputs_hashes = {}
+                for idx, html_file_path in files:
+                    if self.manifest is not None:
+                        inputs_hashes[idx] = self._sample_inputs_hash(html_file_path)
+                        cached = self._cached_sample(idx, html_file_path, inputs_hashes[idx])
+                        if cached is not None:
+                            simplified_data_list.append(cached[0])
+                            schema_results.append(cached[1])
+                            simplified_count += 1
+                            completed_count += 1
+                            continue
+                    simplify_futures[simplify_executor.submit(
+                        self.html_processor.process, {'html_file': html_file_path, 'idx': idx}
+                    )] = (html_file_path, idx)
+                pending = set(simplify_futures)
+                simplified_by_idx = {}
+
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in simplify_futures:
+                            html_file_path, idx = simplify_futures[future]
+                            simplified_data = self._simplify_result(future, html_file_path, idx)
+                            simplified_count += 1
+
+                            # 更新HTML简化进度：10-20%
+                            if self.progress_callback:
+                                progress = 10 + int((simplified_count / total) * 10)
+                                self.progress_callback("html_simplification", f"简化HTML文件 {simplified_count}/{total}", progress)
+
+                            if not simplified_data['success']:
+                                logger.error(f"HTML精简失败: {html_file_path}")
+                                if idx == 1:
+                                    for other in pending:
+                                        other.cancel()
+                                    return None
+                                continue
+
+                            simplified_data_list.append(simplified_data)
+                            simplified_by_idx[idx] = simplified_data
+                            # 每个任务复制当前上下文，使工作线程中的 LLM 调用记录到同一个用量台账
+                            pending.add(extract_executor.submit(
+                                contextvars.copy_context().run,
+                                self.schema_processor.process,
+                                {'html_content': simplified_data['html_content'], 'idx': idx}
+                            ))
+                        else:
+                            schema_result = future.result()
+                            if schema_result['success']:
+                                schema_results.append(schema_result)
+                                completed_count += 1
+                                if self.manifest is not None:
+                                    simplified = simplified_by_idx[schema_result['idx']]
+                                    self.manifest.complete(f"schema/{schema_result['idx']}", inputs_hashes[schema_result['idx']], {
+                                        'html_original_path': simplified['html_original_path'],
+                                        'html_path': simplified['html_path'],
+                                        'schema_path': schema_result['schema_path'],
+                                    })
+
+                                # 更新Schema提取进度：20-30%
+                                if self.progress_callback:
+                                    progress = 20 + int((completed_count / total) * 10)
+                                    self.progress_callback("schema_extraction", f"提取Schema {completed_count}/{total}", progress)
+        finally:
+            simplify_executor.shutdown(wait=False, cancel_futures=True)
+
+        self._simplified_count = simplified_count
+        self._completed_count = completed_count
+        return simplified_data_list, schema_results
+
+    def _adaptive_sampling(self, candidate_files: List[str]) -> Optional[Tuple[List[Dict], List[Dict], Dict]]:
+        """自适应采样：分批精简并提取 Schema，直到 Schema 收敛或候选样本用完
+
+        每批只取收敛检测还需要的样本数；样本之间出现新字段或 xpath 不一致时连续计数清零，
+        下一批相应增大，直到达到候选样本上限
+
+        Returns:
+            (精简结果列表, Schema 结果列表, 收敛检测结果)；第 1 个样本精简失败时返回 None
+        """
+        tracker = SchemaConvergenceTracker(settings.schema_convergence_window, settings.schema_min_samples)
+        total = len(candidate_files)
+        simplified_data_list: List[Dict] = []
+        schema_results: List[Dict] = []
+        position = 0
+
+        while position < total and not tracker.converged:
+            batch = candidate_files[position:position + max(1, tracker.samples_needed())]
+            files = [(position + offset, path) for offset, path in enumerate(batch, 1)]
+            position += len(batch)
+
+            pipeline = self._run_pipeline(files, total)
+            if pipeline is None:
+                return None
+            batch_simplified, batch_schemas = pipeline
+            simplified_data_list.extend(batch_simplified)
+            schema_results.extend(batch_schemas)
+
+            # 按样本顺序送入收敛检测，结果与并发完成顺序无关
+            html_by_idx = {item['idx']: item['html_content'] for item in batch_simplified}
+            for schema_result in sorted(batch_schemas, key=lambda x: x['idx']):
+                tracker.add(schema_result['idx'], schema_result['schema'], html_by_idx.get(schema_result['idx']))
+
+        if tracker.converged:
+            logger.success(f"✓ Schema 已在 {tracker.samples} 个样本后收敛（候选 {total} 个）")
+        else:
+            logger.warning(f"Schema 在 {tracker.samples} 个样本内未收敛，使用全部已提取的样本")
+        return simplified_data_list, schema_results, tracker.to_dict()
+
+    def execute(self, html_files: List[str], candidate_files: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         执行 Schema 迭代阶段
 
         3 个步骤：
-        1. 批量简化所有 HTML
-        2. 并行提取/补充 Schema
+        1. 并行简化 HTML（进程池）
+        2. 并行提取/补充 Schema（每个页面简化完成后立即提交，与步骤 1 流水线执行）
         3. 合并最终 Schema
 
         Args:
             html_files: HTML 文件路径列表
+            candidate_files: 自适应采样的候选 HTML 文件列表（提供时忽略 html_files，按收敛情况决定实际样本数）
 
         Returns:
             {
@@ -56,6 +259,7 @@ class SchemaPhase(BasePhase):
                 'rounds': List[Dict],        # 每轮的详细结果
                 'final_schema': Dict,        # 最终合并的 Schema
                 'final_schema_path': str,    # 最终 Schema 文件路径
+                'convergence': Dict,         # 自适应采样时的收敛检测结果
             }
         """
         result = {
@@ -64,84 +268,41 @@ class SchemaPhase(BasePhase):
             'success': False,
         }
 
+        self._simplified_count = 0
+        self._completed_count = 0
+
         logger.info(f"\n{'='*70}")
-        if self.schema_mode == "auto":
+        if candidate_files:
+            logger.info(f"阶段1: Schema迭代 - 自适应采样（最多 {len(candidate_files)} 个URL，收敛即停止）")
+        elif self.schema_mode == "auto":
             logger.info(f"阶段1: Schema迭代 - 自动模式（{len(html_files)}个URL，{len(html_files)}轮迭代）")
         else:
             logger.info(f"阶段1: Schema补充 - 预定义模式（{len(html_files)}个URL，{len(html_files)}轮迭代）")
         logger.info(f"{'='*70}")
 
-        # ============ 步骤 1：批量简化所有 HTML ============
-        logger.info(f"\n{'═'*70}")
-        logger.info(f"阶段1/3: 批量简化HTML文件")
-        logger.info(f"{'═'*70}")
-
+        # ============ 步骤 1+2：流水线式精简 HTML 并提取/补充 Schema ============
+        # 精简在进程池中并行执行，每个页面精简完成后立即提交 Schema 提取，两步之间没有屏障
         if self.progress_callback:
             self.progress_callback("html_simplification", "开始简化HTML文件", 10)
 
-        simplified_data_list = []
-        for idx, html_file_path in enumerate(html_files, 1):
-            logger.info(f"  正在精简 [{idx}/{len(html_files)}]: {Path(html_file_path).name}")
-
-            # 更新HTML简化进度：10-20%
-            if self.progress_callback:
-                progress = 10 + int((idx / len(html_files)) * 10)
-                self.progress_callback("html_simplification", f"简化HTML文件 {idx}/{len(html_files)}", progress)
-
-            simplified_data = self.html_processor.process({
-                'html_file': html_file_path,
-                'idx': idx
-            })
-            if simplified_data['success']:
-                simplified_data_list.append(simplified_data)
-            else:
-                logger.error(f"HTML精简失败: {html_file_path}")
-                if idx == 1:
-                    return result
+        if candidate_files:
+            sampled = self._adaptive_sampling(candidate_files)
+            if sampled is None:
+                return result
+            simplified_data_list, schema_results, convergence = sampled
+            result['convergence'] = convergence
+        else:
+            pipeline = self._run_pipeline(list(enumerate(html_files, 1)), len(html_files))
+            if pipeline is None:
+                return result
+            simplified_data_list, schema_results = pipeline
 
         if not simplified_data_list:
             logger.error("没有成功精简的HTML文件")
             return result
 
         logger.success(f"✓ 已精简 {len(simplified_data_list)} 个HTML文件")
-
-        if self.progress_callback:
-            self.progress_callback("html_simplification", "HTML简化完成", 20)
-
-        # ============ 步骤 2：并行提取/补充 Schema ============
-        logger.info(f"\n{'═'*70}")
-        if self.schema_mode == "auto":
-            logger.info(f"阶段2/3: 并行提取 HTML Schema（并发数: {min(settings.max_concurrent_extractions, len(simplified_data_list))}）")
-        else:
-            logger.info(f"阶段2/3: 并行补充 xpath（并发数: {min(settings.max_concurrent_extractions, len(simplified_data_list))}）")
-        logger.info(f"{'═'*70}")
-
-        if self.progress_callback:
-            self.progress_callback("schema_extraction", "开始提取Schema", 20)
-
-        schema_results = []
-        # 使用配置的并发数，避免 API 限流
-        max_workers = min(settings.max_concurrent_extractions, len(simplified_data_list))
-        completed_count = 0
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_data = {
-                executor.submit(
-                    self.schema_processor.process,
-                    {'html_content': data['html_content'], 'idx': data['idx']}
-                ): data
-                for data in simplified_data_list
-            }
-
-            for future in as_completed(future_to_data):
-                schema_result = future.result()
-                if schema_result['success']:
-                    schema_results.append(schema_result)
-                    completed_count += 1
-
-                    # 更新Schema提取进度：20-30%
-                    if self.progress_callback:
-                        progress = 20 + int((completed_count / len(simplified_data_list)) * 10)
-                        self.progress_callback("schema_extraction", f"提取Schema {completed_count}/{len(simplified_data_list)}", progress)
+        simplified_data_list.sort(key=lambda x: x['idx'])
 
         # 按 idx 排序
         schema_results.sort(key=lambda x: x['idx'])
@@ -189,7 +350,19 @@ class SchemaPhase(BasePhase):
                 self.progress_callback("schema_merge", "开始合并Schema", 30)
 
             try:
-                final_schema = self.schema_processor.merge_schemas(all_schemas)
+                final_schema = None
+                merge_inputs = content_digest({'schemas': all_schemas, 'settings': settings_snapshot(SCHEMA_SETTINGS)})
+                if self.manifest is not None:
+                    outputs = self.manifest.lookup("schema_merge", merge_inputs)
+                    if outputs is not None:
+                        with open(outputs['final_schema_path'], 'r', encoding='utf-8') as f:
+                            final_schema = json.load(f)
+                if final_schema is None:
+                    final_schema = self.schema_processor.merge_schemas(all_schemas)
+                    if self.manifest is not None:
+                        self.manifest.complete("schema_merge", merge_inputs, {
+                            'final_schema_path': str(self.schema_processor.schemas_dir / "final_schema.json"),
+                        })
 
                 result['final_schema'] = final_schema
                 result['final_schema_path'] = str(
@@ -6,6 +6,7 @@ from typing import List, Dict
 from pathlib import Path
 from loguru import logger
 from web2json.config.settings import settings
+from web2json.tools.cluster import select_representative_samples
 
 
 class AgentPlanner:
@@ -15,6 +16,26 @@ class AgentPlanner:
         """初始化规划器（不再需要 LLM）"""
         pass
 
+    @staticmethod
+    def _order_by_diversity(html_files: List[str], count: int) -> List[str]:
+        """按布局差异选取 count 个代表样本（按选取顺序），失败时退回前 count 个文件
+
+        只在前 sample_selection_pool 个文件中选取，避免为大批量输入计算全部布局特征
+        """
+        if settings.sample_selection != "diverse" or count >= len(html_files):
+            return html_files[:count]
+
+        pool = html_files[:max(settings.sample_selection_pool, count)]
+        try:
+            html_list = [Path(path).read_text(encoding='utf-8', errors='ignore') for path in pool]
+            indices = select_representative_samples(html_list, count, size_weight=settings.sample_size_weight)
+        except Exception as e:
+            logger.warning(f"按布局差异选取样本失败，改用前 {count} 个文件: {e}")
+            return html_files[:count]
+
+        logger.info(f"按布局差异从 {len(pool)} 个文件中选取 {len(indices)} 个样本: {[Path(pool[i]).name for i in indices]}")
+        return [pool[i] for i in indices]
+
     def create_plan(self, html_files: List[str], domain: str = None, iteration_rounds: int = None) -> Dict:
         """
         创建解析任务计划
@@ -38,8 +59,8 @@ class AgentPlanner:
         # 确保迭代轮数不超过总文件数
         iteration_rounds = min(iteration_rounds, len(html_files))
 
-        # 选择用于迭代学习的样本（前N个）
-        sample_files = html_files[:iteration_rounds]
+        # 选择用于迭代学习的样本（布局差异最大的N个，sample_selection=first 时为前N个）
+        sample_files = self._order_by_diversity(html_files, iteration_rounds)
         num_samples = len(sample_files)
 
         # 构建标准执行计划
@@ -51,6 +72,7 @@ class AgentPlanner:
             'sample_urls': sample_files,   # 为了兼容性，保留这个字段
             'num_samples': num_samples,
             'iteration_rounds': iteration_rounds,
+            'sampling': 'fixed',
             'phases': [
                 'schema_phase',     # 阶段1: Schema迭代 - HTML处理 + Schema提取/补充 + 合并
                 'code_phase',       # 阶段2: 代码迭代 - 代码生成和优化
@@ -69,6 +91,12 @@ class AgentPlanner:
             ],
         }
 
+        # 自适应采样：按收敛情况决定实际样本数，候选样本最多 schema_max_samples 个
+        if settings.schema_sampling == "adaptive":
+            plan['sampling'] = 'adaptive'
+            plan['candidate_files'] = self._order_by_diversity(html_files, max(settings.schema_max_samples, 1))
+            logger.info(f"Schema 采样方式: 自适应（候选样本 {len(plan['candidate_files'])} 个，收敛即停止）")
+
         logger.success(f"执行计划创建完成: 域名={domain}, 总文件={len(html_files)}, 学习样本={num_samples}, 迭代={num_samples}轮, 批量解析={len(html_files)}个")
 
         return plan
@@ -7,6 +7,7 @@ from .html_processor import HtmlProcessor
 from .schema_processor import SchemaProcessor
 from .code_processor import CodeProcessor
 from .parser_processor import ParserProcessor
+from .validation_processor import ValidationProcessor
 
 __all__ = [
     'BaseProcessor',
@@ -14,4 +15,5 @@ __all__ = [
     'SchemaProcessor',
     'CodeProcessor',
     'ParserProcessor',
+    'ValidationProcessor',
 ]
@@ -2,6 +2,7 @@
 处理器基类
 定义处理器的标准接口
 """
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Any, Dict
 
@@ -21,3 +22,11 @@ class BaseProcessor(ABC):
             处理结果字典，必须包含 'success' 字段
         """
         pass
+
+    async def aprocess(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        异步处理输入数据
+
+        默认在线程中执行同步的 process，子类可覆盖为原生异步实现
+        """
+        return await asyncio.to_thread(self.process, input_data)
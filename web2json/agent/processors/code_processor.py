@@ -35,6 +35,8 @@ class CodeProcessor(BaseProcessor):
                 'idx': int,                     # 轮次编号
                 'previous_parser_code': str,    # 上一轮的代码（可选）
                 'previous_parser_path': str,    # 上一轮的路径（可选）
+                'on_progress': Callable,        # 流式生成的进度回调（可选）
+                'validation_feedback': Dict,    # 上一轮代码的本地验证结果（可选）
             }
 
         Returns:
@@ -62,7 +64,8 @@ class CodeProcessor(BaseProcessor):
             invoke_params = {
                 "html_content": html_content,
                 "target_json": target_json,
-                "output_dir": str(self.parsers_dir)
+                "output_dir": str(self.parsers_dir),
+                "on_progress": input_data.get('on_progress'),
             }
 
             # 如果是优化模式（有上一轮的代码）
@@ -70,7 +73,8 @@ class CodeProcessor(BaseProcessor):
                 invoke_params.update({
                     "previous_parser_code": previous_parser_code,
                     "previous_parser_path": previous_parser_path,
-                    "round_num": idx
+                    "round_num": idx,
+                    "validation_feedback": input_data.get('validation_feedback'),
                 })
 
             # 调用代码生成工具
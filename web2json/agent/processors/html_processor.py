@@ -10,6 +10,7 @@ from loguru import logger
 from web2json.config.settings import settings
 from web2json.tools import get_html_from_file
 from web2json.tools.html_simplifier import simplify_html
+from web2json.utils.input_manifest import materialize
 
 from .base_processor import BaseProcessor
 
@@ -44,7 +45,7 @@ class HtmlProcessor(BaseProcessor):
                 'idx': int,
                 'html_file': str,
                 'html_content': str,          # 处理后的 HTML 内容
-                'html_original_path': str,    # 原始 HTML 路径
+                'html_original_path': str,    # 原始 HTML 路径（manifest 模式下为输入文件本身）
                 'html_path': str,             # 最终使用的 HTML 路径
                 'error': str,                 # 错误信息（如果失败）
             }
@@ -62,10 +63,12 @@ class HtmlProcessor(BaseProcessor):
             # 1. 读取 HTML 文件内容
             html_content = get_html_from_file.invoke({"file_path": html_file_path})
 
-            # 保存原始 HTML
-            html_original_path = self.html_original_dir / f"schema_round_{idx}.html"
-            with open(html_original_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            # 原始 HTML：默认直接引用输入文件，只有配置了落地方式时才链接/复制到 html_original
+            if settings.input_materialize == "manifest":
+                html_original_path = Path(html_file_path)
+            else:
+                html_original_path = self.html_original_dir / f"schema_round_{idx}.html"
+                materialize(html_file_path, str(html_original_path), settings.input_materialize)
 
             # 2. 精简 HTML
             try:
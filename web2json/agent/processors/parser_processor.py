@@ -2,17 +2,97 @@
 解析器处理器
 负责使用生成的解析器批量解析 HTML 文件
 """
-import importlib.util
 import json
-import sys
+import math
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from loguru import logger
 from tqdm import tqdm
 
+from web2json.agent.parse_manifest import PARSE_MANIFEST_FILENAME, ParseManifest, parser_digest
+from web2json.config.settings import settings
+from web2json.tools.xpath_runtime import load_xpath_runtime
+from web2json.utils.parser_loader import parser_loader
+from web2json.utils.result_store import INDEX_FILENAME, SHARD_PREFIX, create_result_writer, iter_results
+from web2json.utils.watchdog_pool import WORKER_READY, WatchdogPool
+
 from .base_processor import BaseProcessor
 
+# 工作进程中加载的解析器实例（由 _init_worker 设置，每个进程只加载一次）
+_worker_parser = None
+
+
+def _parse_file(parser, html_file_path: str, result_dir: Optional[Path]) -> Dict[str, Any]:
+    """
+    解析单个 HTML 文件并保存 JSON，返回精简的结果记录（失败时记录错误和堆栈）
+
+    result_dir 为 None 时不落盘，解析结果放在记录的 'data' 中交给主进程写入分片
+    """
+    html_path = Path(html_file_path)
+    started = time.perf_counter()
+    try:
+        # 读取 HTML 内容
+        with open(html_path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+
+        # 使用解析器解析 HTML，并规范化解析结果中的Unicode字符
+        parsed_data = ParserProcessor._normalize_result(parser.parse(html_content))
+
+        record = {
+            'html_file': str(html_path),
+            'fields_count': len(parsed_data),
+            'seconds': round(time.perf_counter() - started, 4),
+        }
+        if result_dir is None:
+            record['data'] = parsed_data
+        else:
+            # 确定保存路径（基于原文件名）并保存 JSON
+            json_path = Path(result_dir) / (html_path.stem + '.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(parsed_data, f, ensure_ascii=False, indent=2)
+            record['json_file'] = str(json_path)
+        # XPath 运行时中回退到生成类的字段
+        fallback_fields = getattr(parser, 'last_fallback', None)
+        if fallback_fields:
+            record['fallback_fields'] = list(fallback_fields)
+        return record
+    except Exception as e:
+        return {
+            'html_file': str(html_path),
+            'error': str(e),
+            'seconds': round(time.perf_counter() - started, 4),
+            'traceback': traceback.format_exc(),
+        }
+
+
+def _init_worker(parser_path: str, xpaths_path: Optional[str], schema_path: Optional[str]) -> None:
+    """工作进程初始化：加载一次解析器"""
+    global _worker_parser
+    _worker_parser = ParserProcessor._load_engine(parser_path, xpaths_path, schema_path)
+
+
+def _parse_chunk(html_files: List[str], result_dir: Optional[Path]) -> List[Dict[str, Any]]:
+    """在工作进程中解析一个分块的文件"""
+    return [_parse_file(_worker_parser, html_file_path, result_dir) for html_file_path in html_files]
+
+
+def _watchdog_worker(conn, engine_args: tuple, result_dir: Optional[Path]) -> None:
+    """看门狗模式的工作进程：加载一次解析器，逐个接收页面路径并返回结果记录"""
+    _init_worker(*engine_args)
+    conn.send(WORKER_READY)
+    while True:
+        html_file_path = conn.recv()
+        if html_file_path is None:
+            break
+        conn.send(_parse_file(_worker_parser, html_file_path, result_dir))
+
 
 class ParserProcessor(BaseProcessor):
     """解析器处理器 - 负责批量解析 HTML 文件"""
@@ -34,6 +114,8 @@ class ParserProcessor(BaseProcessor):
             input_data: {
                 'html_files': List[str],  # HTML 文件路径列表
                 'parser_path': str,       # 解析器文件路径
+                'xpaths_path': str,       # xpaths.json 路径（可选，PARSE_ENGINE=xpath 时使用）
+                'schema_path': str,       # 最终 Schema 路径（可选，决定 XPath 运行时的输出字段）
             }
 
         Returns:
@@ -43,10 +125,16 @@ class ParserProcessor(BaseProcessor):
                 'parsed_files': List[Dict],   # 成功解析的文件信息
                 'failed_files': List[Dict],   # 失败的文件信息
                 'output_dir': str,
+                'engine': str,                # 实际使用的解析引擎（parser / xpath）
+                'result_store': Dict,         # 分片输出的统计（RESULT_FORMAT 为 jsonl / parquet 时）
+                'incremental': Dict,          # 增量解析统计 {'skipped', 'parsed', 'failed', 'removed', 'full'}
+                'slowest_files': List[Dict],  # 耗时最长的页面 [{'html_file', 'seconds', 'status'}]
             }
         """
         html_files = input_data['html_files']
         parser_path = input_data['parser_path']
+        xpaths_path = input_data.get('xpaths_path')
+        schema_path = input_data.get('schema_path')
 
         logger.info(f"\n{'='*70}")
         logger.info(f"批量解析阶段：解析 {len(html_files)} 个 HTML 文件")
@@ -61,54 +149,84 @@ class ParserProcessor(BaseProcessor):
         }
 
         try:
-            # 加载解析器
-            parser = self._load_parser(parser_path)
-
-            # 使用进度条显示解析进度
-            with tqdm(total=len(html_files), desc="解析HTML文件", unit="file") as pbar:
-                for html_file_path in html_files:
-                    html_path = Path(html_file_path)
-
-                    try:
-                        # 读取 HTML 内容
-                        with open(html_path, 'r', encoding='utf-8') as f:
-                            html_content = f.read()
-
-                        # 使用解析器解析 HTML
-                        parsed_data = parser.parse(html_content)
-
-                        # 规范化解析结果中的Unicode字符
-                        parsed_data = self._normalize_result(parsed_data)
-
-                        # 确定保存路径（基于原文件名）
-                        json_filename = html_path.stem + '.json'
-                        json_path = self.result_dir / json_filename
-
-                        # 保存 JSON
-                        with open(json_path, 'w', encoding='utf-8') as f:
-                            json.dump(parsed_data, f, ensure_ascii=False, indent=2)
-
-                        results['parsed_files'].append({
-                            'html_file': str(html_path),
-                            'json_file': str(json_path),
-                            'fields_count': len(parsed_data),
-                        })
-
-                        # 更新进度条
-                        pbar.update(1)
-
-                    except Exception as e:
-                        # 只在出错时输出日志
-                        logger.error(f"✗ 解析失败 ({html_path.name}): {str(e)}")
-                        results['failed_files'].append({
-                            'html_file': str(html_path),
-                            'error': str(e),
-                        })
-                        import traceback
-                        logger.debug(traceback.format_exc())
-
-                        # 更新进度条
-                        pbar.update(1)
+            # 加载解析器（并行模式下同时用于提前发现加载错误）
+            parser = self._load_engine(parser_path, xpaths_path, schema_path)
+            results['engine'] = 'xpath' if hasattr(parser, 'last_fallback') else 'parser'
+
+            # 增量解析：只解析新增或内容变化的页面
+            manifest, pending, skipped = self._plan_incremental(html_files, parser_path, xpaths_path, schema_path)
+            previous_dir = self._set_aside_shards() if manifest is not None and skipped else None
+
+            # 分片输出时工作进程只返回解析结果，由当前进程按完成顺序写入分片
+            writer = create_result_writer(
+                self.result_dir,
+                settings.result_format,
+                compression=settings.result_compression,
+                shard_size_mb=settings.result_shard_size_mb,
+                schema=self._load_schema(schema_path),
+            )
+            target_dir = None if writer else self.result_dir
+
+            def store(batch: List[Dict[str, Any]]) -> None:
+                if writer is None:
+                    return
+                for record in batch:
+                    if 'data' in record:
+                        location = writer.write(ParseManifest.key(record['html_file']), record.pop('data'))
+                        record['shard'] = location['shard']
+                        record['offset'] = location['offset']
+
+            try:
+                if previous_dir is not None:
+                    pending += self._carry_over_shards(previous_dir, writer, manifest, skipped)
+                workers = self._parse_workers(len(pending))
+                with tqdm(total=len(pending), desc="解析HTML文件", unit="file") as pbar:
+                    if pending and (settings.parse_page_timeout or settings.parse_page_max_rss_mb):
+                        records = self._parse_supervised(
+                            pending, (parser_path, xpaths_path, schema_path), pbar, target_dir, store
+                        )
+                    elif workers > 1:
+                        records = self._parse_parallel(
+                            pending, (parser_path, xpaths_path, schema_path), workers, pbar, target_dir, store
+                        )
+                    else:
+                        records = []
+                        for html_file_path in pending:
+                            records.append(_parse_file(parser, html_file_path, target_dir))
+                            store(records[-1:])
+                            pbar.update(1)
+            finally:
+                if writer is not None:
+                    results['result_store'] = writer.close()
+                if previous_dir is not None:
+                    shutil.rmtree(previous_dir, ignore_errors=True)
+
+            results['parsed_files'].extend(skipped.values())
+            for record in records:
+                if 'error' in record:
+                    # 只在出错时输出日志
+                    logger.error(f"✗ 解析失败 ({Path(record['html_file']).name}): {record['error']}")
+                    logger.debug(record.pop('traceback', ''))
+                    results['failed_files'].append(record)
+                    if manifest is not None:
+                        manifest.forget(record['html_file'])
+                else:
+                    results['parsed_files'].append(record)
+                    if manifest is not None:
+                        location = {key: record[key] for key in ('json_file', 'shard', 'offset') if key in record}
+                        manifest.record(record['html_file'], location, record['fields_count'])
+
+            results['slowest_files'] = self._slowest(records)
+
+            if manifest is not None:
+                manifest.save()
+                results['incremental'] = {
+                    'skipped': len(skipped),
+                    'parsed': len(records) - len(results['failed_files']),
+                    'failed': len(results['failed_files']),
+                    'removed': manifest.removed,
+                    'full': manifest.full,
+                }
 
             # 输出汇总
             logger.info(f"\n{'='*70}")
@@ -117,6 +235,25 @@ class ParserProcessor(BaseProcessor):
             logger.success(f"成功解析: {len(results['parsed_files'])}/{len(html_files)} 个文件")
             if results['failed_files']:
                 logger.warning(f"失败: {len(results['failed_files'])} 个文件")
+            if results.get('incremental'):
+                stats = results['incremental']
+                logger.info(
+                    f"增量解析: 跳过未变化 {stats['skipped']}，解析 {stats['parsed']}，失败 {stats['failed']}，"
+                    f"清理已删除 {stats['removed']}" + ("（解析器或结果格式变化，全部重新解析）" if stats['full'] else "")
+                )
+            if results['slowest_files']:
+                logger.info(f"耗时最长的 {len(results['slowest_files'])} 个页面:")
+                for entry in results['slowest_files']:
+                    logger.info(f"  {entry['seconds']:.3f}s  [{entry['status']}]  {Path(entry['html_file']).name}")
+            if results['engine'] == 'xpath':
+                fallback_pages = sum(1 for record in results['parsed_files'] if record.get('fallback_fields'))
+                logger.info(f"XPath运行时: {fallback_pages} 个文件有字段回退到生成的解析器类")
+            if results.get('result_store'):
+                store_stats = results['result_store']
+                logger.info(
+                    f"结果分片: {len(store_stats['shards'])} 个 {store_stats['format']} 分片"
+                    f"（压缩: {store_stats['compression']}），索引: {store_stats['index_file']}"
+                )
             logger.info(f"结果保存目录: {self.result_dir}")
             logger.info(f"{'='*70}\n")
 
@@ -131,7 +268,206 @@ class ParserProcessor(BaseProcessor):
             results['error'] = str(e)
             return results
 
-    def _normalize_text(self, text: str) -> str:
+    def _plan_incremental(
+        self,
+        html_files: List[str],
+        parser_path: str,
+        xpaths_path: Optional[str],
+        schema_path: Optional[str],
+    ) -> Tuple[Optional[ParseManifest], List[str], Dict[str, Dict[str, Any]]]:
+        """
+        对比增量解析清单，清理内容变化和已删除页面的旧结果
+
+        Returns:
+            (清单, 需要解析的页面, 未变化页面 -> 结果记录)；未开启增量解析时清单为 None，全部页面都需要解析
+        """
+        if not settings.parse_incremental:
+            (Path(self.result_dir) / PARSE_MANIFEST_FILENAME).unlink(missing_ok=True)
+            return None, list(html_files), {}
+
+        manifest = ParseManifest(self.result_dir)
+        plan = manifest.plan(
+            html_files,
+            parser_digest(parser_path, xpaths_path, schema_path, engine=settings.parse_engine),
+            output={'format': settings.result_format, 'compression': settings.result_compression},
+        )
+
+        pending = plan['pending']
+        skipped: Dict[str, Dict[str, Any]] = {}
+        paths = {manifest.key(path): path for path in html_files}
+        for key, entry in plan['unchanged'].items():
+            location = entry.get('location', {})
+            # 逐文件结果被删除时重新解析（分片中的结果在搬运时检查）
+            if 'json_file' in location and not Path(location['json_file']).exists():
+                manifest.forget(paths[key])
+                pending.append(paths[key])
+                continue
+            skipped[key] = {'html_file': paths[key], 'fields_count': entry.get('fields_count', 0), **location, 'skipped': True}
+
+        # 逐文件结果：删除内容变化和已删除页面的旧 JSON（仍被未变化页面使用的除外）
+        kept = {record.get('json_file') for record in skipped.values()}
+        for entry in plan['stale']:
+            json_file = entry.get('location', {}).get('json_file')
+            if json_file and json_file not in kept:
+                Path(json_file).unlink(missing_ok=True)
+        return manifest, pending, skipped
+
+    def _set_aside_shards(self) -> Optional[Path]:
+        """把上一次的分片和索引移到 .previous/，新分片写完后删除（未变化页面的结果从中搬运）"""
+        shards = sorted(Path(self.result_dir).glob(f"{SHARD_PREFIX}*"))
+        if not shards:
+            return None
+        previous_dir = Path(self.result_dir) / ".previous"
+        shutil.rmtree(previous_dir, ignore_errors=True)
+        previous_dir.mkdir(parents=True)
+        for path in [*shards, Path(self.result_dir) / INDEX_FILENAME]:
+            if path.exists():
+                os.replace(path, previous_dir / path.name)
+        return previous_dir
+
+    @staticmethod
+    def _carry_over_shards(previous_dir: Path, writer, manifest: ParseManifest, skipped: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        把未变化页面的结果从旧分片搬运到新分片（不重新解析）
+
+        Returns:
+            旧分片中找不到结果、需要重新解析的页面
+        """
+        # 分片中的 source 与清单键相同（源文件的绝对路径），不同目录下的同名文件不会混淆
+        remaining = dict.fromkeys(skipped)
+        if writer is not None:
+            for source, data in iter_results(previous_dir):
+                if source not in remaining:
+                    continue
+                del remaining[source]
+                location = writer.write(source, data)
+                record = skipped[source]
+                record['shard'], record['offset'] = location['shard'], location['offset']
+                manifest.relocate(record['html_file'], {'shard': location['shard'], 'offset': location['offset']})
+
+        missing = []
+        for key in remaining:
+            record = skipped.pop(key)
+            manifest.forget(record['html_file'])
+            missing.append(record['html_file'])
+        return missing
+
+    @staticmethod
+    def _slowest(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """耗时最长的 PARSE_SLOWEST_N 个页面（含超时和内存超限的页面）"""
+        timed = [record for record in records if 'seconds' in record]
+        timed.sort(key=lambda record: -record['seconds'])
+        return [
+            {
+                'html_file': record['html_file'],
+                'seconds': record['seconds'],
+                'status': record.get('reason', 'error') if 'error' in record else 'ok',
+            }
+            for record in timed[:settings.parse_slowest_n]
+        ]
+
+    def _parse_supervised(
+        self,
+        html_files: List[str],
+        engine_args: tuple,
+        pbar,
+        target_dir: Optional[Path],
+        store: Callable[[List[Dict[str, Any]]], None],
+    ) -> List[Dict[str, Any]]:
+        """
+        看门狗模式：工作进程逐页解析，单页超过 PARSE_PAGE_TIMEOUT 秒或单页期间 RSS 增长超过 PARSE_PAGE_MAX_RSS_MB 时
+        杀掉并重启工作进程，该页面记为失败（reason 为 timeout / memory / crash），结果按输入顺序返回
+        """
+        workers = min(settings.parse_workers or os.cpu_count() or 1, len(html_files))
+        pool = WatchdogPool(
+            _watchdog_worker,
+            (engine_args, target_dir),
+            workers=workers,
+            timeout=settings.parse_page_timeout,
+            max_rss_mb=settings.parse_page_max_rss_mb,
+        )
+        logger.info(
+            f"看门狗模式批量解析: {workers} 个进程，单页时间上限 {settings.parse_page_timeout or '不限'}s，"
+            f"内存上限 {settings.parse_page_max_rss_mb or '不限'}MB"
+        )
+
+        records: List[Optional[Dict[str, Any]]] = [None] * len(html_files)
+        for index, record, failure in pool.run(html_files):
+            if failure is not None:
+                record = {'html_file': str(html_files[index]), **failure}
+            records[index] = record
+            store([record])
+            pbar.update(1)
+
+        if pool.restarts:
+            logger.warning(f"看门狗: {pool.restarts} 个工作进程因超时、内存超限或异常退出被重启")
+        return records
+
+    @staticmethod
+    def _parse_workers(file_count: int) -> int:
+        """批量解析进程数（parse_workers 为 0 时取 CPU 核数；文件数不超过一个分块时不启用多进程）"""
+        workers = settings.parse_workers or os.cpu_count() or 1
+        if file_count <= settings.parse_chunk_size:
+            return 1
+        return max(1, min(workers, math.ceil(file_count / settings.parse_chunk_size)))
+
+    def _parse_parallel(
+        self,
+        html_files: List[str],
+        engine_args: tuple,
+        workers: int,
+        pbar,
+        target_dir: Optional[Path],
+        store: Callable[[List[Dict[str, Any]]], None],
+    ) -> List[Dict[str, Any]]:
+        """
+        多进程批量解析：每个工作进程只加载一次解析器，按分块消费文件路径
+
+        分块完成后立即交给 store 写入并更新进度，结果按输入顺序返回；进程池异常时剩余分块在当前进程串行解析
+        """
+        chunk_size = settings.parse_chunk_size
+        chunks = [html_files[i:i + chunk_size] for i in range(0, len(html_files), chunk_size)]
+        chunk_records: List[Optional[List[Dict[str, Any]]]] = [None] * len(chunks)
+        logger.info(f"多进程批量解析: {workers} 个进程，{len(chunks)} 个分块（每块 {chunk_size} 个文件）")
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=engine_args) as executor:
+                futures = {
+                    executor.submit(_parse_chunk, chunk, target_dir): position
+                    for position, chunk in enumerate(chunks)
+                }
+                for future in as_completed(futures):
+                    position = futures[future]
+                    chunk_records[position] = future.result()
+                    store(chunk_records[position])
+                    pbar.update(len(chunks[position]))
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning(f"多进程解析失败，剩余文件改为在当前进程解析: {e}")
+
+        parser = None
+        for position, chunk in enumerate(chunks):
+            if chunk_records[position] is not None:
+                continue
+            if parser is None:
+                parser = self._load_engine(*engine_args)
+            chunk_records[position] = []
+            for html_file_path in chunk:
+                chunk_records[position].append(_parse_file(parser, html_file_path, target_dir))
+                store(chunk_records[position][-1:])
+                pbar.update(1)
+
+        return [record for records in chunk_records for record in records]
+
+    @staticmethod
+    def _load_schema(schema_path: Optional[str]) -> Optional[Dict[str, Any]]:
+        """最终 Schema（Parquet 输出的列类型），不存在时返回 None"""
+        if not schema_path or not Path(schema_path).exists():
+            return None
+        with open(schema_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _normalize_text(text: str) -> str:
         """
         规范化文本中的Unicode特殊字符
 
@@ -164,7 +500,8 @@ class ParserProcessor(BaseProcessor):
 
         return text
 
-    def _normalize_result(self, data: Any) -> Any:
+    @staticmethod
+    def _normalize_result(data: Any) -> Any:
         """
         递归规范化解析结果中的所有文本
 
@@ -175,23 +512,30 @@ class ParserProcessor(BaseProcessor):
             规范化后的数据
         """
         if isinstance(data, dict):
-            return {key: self._normalize_result(value) for key, value in data.items()}
+            return {key: ParserProcessor._normalize_result(value) for key, value in data.items()}
         elif isinstance(data, list):
-            return [self._normalize_result(item) for item in data]
+            return [ParserProcessor._normalize_result(item) for item in data]
         elif isinstance(data, str):
-            return self._normalize_text(data)
+            return ParserProcessor._normalize_text(data)
         else:
             return data
 
-    def _load_parser(self, parser_path: str):
-        """动态加载解析器类"""
-        spec = importlib.util.spec_from_file_location("parser_module", parser_path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules["parser_module"] = module
-        spec.loader.exec_module(module)
+    @staticmethod
+    def _load_engine(parser_path: str, xpaths_path: Optional[str] = None, schema_path: Optional[str] = None):
+        """
+        加载批量解析引擎
 
-        # 获取 WebPageParser 类
-        if hasattr(module, 'WebPageParser'):
-            return module.WebPageParser()
-        else:
-            raise Exception("解析器中未找到WebPageParser类")
+        PARSE_ENGINE=xpath 且存在 xpaths.json 时返回 XPath 运行时（生成类作为空字段的回退），否则返回生成类
+        """
+        parser = ParserProcessor._load_parser(parser_path)
+        if settings.parse_engine != 'xpath':
+            return parser
+        if not xpaths_path or not Path(xpaths_path).exists():
+            logger.warning("未找到 xpaths.json，批量解析使用生成的解析器类")
+            return parser
+        return load_xpath_runtime(xpaths_path, schema_path=schema_path, fallback_parser=parser)
+
+    @staticmethod
+    def _load_parser(parser_path: str):
+        """加载解析器实例（按内容哈希隔离模块，已加载的解析器从进程内缓存复用）"""
+        return parser_loader.get(parser_path)
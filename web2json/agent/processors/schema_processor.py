@@ -12,6 +12,9 @@ from web2json.tools import (
     extract_schema_from_html,
     merge_multiple_schemas,
     enrich_schema_with_xpath,
+    aextract_schema_from_html,
+    amerge_multiple_schemas,
+    aenrich_schema_with_xpath,
 )
 
 from .base_processor import BaseProcessor
@@ -63,70 +66,76 @@ class SchemaProcessor(BaseProcessor):
         else:
             raise ValueError(f"未知的 schema_mode: {self.schema_mode}")
 
+    async def aprocess(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """process 的异步版本，LLM 调用走异步路径，并发度由 LLMClient 的信号量控制"""
+        if self.schema_mode == 'auto':
+            return await self._aextract_schema(input_data)
+        elif self.schema_mode == 'predefined':
+            return await self._aenrich_schema(input_data)
+        else:
+            raise ValueError(f"未知的 schema_mode: {self.schema_mode}")
+
     def _extract_schema(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """从 HTML 提取 Schema（自动模式）"""
         idx = input_data['idx']
-        html_content = input_data['html_content']
-
-        result = {
-            'success': False,
-            'idx': idx,
-        }
 
         try:
-            html_schema = extract_schema_from_html.invoke({"html_content": html_content})
-            logger.success(f"[提取阶段 {idx}] ✓ Schema提取完成（{len(html_schema)} 字段）")
-
-            # 保存 schema
-            schema_path = self.schemas_dir / f"html_schema_round_{idx}.json"
-            with open(schema_path, 'w', encoding='utf-8') as f:
-                json.dump(html_schema, f, ensure_ascii=False, indent=2)
-
-            result.update({
-                'success': True,
-                'schema': html_schema,
-                'schema_path': str(schema_path),
-            })
-
+            html_schema = extract_schema_from_html.invoke({"html_content": input_data['html_content']})
+            return self._save_round_schema(idx, html_schema, 'html_schema', '提取')
         except Exception as e:
             logger.error(f"[提取阶段 {idx}] ✗ 失败: {str(e)}")
-            result['error'] = str(e)
+            return {'success': False, 'idx': idx, 'error': str(e)}
+
+    async def _aextract_schema(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """_extract_schema 的异步版本"""
+        idx = input_data['idx']
 
-        return result
+        try:
+            html_schema = await aextract_schema_from_html(input_data['html_content'])
+            return self._save_round_schema(idx, html_schema, 'html_schema', '提取')
+        except Exception as e:
+            logger.error(f"[提取阶段 {idx}] ✗ 失败: {str(e)}")
+            return {'success': False, 'idx': idx, 'error': str(e)}
 
     def _enrich_schema(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """为预定义 Schema 补充 xpath（预定义模式）"""
         idx = input_data['idx']
-        html_content = input_data['html_content']
-
-        result = {
-            'success': False,
-            'idx': idx,
-        }
 
         try:
             enriched_schema = enrich_schema_with_xpath.invoke({
                 "schema_template": self.schema_template,
-                "html_content": html_content
+                "html_content": input_data['html_content']
             })
-            logger.success(f"[补充阶段 {idx}] ✓ Schema补充完成（{len(enriched_schema)} 字段）")
-
-            # 保存 schema
-            schema_path = self.schemas_dir / f"enriched_schema_round_{idx}.json"
-            with open(schema_path, 'w', encoding='utf-8') as f:
-                json.dump(enriched_schema, f, ensure_ascii=False, indent=2)
+            return self._save_round_schema(idx, enriched_schema, 'enriched_schema', '补充')
+        except Exception as e:
+            logger.error(f"[补充阶段 {idx}] ✗ 失败: {str(e)}")
+            return {'success': False, 'idx': idx, 'error': str(e)}
 
-            result.update({
-                'success': True,
-                'schema': enriched_schema,
-                'schema_path': str(schema_path),
-            })
+    async def _aenrich_schema(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """_enrich_schema 的异步版本"""
+        idx = input_data['idx']
 
+        try:
+            enriched_schema = await aenrich_schema_with_xpath(self.schema_template, input_data['html_content'])
+            return self._save_round_schema(idx, enriched_schema, 'enriched_schema', '补充')
         except Exception as e:
             logger.error(f"[补充阶段 {idx}] ✗ 失败: {str(e)}")
-            result['error'] = str(e)
+            return {'success': False, 'idx': idx, 'error': str(e)}
+
+    def _save_round_schema(self, idx: int, schema: Dict, prefix: str, action: str) -> Dict[str, Any]:
+        """保存单轮 Schema 并构造处理结果"""
+        logger.success(f"[{action}阶段 {idx}] ✓ Schema{action}完成（{len(schema)} 字段）")
 
-        return result
+        schema_path = self.schemas_dir / f"{prefix}_round_{idx}.json"
+        with open(schema_path, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False, indent=2)
+
+        return {
+            'success': True,
+            'idx': idx,
+            'schema': schema,
+            'schema_path': str(schema_path),
+        }
 
     def merge_schemas(self, schemas: List[Dict]) -> Dict:
         """
@@ -139,9 +148,17 @@ class SchemaProcessor(BaseProcessor):
             合并后的 Schema
         """
         final_schema = merge_multiple_schemas.invoke({"schemas": schemas})
+        return self._save_final_schema(final_schema)
+
+    async def amerge_schemas(self, schemas: List[Dict]) -> Dict:
+        """merge_schemas 的异步版本"""
+        final_schema = await amerge_multiple_schemas(schemas)
+        return self._save_final_schema(final_schema)
+
+    def _save_final_schema(self, final_schema: Dict) -> Dict:
+        """保存最终 Schema"""
         logger.success(f"✓ 合并完成，最终 Schema 包含 {len(final_schema)} 个字段")
 
-        # 保存最终 Schema
         final_schema_path = self.schemas_dir / "final_schema.json"
         with open(final_schema_path, 'w', encoding='utf-8') as f:
             json.dump(final_schema, f, ensure_ascii=False, indent=2)
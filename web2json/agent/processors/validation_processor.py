@@ -0,0 +1,169 @@
+"""
+解析器验证处理器
+在进程内加载候选解析器，对所有样本 HTML 运行，并与 Schema 阶段得到的 value_sample 对比，
+按字段统计填充率和匹配率，用于判断代码迭代是否可以提前结束
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from web2json.utils.parser_loader import parser_loader
+
+from .base_processor import BaseProcessor
+
+# 反馈给下一轮的失败样例中，期望值/实际值的最大展示长度
+_PREVIEW_CHARS = 200
+
+
+def _to_text(value: Any) -> str:
+    """将字段值转换为用于比较的文本（列表拼接，空白归一，忽略大小写）"""
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(_to_text(item) for item in value if item is not None)
+    if isinstance(value, dict):
+        return " ".join(_to_text(item) for item in value.values())
+    return re.sub(r"\s+", " ", str(value)).strip().casefold()
+
+
+def _preview(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > _PREVIEW_CHARS:
+        return value[:_PREVIEW_CHARS] + "..."
+    return value
+
+
+class ValidationProcessor(BaseProcessor):
+    """解析器验证处理器 - 在样本 HTML 上运行候选解析器并对比 value_sample"""
+
+    @staticmethod
+    def _load_parser(parser_path: str):
+        """加载候选解析器（不进入共享缓存，避免候选解析器挤掉批量解析使用的最终解析器）"""
+        return parser_loader.load(parser_path, cache=False)
+
+    @staticmethod
+    def _field_matches(expected: Any, actual: Any) -> bool:
+        """实际值包含期望样例（或反之，样例可能被截断）即视为匹配"""
+        expected_text = _to_text(expected)
+        actual_text = _to_text(actual)
+        if not actual_text:
+            return False
+        if not expected_text:
+            return True
+        return expected_text in actual_text or actual_text in expected_text
+
+    def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        在所有样本上运行候选解析器
+
+        Args:
+            input_data: {
+                'parser_path': str,            # 候选解析器路径
+                'fields': List[str],           # 需要验证的字段（最终 Schema 的字段）
+                'samples': List[Dict],         # [{'idx': int, 'html_path': str, 'schema': Dict}]
+                                               # schema 为该样本的 Schema（含 value_sample）
+            }
+
+        Returns:
+            {
+                'success': bool,               # 解析器是否成功加载
+                'all_satisfied': bool,         # 所有字段在所有样本上都匹配
+                'score': float,                # 匹配的 (样本, 字段) 占比
+                'fields': Dict[str, Dict],     # 每个字段的 {'checked', 'filled', 'matched', 'fill_rate', 'match_rate'}
+                'failures': List[Dict],        # 未匹配的 {'idx', 'field', 'expected', 'actual'}
+                'errors': List[Dict],          # 解析出错的 {'idx', 'error'}
+                'error': str,                  # 加载失败时的错误信息
+            }
+        """
+        fields: List[str] = list(input_data['fields'])
+        samples: List[Dict] = input_data['samples']
+
+        report: Dict[str, Any] = {
+            'success': False,
+            'all_satisfied': False,
+            'score': 0.0,
+            'fields': {field: {'checked': 0, 'filled': 0, 'matched': 0} for field in fields},
+            'failures': [],
+            'errors': [],
+        }
+
+        try:
+            parser = self._load_parser(input_data['parser_path'])
+        except Exception as e:
+            logger.error(f"  ✗ 加载候选解析器失败: {e}")
+            report['error'] = str(e)
+            report['errors'].append({'idx': None, 'error': f"加载解析器失败 {type(e).__name__}: {e}"})
+            return report
+        report['success'] = True
+
+        checked_total = 0
+        matched_total = 0
+        for sample in samples:
+            idx = sample['idx']
+            sample_schema = sample.get('schema') or {}
+            try:
+                with open(sample['html_path'], 'r', encoding='utf-8') as f:
+                    parsed = parser.parse(f.read())
+                if not isinstance(parsed, dict):
+                    raise TypeError(f"parse() 返回了 {type(parsed).__name__}，应为 dict")
+            except Exception as e:
+                report['errors'].append({'idx': idx, 'error': f"{type(e).__name__}: {e}"})
+                parsed = None
+
+            for field in fields:
+                stats = report['fields'][field]
+                expected = (sample_schema.get(field) or {}).get('value_sample')
+                actual = parsed.get(field) if parsed is not None else None
+
+                stats['checked'] += 1
+                checked_total += 1
+                if _to_text(actual):
+                    stats['filled'] += 1
+                # 样本 Schema 中没有该字段时只要求不报错，不要求有值
+                if parsed is not None and (field not in sample_schema or self._field_matches(expected, actual)):
+                    stats['matched'] += 1
+                    matched_total += 1
+                else:
+                    report['failures'].append({
+                        'idx': idx,
+                        'field': field,
+                        'expected': _preview(expected),
+                        'actual': _preview(actual),
+                    })
+
+        for stats in report['fields'].values():
+            stats['fill_rate'] = round(stats['filled'] / stats['checked'], 3) if stats['checked'] else 0.0
+            stats['match_rate'] = round(stats['matched'] / stats['checked'], 3) if stats['checked'] else 0.0
+
+        report['score'] = round(matched_total / checked_total, 3) if checked_total else 0.0
+        report['all_satisfied'] = checked_total > 0 and matched_total == checked_total
+        return report
+
+    @staticmethod
+    def failing_samples(report: Dict[str, Any]) -> List[int]:
+        """按失败字段数从多到少排列的样本编号（解析出错的样本排在最前）"""
+        counts: Dict[int, int] = {}
+        for failure in report.get('failures', []):
+            counts[failure['idx']] = counts.get(failure['idx'], 0) + 1
+        for error in report.get('errors', []):
+            if error['idx'] is None:
+                continue
+            counts[error['idx']] = counts.get(error['idx'], 0) + len(report.get('fields', {})) + 1
+        return sorted(counts, key=lambda idx: (-counts[idx], idx))
+
+    @staticmethod
+    def summarize(report: Dict[str, Any]) -> Optional[str]:
+        """一行摘要，用于日志"""
+        if not report.get('success'):
+            return None
+        weak = [
+            f"{field}({stats['matched']}/{stats['checked']})"
+            for field, stats in report['fields'].items()
+            if stats['matched'] < stats['checked']
+        ]
+        summary = f"匹配率 {report['score']:.0%}"
+        if weak:
+            summary += f"，未满足字段: {', '.join(weak)}"
+        if report['errors']:
+            summary += f"，{len(report['errors'])} 个样本解析出错"
+        return summary
@@ -0,0 +1,149 @@
+"""
+运行清单（断点续跑）
+在输出目录中记录每个阶段/步骤的完成情况、输入哈希和产物路径（run_manifest.json）。
+以 resume 方式运行时，输入未变且产物仍在磁盘上的步骤直接复用，从第一个未完成的步骤继续，
+避免重跑已经花费过 LLM 调用的步骤
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from loguru import logger
+
+from web2json.config.settings import settings
+from web2json.utils.input_manifest import file_digest
+
+MANIFEST_FILENAME = "run_manifest.json"
+MANIFEST_VERSION = 1
+
+# 各类步骤的结果依赖的配置项（配置变化时对应步骤失效）
+SCHEMA_SETTINGS = ('schema_mode', 'html_simplify_mode', 'html_keep_attrs', 'default_model', 'small_model', 'llm_routes')
+CODE_SETTINGS = ('code_gen_model', 'default_model', 'small_model', 'llm_routes', 'code_validation_enabled')
+
+
+def content_digest(value: Any) -> str:
+    """任意 JSON 可序列化对象的稳定哈希"""
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def settings_snapshot(names: Iterable[str]) -> Dict[str, Any]:
+    """指定配置项的当前值"""
+    return {name: getattr(settings, name, None) for name in names}
+
+
+class RunManifest:
+    """一次解析器生成运行的清单"""
+
+    def __init__(self, output_dir: Path, resume: bool = False):
+        """
+        Args:
+            output_dir: 运行的输出目录（清单保存在其中）
+            resume: 是否复用已有清单中的已完成步骤；为 False 时清空旧清单重新记录
+        """
+        self.path = Path(output_dir) / MANIFEST_FILENAME
+        self.resume = resume
+        self._lock = threading.Lock()
+        self.reused_steps = []
+
+        data = self._load() if resume else None
+        self.data: Dict[str, Any] = data or {
+            'version': MANIFEST_VERSION,
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'inputs': {},
+            'settings': {},
+            'phases': {},
+            'steps': {},
+        }
+        if resume:
+            if data:
+                logger.info(f"断点续跑: 已加载运行清单（{len(data.get('steps', {}))} 个已完成步骤）: {self.path}")
+            else:
+                logger.info(f"断点续跑: 未找到可用的运行清单，从头开始: {self.path}")
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"运行清单无法读取，忽略: {e}")
+            return None
+        if data.get('version') != MANIFEST_VERSION:
+            logger.warning(f"运行清单版本不匹配（{data.get('version')}），忽略")
+            return None
+        return data
+
+    def _save(self) -> None:
+        """原子写入（先写临时文件再替换），避免中途崩溃留下半个清单"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _input_files(self, html_files: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """输入文件的大小和修改时间；续跑时大小或修改时间变化的文件另外记录内容哈希（未变化的沿用旧哈希）"""
+        previous = self.data.get('inputs', {}).get('files', {}) if self.resume else {}
+        files = {}
+        for path in html_files:
+            stat = os.stat(path)
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            old = previous.get(path)
+            if isinstance(old, dict):
+                if (old.get('size'), old.get('mtime_ns')) != (stat.st_size, stat.st_mtime_ns):
+                    entry['sha256'] = file_digest(path)
+                elif old.get('sha256'):
+                    entry['sha256'] = old['sha256']
+            files[path] = entry
+        return files
+
+    def record_run(self, html_files: Iterable[str], **params) -> None:
+        """记录本次运行的输入文件（大小、修改时间）、参数和配置快照"""
+        files = self._input_files(html_files)
+        with self._lock:
+            self.data['inputs'] = {
+                'files': files,
+                'params': params,
+            }
+            self.data['settings'] = settings_snapshot(sorted(set(SCHEMA_SETTINGS + CODE_SETTINGS)))
+            self.data['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+            self._save()
+
+    def mark_phase(self, phase: str, status: str) -> None:
+        """记录阶段状态（running / done / failed）"""
+        with self._lock:
+            self.data['phases'][phase] = {'status': status, 'updated_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+            self._save()
+
+    def lookup(self, step: str, inputs_hash: str) -> Optional[Dict[str, Any]]:
+        """已完成且输入未变的步骤产物；未开启续跑、输入变化或产物文件缺失时返回 None"""
+        if not self.resume:
+            return None
+        with self._lock:
+            entry = self.data['steps'].get(step)
+        if not entry or entry.get('inputs') != inputs_hash:
+            return None
+        outputs = entry.get('outputs', {})
+        missing = [value for key, value in outputs.items() if key.endswith('_path') and value and not Path(value).exists()]
+        if missing:
+            logger.info(f"  [续跑] 步骤 {step} 的产物缺失，重新执行: {missing}")
+            return None
+        logger.info(f"  [续跑] 跳过已完成的步骤: {step}")
+        self.reused_steps.append(step)
+        return outputs
+
+    def complete(self, step: str, inputs_hash: str, outputs: Dict[str, Any]) -> None:
+        """记录步骤完成"""
+        with self._lock:
+            self.data['steps'][step] = {
+                'inputs': inputs_hash,
+                'outputs': outputs,
+                'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._save()
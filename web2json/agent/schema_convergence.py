@@ -0,0 +1,136 @@
+"""
+Schema 收敛检测
+自适应采样模式下，逐个样本做本地轻量合并（字段并集 + 每个字段的 xpath 集合），
+并用已知 xpath 在新样本上求值检查一致性：连续 k 个样本既没有新字段、已知 xpath 又都能取到值时判定收敛
+"""
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+from lxml import etree, html as lxml_html
+
+
+def _field_xpaths(field_def) -> List[str]:
+    """字段定义中的 xpath（兼容单个 xpath 和合并后的 xpaths 列表）"""
+    if not isinstance(field_def, dict):
+        return []
+    xpaths = field_def.get('xpaths') or []
+    if isinstance(xpaths, str):
+        xpaths = [xpaths]
+    xpath = field_def.get('xpath')
+    if isinstance(xpath, str):
+        xpaths = [xpath, *xpaths]
+    return [x for x in xpaths if isinstance(x, str) and x.strip()]
+
+
+def _has_value(result) -> bool:
+    if isinstance(result, list):
+        return any(_has_value(item) for item in result)
+    if isinstance(result, str):
+        return bool(result.strip())
+    if isinstance(result, etree._Element):
+        return bool(result.text_content().strip()) if hasattr(result, 'text_content') else True
+    return result is not None and result is not False
+
+
+class SchemaConvergenceTracker:
+    """按样本顺序累积 Schema 并判断是否收敛"""
+
+    def __init__(self, window: int, min_samples: int):
+        """
+        Args:
+            window: 连续多少个样本没有新信息即判定收敛（k）
+            min_samples: 判定收敛前至少需要的样本数
+        """
+        self.window = max(1, window)
+        self.min_samples = max(1, min_samples)
+        self.fields: Set[str] = set()
+        self.xpaths: Dict[str, List[str]] = {}
+        self.samples = 0
+        self.agreeing_streak = 0
+        self.history: List[Dict] = []
+
+    @property
+    def converged(self) -> bool:
+        return self.samples >= self.min_samples and self.agreeing_streak >= self.window
+
+    def samples_needed(self) -> int:
+        """还需要多少个样本才可能判定收敛（第一个样本只建立基线，不计入连续一致数）"""
+        baseline = 1 if self.samples == 0 else 0
+        return max(self.window - self.agreeing_streak + baseline, self.min_samples - self.samples, 0)
+
+    def _inconsistent_fields(self, schema: Dict, html_content: Optional[str]) -> List[str]:
+        """已知 xpath 在新样本上取不到值的字段（只检查新样本 Schema 中出现的字段）"""
+        if not html_content:
+            return []
+        try:
+            tree = lxml_html.fromstring(html_content)
+        except (etree.ParserError, ValueError):
+            return []
+
+        inconsistent = []
+        for field in schema:
+            known = self.xpaths.get(field)
+            if not known:
+                continue
+            resolved = False
+            for xpath in known:
+                try:
+                    if _has_value(tree.xpath(xpath)):
+                        resolved = True
+                        break
+                except etree.XPathError:
+                    continue
+            if not resolved:
+                inconsistent.append(field)
+        return inconsistent
+
+    def add(self, idx: int, schema: Dict, html_content: Optional[str] = None) -> Dict:
+        """加入一个样本的 Schema，返回该样本的一致性判断
+
+        Args:
+            idx: 样本编号
+            schema: 样本的 Schema
+            html_content: 样本的（精简后）HTML，用于对已知 xpath 求值
+
+        Returns:
+            {'idx', 'new_fields', 'inconsistent_fields', 'agrees'}
+        """
+        new_fields = sorted(set(schema) - self.fields) if self.samples else []
+        inconsistent = self._inconsistent_fields(schema, html_content) if self.samples else []
+        # 第一个样本只用于建立基线
+        agrees = self.samples > 0 and not new_fields and not inconsistent
+
+        self.samples += 1
+        self.agreeing_streak = self.agreeing_streak + 1 if agrees else 0
+        self.fields.update(schema)
+        for field, field_def in schema.items():
+            known = self.xpaths.setdefault(field, [])
+            for xpath in _field_xpaths(field_def):
+                if xpath not in known:
+                    known.append(xpath)
+
+        record = {
+            'idx': idx,
+            'new_fields': new_fields,
+            'inconsistent_fields': inconsistent,
+            'agrees': agrees,
+        }
+        self.history.append(record)
+
+        if self.samples > 1:
+            if agrees:
+                logger.info(f"  [收敛检测] 样本 {idx}: 无新字段，xpath 一致（连续 {self.agreeing_streak}/{self.window}）")
+            else:
+                logger.info(
+                    f"  [收敛检测] 样本 {idx}: 新字段 {new_fields or '无'}，xpath 不一致字段 {inconsistent or '无'}"
+                )
+        return record
+
+    def to_dict(self) -> Dict:
+        return {
+            'converged': self.converged,
+            'samples': self.samples,
+            'window': self.window,
+            'fields': sorted(self.fields),
+            'history': self.history,
+        }
@@ -47,15 +47,114 @@ class Settings(BaseModel):
     # 代码生成 Prompt 版本 (v1: 原始版本, v2: SWDE优化版本)
     code_gen_prompt_version: str = Field(default_factory=lambda: os.getenv("CODE_GEN_PROMPT_VERSION", "v2"))
 
+    # 代码生成使用流式输出：边生成边做增量校验（语法、WebPageParser 类、重复循环），明显失败时提前终止
+    code_gen_streaming: bool = Field(default_factory=lambda: os.getenv("CODE_GEN_STREAMING", "true").lower() in ("true", "1", "yes"))
+
+    # 小模型档位（XPath选择、Schema合并等简单调用），为空时与 default_model 相同
+    small_model: str = Field(default_factory=lambda: os.getenv("SMALL_MODEL", ""))
+
+    # 模型路由：调用点（schema/merge/code/xpath）到档位（small/default/large）的映射，large 即 code_gen_model
+    llm_routes: str = Field(default_factory=lambda: os.getenv("LLM_ROUTES", "schema:default,merge:small,xpath:small,code:large"))
+    # 便宜档位的输出未通过校验时是否升级到更大的档位重试
+    llm_route_fallback: bool = Field(default_factory=lambda: os.getenv("LLM_ROUTE_FALLBACK", "true").lower() in ("true", "1", "yes"))
+    # 各档位价格（美元/百万token，输入/输出），用于台账按档位统计费用，如 "small:0.15/0.6,default:3/15,large:3/15"
+    llm_tier_prices: str = Field(default_factory=lambda: os.getenv("LLM_TIER_PRICES", ""))
+
+    # 结构化输出：返回 JSON 的调用（Schema提取/合并/补充、XPath提取）请求 response_format=json_object，
+    # 后端不支持时自动降级为普通输出；off 表示始终不请求
+    llm_structured_output: str = Field(default_factory=lambda: os.getenv("LLM_STRUCTURED_OUTPUT", "json_object"))
+
+    # ============================================
+    # LLM HTTP 连接池配置
+    # ============================================
+    # 所有 LLM 客户端共享同一个 keep-alive 连接池
+    llm_http_max_connections: int = Field(default_factory=lambda: int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")))
+    llm_http_max_keepalive_connections: int = Field(default_factory=lambda: int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10")))
+    llm_http_keepalive_expiry: float = Field(default_factory=lambda: float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60")))
+    llm_http_timeout: float = Field(default_factory=lambda: float(os.getenv("LLM_HTTP_TIMEOUT", "600")))
+
+    # ============================================
+    # LLM 限流配置
+    # ============================================
+    # 进程内所有 LLM 调用共享的每分钟请求数 / Token 数上限，超限时排队等待；0 表示不限制
+    llm_rate_limit_rpm: int = Field(default_factory=lambda: int(os.getenv("LLM_RATE_LIMIT_RPM", "0")))
+    llm_rate_limit_tpm: int = Field(default_factory=lambda: int(os.getenv("LLM_RATE_LIMIT_TPM", "0")))
+    # 进程内同时进行的同步 LLM 请求数上限（所有线程共享，如并行聚类生成）；0 表示不限制
+    llm_max_concurrent_requests: int = Field(default_factory=lambda: int(os.getenv("LLM_MAX_CONCURRENT_REQUESTS", "0")))
+
+    # ============================================
+    # LLM 容错配置
+    # ============================================
+    # 可重试错误（429/5xx/超时/连接错误）按指数退避 + 抖动重试
+    llm_retry_base_delay: float = Field(default_factory=lambda: float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0")))
+    llm_retry_max_delay: float = Field(default_factory=lambda: float(os.getenv("LLM_RETRY_MAX_DELAY", "30")))
+    # 同一端点连续失败达到阈值后熔断，冷却期内直接拒绝请求；阈值为 0 表示不熔断
+    llm_breaker_failure_threshold: int = Field(default_factory=lambda: int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5")))
+    llm_breaker_reset_seconds: float = Field(default_factory=lambda: float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")))
+    # 对冲请求：请求耗时超过历史 p95 后再发一个相同请求，取先返回者（需积累足够的延迟样本）
+    llm_hedge_min_samples: int = Field(default_factory=lambda: int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")))
+
+    # 按场景的重试次数和对冲开关
+    default_max_retries: int = Field(default_factory=lambda: int(os.getenv("DEFAULT_MAX_RETRIES", "3")))
+    default_hedge_enabled: bool = Field(default_factory=lambda: os.getenv("DEFAULT_HEDGE_ENABLED", "false").lower() in ("true", "1", "yes"))
+    code_gen_max_retries: int = Field(default_factory=lambda: int(os.getenv("CODE_GEN_MAX_RETRIES", "3")))
+    code_gen_hedge_enabled: bool = Field(default_factory=lambda: os.getenv("CODE_GEN_HEDGE_ENABLED", "false").lower() in ("true", "1", "yes"))
+    agent_max_retries: int = Field(default_factory=lambda: int(os.getenv("AGENT_MAX_RETRIES", "3")))
+    agent_hedge_enabled: bool = Field(default_factory=lambda: os.getenv("AGENT_HEDGE_ENABLED", "false").lower() in ("true", "1", "yes"))
+
+    # ============================================
+    # LLM 响应缓存配置
+    # ============================================
+    # 相同 (model, temperature, messages) 的请求直接返回缓存结果，重跑时不再消耗 Token
+    llm_cache_enabled: bool = Field(default_factory=lambda: os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("true", "1", "yes"))
+    llm_cache_path: str = Field(default_factory=lambda: os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite"))
+    # 缓存有效期（秒），0 表示永不过期
+    llm_cache_ttl_seconds: int = Field(default_factory=lambda: int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))))
+    # 最大缓存条目数，0 表示不限制
+    llm_cache_max_entries: int = Field(default_factory=lambda: int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")))
+    # 服务端提示词前缀缓存：为除最后一条外的消息附加 cache_control 标记（需后端支持，如 Anthropic 兼容网关）
+    llm_prompt_cache_hints: bool = Field(default_factory=lambda: os.getenv("LLM_PROMPT_CACHE_HINTS", "false").lower() in ("true", "1", "yes"))
+
     # ============================================
     # Agent 配置
     # ============================================
     # 默认迭代轮数（用于Schema学习的样本数量）
     default_iteration_rounds: int = Field(default_factory=lambda: int(os.getenv("DEFAULT_ITERATION_ROUNDS", "3")))
 
+    # Schema 采样方式 (fixed: 固定使用前 N 个样本, adaptive: 逐批提取直到 Schema 收敛)
+    schema_sampling: str = Field(default_factory=lambda: os.getenv("SCHEMA_SAMPLING", "fixed"))
+    # 自适应采样：连续多少个样本没有新字段且已知 xpath 都能取到值时判定收敛
+    schema_convergence_window: int = Field(default_factory=lambda: int(os.getenv("SCHEMA_CONVERGENCE_WINDOW", "2")))
+    # 自适应采样：最少 / 最多使用的样本数
+    schema_min_samples: int = Field(default_factory=lambda: int(os.getenv("SCHEMA_MIN_SAMPLES", "2")))
+    schema_max_samples: int = Field(default_factory=lambda: int(os.getenv("SCHEMA_MAX_SAMPLES", "8")))
+
+    # 学习样本选取方式 (diverse: 按布局特征选取差异最大的样本, first: 前 N 个文件)
+    sample_selection: str = Field(default_factory=lambda: os.getenv("SAMPLE_SELECTION", "diverse"))
+    # 按布局差异选取时参与比较的文件数上限
+    sample_selection_pool: int = Field(default_factory=lambda: int(os.getenv("SAMPLE_SELECTION_POOL", "200")))
+    # 页面大小惩罚权重（0-1），越大越倾向选择 token 更少的页面
+    sample_size_weight: float = Field(default_factory=lambda: float(os.getenv("SAMPLE_SIZE_WEIGHT", "0.3")))
+
+    # 解析器注册表：按布局签名保存已生成的解析器，相同模板再次出现时验证后直接复用
+    parser_registry_enabled: bool = Field(default_factory=lambda: os.getenv("PARSER_REGISTRY_ENABLED", "true").lower() in ("true", "1", "yes"))
+    parser_registry_dir: str = Field(default_factory=lambda: os.getenv("PARSER_REGISTRY_DIR", ".cache/parser_registry"))
+    # 布局签名的最低 cosine 相似度
+    parser_registry_threshold: float = Field(default_factory=lambda: float(os.getenv("PARSER_REGISTRY_THRESHOLD", "0.95")))
+    # 命中后用于验证候选解析器的样本数
+    parser_registry_validation_samples: int = Field(default_factory=lambda: int(os.getenv("PARSER_REGISTRY_VALIDATION_SAMPLES", "3")))
+    # 验证时字段填充率不得低于登记时填充率的倍数
+    parser_registry_min_fill_ratio: float = Field(default_factory=lambda: float(os.getenv("PARSER_REGISTRY_MIN_FILL_RATIO", "0.9")))
+
     # Schema模式 (auto: 自动提取和筛选字段, predefined: 使用预定义schema模板)
     schema_mode: str = Field(default_factory=lambda: os.getenv("SCHEMA_MODE", "auto"))
 
+    # 代码迭代本地验证：每轮生成后在所有样本上运行解析器并对比 value_sample，全部满足时提前结束迭代
+    code_validation_enabled: bool = Field(default_factory=lambda: os.getenv("CODE_VALIDATION_ENABLED", "true").lower() in ("true", "1", "yes"))
+
+    # 单次运行（或单个API任务）的 LLM Token 预算，超出后提前终止；0 表示不限制
+    task_token_budget: int = Field(default_factory=lambda: int(os.getenv("TASK_TOKEN_BUDGET", "0")))
+
     # 并发控制
     max_concurrent_extractions: int = Field(default_factory=lambda: int(os.getenv("MAX_CONCURRENT_EXTRACTIONS", "5")))
     max_concurrent_merges: int = Field(default_factory=lambda: int(os.getenv("MAX_CONCURRENT_MERGES", "5")))
@@ -66,6 +165,8 @@ class Settings(BaseModel):
     # DBSCAN聚类参数
     cluster_eps: float = Field(default_factory=lambda: float(os.getenv("CLUSTER_EPS", "0.05")))
     cluster_min_samples: int = Field(default_factory=lambda: int(os.getenv("CLUSTER_MIN_SAMPLES", "2")))
+    # 按聚类生成解析器时同时处理的簇数（LLM 并发和限流额度由所有簇共享）
+    cluster_concurrency: int = Field(default_factory=lambda: int(os.getenv("CLUSTER_CONCURRENCY", "4")))
 
     # ============================================
     # HTML精简配置
@@ -74,6 +175,32 @@ class Settings(BaseModel):
     html_keep_attrs: list = Field(default_factory=lambda: [
         attr.strip() for attr in os.getenv("HTML_KEEP_ATTRS", "class,id,href,src,data-id").split(",")
     ])
+    # Schema 阶段并行精简 HTML 的进程数，0 表示取 CPU 核数，1 表示不使用进程池
+    html_simplify_workers: int = Field(default_factory=lambda: int(os.getenv("HTML_SIMPLIFY_WORKERS", "0")))
+    # 输入 HTML 的落地方式 (manifest: 只记录清单不复制, hardlink: 硬链接, reflink: 写时复制克隆, copy: 复制)
+    input_materialize: str = Field(default_factory=lambda: os.getenv("INPUT_MATERIALIZE", "manifest"))
+
+    # 批量解析进程数，0 表示取 CPU 核数，1 表示在当前进程串行解析
+    parse_workers: int = Field(default_factory=lambda: int(os.getenv("PARSE_WORKERS", "0")))
+    # 每个工作进程一次领取的文件数（文件数不超过一个分块时不启用多进程）
+    parse_chunk_size: int = Field(default_factory=lambda: int(os.getenv("PARSE_CHUNK_SIZE", "50")))
+    # 批量解析引擎：parser（生成的解析器类）/ xpath（预编译 xpaths.json，空字段回退到生成类）
+    parse_engine: str = Field(default_factory=lambda: os.getenv("PARSE_ENGINE", "parser"))
+    # 批量解析结果格式：json（每个页面一个文件）/ jsonl（JSON Lines 分片）/ parquet（Parquet 分片，需要 pyarrow）
+    result_format: str = Field(default_factory=lambda: os.getenv("RESULT_FORMAT", "json"))
+    # 分片压缩方式：none / gzip / zstd（zstd 需要 zstandard）
+    result_compression: str = Field(default_factory=lambda: os.getenv("RESULT_COMPRESSION", "none"))
+    # 单个分片的大小上限（MB）
+    result_shard_size_mb: float = Field(default_factory=lambda: float(os.getenv("RESULT_SHARD_SIZE_MB", "256")))
+    # 增量批量解析：只解析新增或内容变化的页面（解析器变化时全部重新解析）
+    parse_incremental: bool = Field(default_factory=lambda: os.getenv("PARSE_INCREMENTAL", "true").lower() in ("true", "1", "yes"))
+    # 单页解析时间上限（秒）和单页期间工作进程内存增长上限（MB），任一大于 0 时启用看门狗模式，0 表示不限制
+    parse_page_timeout: float = Field(default_factory=lambda: float(os.getenv("PARSE_PAGE_TIMEOUT", "0")))
+    parse_page_max_rss_mb: float = Field(default_factory=lambda: float(os.getenv("PARSE_PAGE_MAX_RSS_MB", "0")))
+    # 批量解析报告中列出的最慢页面数
+    parse_slowest_n: int = Field(default_factory=lambda: int(os.getenv("PARSE_SLOWEST_N", "10")))
+    # 进程内缓存的解析器实例数（按解析器内容哈希，LRU 淘汰）
+    parser_cache_size: int = Field(default_factory=lambda: int(os.getenv("PARSER_CACHE_SIZE", "32")))
 
     # ============================================
     # SWDE 评估配置
@@ -4,10 +4,13 @@ HtmlParserAgent 主程序
 """
 import sys
 import argparse
+import contextvars
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from loguru import logger
 from web2json.agent import ParserAgent
+from web2json.config.settings import settings
 from web2json.tools.cluster import cluster_html_layouts, cluster_html_layouts_optimized
 
 # 过滤 LangSmith UUID v7 警告
@@ -18,9 +21,11 @@ warnings.filterwarnings('ignore', category=UserWarning, module='pydantic.v1.main
 def setup_logger():
     """配置日志"""
     logger.remove()  # 移除默认处理器
+    # cluster_tag: 并行生成多个簇时的日志前缀（由 logger.contextualize 设置）
+    logger.configure(extra={"cluster_tag": ""})
     logger.add(
         sys.stdout,
-        format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+        format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | {extra[cluster_tag]}<level>{message}</level>",
         level="INFO"
     )
     logger.add(
@@ -68,12 +73,66 @@ def read_html_files_from_directory(directory_path: str) -> list:
         sys.exit(1)
 
 
+def _generate_cluster_parser(lbl: int, cluster_files: list, base_output: str, domain: str | None, resume: bool):
+    """为单个簇生成解析器（在调度线程中执行）。
+
+    该簇的日志带有簇名前缀，并额外写入簇输出目录下的 agent.log。
+
+    Returns:
+        (簇编号, 簇名称, 生成结果)；生成过程抛出异常时结果为 None
+    """
+    # 为噪声点使用特殊命名
+    if lbl == -1:
+        output_dir = f"{base_output}_noise"
+        cluster_name = "噪声点"
+    else:
+        output_dir = f"{base_output}_cluster{lbl}"
+        cluster_name = f"簇 {lbl}"
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    sink_id = logger.add(
+        output_path / "agent.log",
+        level="DEBUG",
+        filter=lambda record: record["extra"].get("cluster") == cluster_name,
+    )
+    try:
+        with logger.contextualize(cluster=cluster_name, cluster_tag=f"[{cluster_name}] "):
+            logger.info("-" * 70)
+            logger.info(f"开始为{cluster_name}生成解析器")
+            logger.info(f"  输出目录: {output_dir}")
+            logger.info(f"  HTML文件数: {len(cluster_files)}")
+
+            # 创建Agent并生成解析器
+            try:
+                agent = ParserAgent(output_dir=output_dir)
+                result = agent.generate_parser(
+                    html_files=cluster_files,
+                    domain=domain,
+                    resume=resume,
+                )
+            except Exception as e:
+                logger.error(f"\n✗ {cluster_name}的解析器生成失败: {e}")
+                return lbl, cluster_name, None
+
+            if result['success']:
+                logger.success(f"\n✓ {cluster_name}的解析器生成成功!")
+            else:
+                logger.error(f"\n✗ {cluster_name}的解析器生成失败")
+                if 'error' in result:
+                    logger.error(f"  错误: {result['error']}")
+            return lbl, cluster_name, result
+    finally:
+        logger.remove(sink_id)
+
+
 def generate_parsers_by_layout_clusters(
     html_files: list,
     base_output: str,
     domain: str | None = None,
     eps: float | None = None,
     min_samples: int | None = None,
+    resume: bool = False,
 ) -> None:
     """按布局聚类后分别为每个簇生成解析器。
 
@@ -83,11 +142,8 @@ def generate_parsers_by_layout_clusters(
         domain: 域名（可选）
         eps: DBSCAN的eps参数，距离 = 1 - similarity，eps越小要求相似度越高（默认使用配置值）
         min_samples: DBSCAN的min_samples参数，形成簇所需的最小样本数（默认使用配置值）
+        resume: 断点续跑，每个簇复用其输出目录运行清单中的已完成步骤
     """
-    from pathlib import Path
-    import shutil
-    from web2json.config.settings import settings
-
     # 使用配置中的默认值
     if eps is None:
         eps = settings.cluster_eps
@@ -167,59 +223,34 @@ def generate_parsers_by_layout_clusters(
     except Exception as e:
         logger.warning(f"保存聚类信息失败: {e}")
 
-    # 针对每个簇分别创建 Agent 并生成解析器
-    any_failure = False
-    successful_clusters = []
-
+    # 按簇大小从大到小调度（噪声点最后），多个簇并行生成，LLM 并发和限流额度由所有簇共享
+    cluster_jobs = []
     for lbl in unique_labels:
         cluster_files = [p for p, l in zip(html_files, labels) if l == lbl]
-        if not cluster_files:
-            continue
+        if cluster_files:
+            cluster_jobs.append((lbl, cluster_files))
+    cluster_jobs.sort(key=lambda job: (job[0] == -1, -len(job[1]), job[0]))
 
-        # 为噪声点使用特殊命名
-        if lbl == -1:
-            output_dir = f"{base_output}_noise"
-            cluster_name = "噪声点"
-        else:
-            output_dir = f"{base_output}_cluster{lbl}"
-            cluster_name = f"簇 {lbl}"
-
-        logger.info("-" * 70)
-        logger.info(f"开始为{cluster_name}生成解析器")
-        logger.info(f"  输出目录: {output_dir}")
-        logger.info(f"  HTML文件数: {len(cluster_files)}")
-
-        # 将该簇的HTML文件复制到输出目录
-        output_path = Path(output_dir)
-        cluster_html_dir = output_path / "input_html"
-        try:
-            cluster_html_dir.mkdir(parents=True, exist_ok=True)
-            for src_file in cluster_files:
-                dst_file = cluster_html_dir / Path(src_file).name
-                shutil.copy2(src_file, dst_file)
-            logger.info(f"  已将{len(cluster_files)}个HTML文件复制到: {cluster_html_dir}")
-        except Exception as e:
-            logger.error(f"复制HTML文件失败: {e}")
+    workers = max(1, min(settings.cluster_concurrency, len(cluster_jobs)))
+    logger.info(f"并行生成解析器: {len(cluster_jobs)} 个簇，并发数 {workers}")
 
-        # 创建Agent并生成解析器
-        try:
-            agent = ParserAgent(output_dir=output_dir)
-            result = agent.generate_parser(
-                html_files=cluster_files,
-                domain=domain,
+    any_failure = False
+    successful_clusters = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cluster") as executor:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _generate_cluster_parser, lbl, cluster_files, base_output, domain, resume
             )
-
-            if result['success']:
-                logger.success(f"\n✓ {cluster_name}的解析器生成成功!")
+            for lbl, cluster_files in cluster_jobs
+        ]
+        for future in as_completed(futures):
+            lbl, cluster_name, result = future.result()
+            if result is not None and result['success']:
                 successful_clusters.append((lbl, cluster_name, result))
             else:
                 any_failure = True
-                logger.error(f"\n✗ {cluster_name}的解析器生成失败")
-                if 'error' in result:
-                    logger.error(f"  错误: {result['error']}")
-        except Exception as e:
-            any_failure = True
-            logger.error(f"\n✗ {cluster_name}的解析器生成失败: {e}")
+    successful_clusters.sort(key=lambda item: item[0])
 
     # 输出总结
     logger.info("\n" + "="*70)
@@ -279,6 +310,11 @@ def main():
         default=3,
         help='迭代轮数（用于Schema学习的样本数量，默认: 3）'
     )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='断点续跑：复用输出目录运行清单（run_manifest.json）中输入未变的已完成步骤'
+    )
 
     args = parser.parse_args()
 
@@ -294,6 +330,7 @@ def main():
             html_files=html_files,
             base_output=args.output,
             domain=args.domain,
+            resume=args.resume,
         )
         return
 
@@ -304,7 +341,8 @@ def main():
     result = agent.generate_parser(
         html_files=html_files,
         domain=args.domain,
-        iteration_rounds=args.iteration_rounds
+        iteration_rounds=args.iteration_rounds,
+        resume=args.resume
     )
 
     # 输出结果
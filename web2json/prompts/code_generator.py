@@ -1,38 +1,77 @@
 """
 代码生成器 Prompt 模板
 用于生成和优化 BeautifulSoup 解析代码
+
+消息按可缓存程度排列：静态指令（system）→ 本次运行的目标结构 → 每个样本的 HTML，
+同一次运行中各轮、各样本的请求共享尽可能长的相同前缀，便于服务端的前缀缓存命中
 """
 import json
 import os
-from typing import Dict
+from typing import Dict, List
 
+# 两类 Prompt 共用的 main 函数模板
+_MAIN_FUNCTION_TEMPLATE = """```python
+def main():
+    # 获取命令行参数，默认为 'sample.html'
+    input_source = sys.argv[1] if len(sys.argv) > 1 else 'sample.html'
 
-class CodeGeneratorPrompts:
-    """代码生成器 Prompt 模板类"""
+    try:
+        # 判断是 URL 还是文件
+        if input_source.startswith('http://') or input_source.startswith('https://'):
+            # URL 处理：使用 DrissionPage
+            try:
+                from DrissionPage import ChromiumPage
+            except ImportError:
+                print(json.dumps({'error': 'DrissionPage not installed. Install it with: pip install DrissionPage'}))
+                sys.exit(1)
 
-    @staticmethod
-    def get_initial_generation_prompt(html_content: str, target_json: Dict) -> str:
-        """
-        获取初始代码生成 Prompt（第一轮）
+            page = ChromiumPage()
+            page.get(input_source)
+            html_content = page.html
+            page.quit()
+        else:
+            # 文件处理：直接读取
+            html_file = Path(input_source)
+            if not html_file.exists():
+                print(json.dumps({'error': f'File not found: {html_file}'}))
+                sys.exit(1)
+            html_content = html_file.read_text(encoding='utf-8')
 
-        Args:
-            html_content: HTML 内容
-            target_json: 目标 JSON 结构
+        # 解析并输出结果
+        parser = WebPageParser()
+        result = parser.parse(html_content)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+        sys.exit(1)
 
-        Returns:
-            Prompt 字符串
-        """
-        # 截断过长的HTML
-        if len(html_content) > 30000:
-            html_content = html_content[:30000] + "\n... (截断)"
 
-        # 获取prompt版本配置
-        prompt_version = os.getenv("CODE_GEN_PROMPT_VERSION", "v2")
+if __name__ == '__main__':
+    main()
+```"""
+
+# 输出格式要求（两类 Prompt 共用）
+_OUTPUT_FORMAT_RULES = """## 输出格式 - 重要！
+**严格要求：**
+1. 直接输出纯Python代码，从 `import` 语句开始
+2. **绝对不要**使用任何markdown标记，包括：
+   - 不要使用 ```python
+   - 不要使用 ```
+   - 不要使用任何反引号
+3. 不要包含任何说明文字、注释或解释
+4. 代码必须可以直接保存为.py文件并运行
+5. 确保代码完整，所有方法和函数都要有完整的实现"""
+
 
-        # V2版本的额外要求（针对SWDE优化）
-        v2_extra_requirements = ""
-        if prompt_version == "v2":
-            v2_extra_requirements = """
+class CodeGeneratorPrompts:
+    """代码生成器 Prompt 模板类"""
+
+    @staticmethod
+    def _v2_extra_requirements() -> str:
+        """V2版本的额外要求（针对SWDE优化），由 CODE_GEN_PROMPT_VERSION 控制"""
+        if os.getenv("CODE_GEN_PROMPT_VERSION", "v2") != "v2":
+            return ""
+        return """
 8. **数据完整性（重要）**：提取字段时，必须保留HTML中的原始格式：
    - 不要只截取元素的部分内容，即使与字段要求无关
    - 必要时，可以使用 .strip() 清理首尾空白
@@ -40,19 +79,16 @@ class CodeGeneratorPrompts:
 10. **空值处理（重要）**：如果字段值为空（空字符串、空列表等），必须返回None而不是空值
 """
 
-        return f"""
-你是一个专业的HTML解析代码生成器。请根据以下信息生成一个Python类，用于解析同类网页。
-
-## 目标结构
-需要提取以下字段（JSON格式）：
-```json
-{json.dumps(target_json, ensure_ascii=False, indent=2)}
-```
+    @staticmethod
+    def get_initial_system_message() -> str:
+        """
+        获取初始代码生成的系统消息（第一轮，静态部分）
 
-## HTML示例
-```html
-{html_content}
-```
+        Returns:
+            系统消息字符串
+        """
+        return f"""你是一个专业的Python代码生成助手，也是专业的HTML解析代码生成器。
+接下来的消息会依次给出需要提取的目标结构（JSON格式）和一个HTML示例，请据此生成一个Python类，用于解析同类网页。
 
 ## 要求
 1. 生成一个名为 `WebPageParser` 的Python类
@@ -63,17 +99,8 @@ class CodeGeneratorPrompts:
 6. 代码尽量简洁，减少冗余
 7. 添加适当的错误处理
 8. **空值处理（必须）**：如果字段值为空（空字符串、空列表等），必须返回None而不是空值
-{v2_extra_requirements}
-## 输出格式 - 重要！
-**严格要求：**
-1. 直接输出纯Python代码，从 `import` 语句开始
-2. **绝对不要**使用任何markdown标记，包括：
-   - 不要使用 ```python
-   - 不要使用 ```
-   - 不要使用任何反引号
-3. 不要包含任何说明文字、注释或解释
-4. 代码必须可以直接保存为.py文件并运行
-5. 确保代码完整，所有方法和函数都要有完整的实现
+{CodeGeneratorPrompts._v2_extra_requirements()}
+{_OUTPUT_FORMAT_RULES}
 
 **正确示例（直接从import开始）：**
 import sys
@@ -85,59 +112,103 @@ from pathlib import Path
 在 `if __name__ == '__main__'` 部分，必须生成一个完整的 main 函数，支持两种输入方式：
 
 **main 函数结构：**
-```python
-def main():
-    # 获取命令行参数，默认为 'sample.html'
-    input_source = sys.argv[1] if len(sys.argv) > 1 else 'sample.html'
+{_MAIN_FUNCTION_TEMPLATE}
 
-    try:
-        # 判断是 URL 还是文件
-        if input_source.startswith('http://') or input_source.startswith('https://'):
-            # URL 处理：使用 DrissionPage
-            try:
-                from DrissionPage import ChromiumPage
-            except ImportError:
-                print(json.dumps({{'error': 'DrissionPage not installed. Install it with: pip install DrissionPage'}}))
-                sys.exit(1)
+**注意：必须完整实现上述结构，不要省略任何部分！**
+"""
 
-            page = ChromiumPage()
-            page.get(input_source)
-            html_content = page.html
-            page.quit()
-        else:
-            # 文件处理：直接读取
-            html_file = Path(input_source)
-            if not html_file.exists():
-                print(json.dumps({{'error': f'File not found: {{html_file}}'}}))
-                sys.exit(1)
-            html_content = html_file.read_text(encoding='utf-8')
+    @staticmethod
+    def get_optimization_system_message() -> str:
+        """
+        获取代码优化的系统消息（第二轮及以后，静态部分）
 
-        # 解析并输出结果
-        parser = WebPageParser()
-        result = parser.parse(html_content)
-        print(json.dumps(result, ensure_ascii=False, indent=2))
-    except Exception as e:
-        print(json.dumps({{'error': str(e)}}))
-        sys.exit(1)
+        Returns:
+            系统消息字符串
+        """
+        return f"""你是一个专业的Python代码生成助手，也是专业的HTML解析代码优化师。
+你需要根据新的HTML样本和更新的字段列表，优化和补充之前生成的解析代码。
+接下来的消息会依次给出更新的目标结构（JSON格式）、当前轮次信息、前一轮生成的解析代码和新的HTML示例。
 
+## 优化要求
+1. 保留前一轮代码中已有的、正确的字段提取逻辑（函数形式）
+2. 添加在前一轮中遗漏的新字段提取逻辑
+3. 尽量使用类名、ID等稳定属性，避免使用绝对索引
+4. 代码尽量简洁，减少冗余
+5. 添加适当的错误处理
+6. main函数是固定的，不要修改
+7. **空值处理（必须）**：如果字段值为空（空字符串、空列表等），必须返回None而不是空值
+{_OUTPUT_FORMAT_RULES}
+6. 输出整个完整的WebPageParser类和main部分
 
-if __name__ == '__main__':
-    main()
-```
+## 优化建议
+- 检查前一轮代码对新HTML的适配情况
+- 合并两个样本中的选择器策略
+- 确保所有字段都有备选方案
 
-**注意：必须完整实现上述结构，不要省略任何部分！**
+
+## 使用示例要求
+在 `if __name__ == '__main__'` 部分，有一个完整的 main 函数，支持两种输入方式，当前已经实现，请勿修改。
+
+**main 函数结构：**
+{_MAIN_FUNCTION_TEMPLATE}
+"""
+
+    @staticmethod
+    def get_target_structure_message(target_json: Dict, title: str = "目标结构") -> str:
+        """
+        获取目标结构消息（同一次运行内不变）
+
+        Args:
+            target_json: 目标 JSON 结构
+            title: 小节标题
+
+        Returns:
+            消息字符串
+        """
+        return f"""## {title}
+需要提取以下字段（JSON格式）：
+```json
+{json.dumps(target_json, ensure_ascii=False, indent=2)}
+```
 """
 
     @staticmethod
-    def get_optimization_prompt(
+    def get_initial_generation_messages(html_content: str, target_json: Dict) -> List[Dict[str, str]]:
+        """
+        获取初始代码生成的消息列表（第一轮）
+
+        Args:
+            html_content: HTML 内容
+            target_json: 目标 JSON 结构
+
+        Returns:
+            消息列表：[静态指令, 目标结构, HTML示例]
+        """
+        # 截断过长的HTML
+        if len(html_content) > 30000:
+            html_content = html_content[:30000] + "\n... (截断)"
+
+        return [
+            {"role": "system", "content": CodeGeneratorPrompts.get_initial_system_message()},
+            {"role": "user", "content": CodeGeneratorPrompts.get_target_structure_message(target_json)},
+            {"role": "user", "content": f"""## HTML示例
+```html
+{html_content}
+```
+"""},
+        ]
+
+    @staticmethod
+    def get_optimization_messages(
         html_content: str,
         target_json: Dict,
         previous_parser_code: str,
         round_num: int,
-        first_round_extraction_result: Dict = None
-    ) -> str:
+        first_round_extraction_result: Dict = None,
+        validation_report: Dict = None
+    ) -> List[Dict[str, str]]:
         """
-        获取代码优化 Prompt（第二轮及以后）
+        获取代码优化的消息列表（第二轮及以后）
 
         Args:
             html_content: HTML 内容
@@ -145,9 +216,10 @@ if __name__ == '__main__':
             previous_parser_code: 前一轮的解析代码
             round_num: 当前轮次号
             first_round_extraction_result: 第一轮的抽取结果（用于观察空值字段）
+            validation_report: 前一轮代码在所有样本上的本地验证结果（只展示未通过的字段）
 
         Returns:
-            Prompt 字符串
+            消息列表：[静态指令, 目标结构, 本轮信息与HTML示例]
         """
 
         # 构建第一轮抽取结果展示部分
@@ -184,10 +256,20 @@ if __name__ == '__main__':
 - 对于未成功提取的字段，首先判断文中是否明确出现，如果明确出现，则需要尝试新的提取策略（检查表格、列表、脚本标签等），否则继续保留为None
 """
 
-        return f"""
-你是一个专业的HTML解析代码优化师。你需要根据新的HTML样本和更新的字段列表，优化和补充之前生成的解析代码。
+        validation_section = ""
+        if validation_report and (validation_report.get('failures') or validation_report.get('errors')):
+            validation_section = f"""
+## 前一轮代码的本地验证结果
+前一轮代码已在全部样本上运行，以下字段的提取结果与样本中的期望值不一致（其余字段已通过，请保持其提取逻辑不变）：
+```json
+{json.dumps({
+    'failures': validation_report.get('failures', [])[:30],
+    'errors': validation_report.get('errors', []),
+}, ensure_ascii=False, indent=2)}
+```
+"""
 
-## 当前轮次信息
+        round_message = f"""## 当前轮次信息
 轮次: {round_num}
 任务: 补充和优化现有解析代码
 
@@ -196,91 +278,14 @@ if __name__ == '__main__':
 {previous_parser_code[:2000]}
 ...（部分代码）
 ```
-{extraction_result_section}
+{extraction_result_section}{validation_section}
 ## 新的HTML示例
 ```html
 {html_content}
 ```
-
-## 更新的目标结构
-需要提取以下字段（JSON格式）：
-```json
-{json.dumps(target_json, ensure_ascii=False, indent=2)}
-```
-
-## 优化要求
-1. 保留前一轮代码中已有的、正确的字段提取逻辑（函数形式）
-2. 添加在前一轮中遗漏的新字段提取逻辑
-3. 尽量使用类名、ID等稳定属性，避免使用绝对索引
-4. 代码尽量简洁，减少冗余
-5. 添加适当的错误处理
-6. main函数是固定的，不要修改
-7. **空值处理（必须）**：如果字段值为空（空字符串、空列表等），必须返回None而不是空值
-## 输出格式 - 重要！
-**严格要求：**
-1. 直接输出纯Python代码，从 `import` 语句开始
-2. **绝对不要**使用任何markdown标记，包括：
-   - 不要使用 ```python
-   - 不要使用 ```
-   - 不要使用任何反引号
-3. 不要包含任何说明文字、注释或解释
-4. 代码必须可以直接保存为.py文件并运行
-5. 确保代码完整，所有方法和函数都要有完整的实现
-6. 输出整个完整的WebPageParser类和main部分
-
-## 优化建议
-- 检查前一轮代码对新HTML的适配情况
-- 合并两个样本中的选择器策略
-- 确保所有字段都有备选方案
-
-
-## 使用示例要求
-在 `if __name__ == '__main__'` 部分，有一个完整的 main 函数，支持两种输入方式，当前已经实现，请勿修改。
-
-**main 函数结构：**
-```python
-def main():
-    # 获取命令行参数，默认为 'sample.html'
-    input_source = sys.argv[1] if len(sys.argv) > 1 else 'sample.html'
-
-    try:
-        # 判断是 URL 还是文件
-        if input_source.startswith('http://') or input_source.startswith('https://'):
-            # URL 处理：使用 DrissionPage
-            try:
-                from DrissionPage import ChromiumPage
-            except ImportError:
-                print(json.dumps({{'error': 'DrissionPage not installed. Install it with: pip install DrissionPage'}}))
-                sys.exit(1)
-
-            page = ChromiumPage()
-            page.get(input_source)
-            html_content = page.html
-            page.quit()
-        else:
-            # 文件处理：直接读取
-            html_file = Path(input_source)
-            if not html_file.exists():
-                print(json.dumps({{'error': f'File not found: {{html_file}}'}}))
-                sys.exit(1)
-            html_content = html_file.read_text(encoding='utf-8')
-
-        # 解析并输出结果
-        parser = WebPageParser()
-        result = parser.parse(html_content)
-        print(json.dumps(result, ensure_ascii=False, indent=2))
-    except Exception as e:
-        print(json.dumps({{'error': str(e)}}))
-        sys.exit(1)
-
-
-if __name__ == '__main__':
-    main()
-```
-
 """
-
-    @staticmethod
-    def get_system_message() -> str:
-        """获取系统消息"""
-        return "你是一个专业的Python代码生成助手。"
+        return [
+            {"role": "system", "content": CodeGeneratorPrompts.get_optimization_system_message()},
+            {"role": "user", "content": CodeGeneratorPrompts.get_target_structure_message(target_json, "更新的目标结构")},
+            {"role": "user", "content": round_message},
+        ]
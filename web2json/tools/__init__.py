@@ -7,7 +7,10 @@ from .code_generator import generate_parser_code
 from .schema_extraction import (
     extract_schema_from_html,
     merge_multiple_schemas,
-    enrich_schema_with_xpath
+    enrich_schema_with_xpath,
+    aextract_schema_from_html,
+    amerge_multiple_schemas,
+    aenrich_schema_with_xpath,
 )
 from .cluster import cluster_html_layouts
 from .html_layout_cosin import get_feature, similarity
@@ -18,6 +21,9 @@ __all__ = [
     'extract_schema_from_html',
     'merge_multiple_schemas',
     'enrich_schema_with_xpath',
+    'aextract_schema_from_html',
+    'amerge_multiple_schemas',
+    'aenrich_schema_with_xpath',
     'cluster_html_layouts',
     'get_feature',
     'similarity',
@@ -13,6 +13,7 @@ from .html_layout_cosin import (
     similarity,
     __get_max_width_layer,
     __parse_valid_layer,
+    __simp_tags,
     fuse_features,
 )
 
@@ -322,3 +323,119 @@ def _approximate_dbscan_with_knn(
 
     return labels
 
+
+
+def select_representative_samples(
+    html_list: List[str],
+    n_samples: int,
+    k: float = 0.7,
+    layer_n: int | None = None,
+    size_weight: float = 0.3,
+) -> List[int]:
+    """在同一批页面中选取布局差异最大的代表样本（加权最远点采样）。
+
+    先选出与其他页面平均最相似的页面（medoid）作为第一个样本，之后每次选取
+    与已选样本最小 cosine 距离最大的页面。页面越大得分越低，在差异相近时优先选择
+    token 更少的页面。
+
+    Args:
+        html_list: HTML 源码字符串列表。
+        n_samples: 需要选取的样本数。
+        k: tags 和 attrs 权重占比，k 表示 tags 权重，(1-k) 为 attrs 权重。
+        layer_n: DOM 树层级深度；为 None 时根据样本自动估计。
+        size_weight: 页面大小惩罚权重，0 表示不考虑页面大小，最大页面的得分乘以 (1 - size_weight)。
+
+    Returns:
+        按选取顺序排列的页面下标列表（最多 n_samples 个）。
+    """
+
+    n = len(html_list)
+    n_samples = max(0, min(n_samples, n))
+    if n_samples == 0:
+        return []
+    if n_samples == n:
+        return list(range(n))
+
+    features = [feat or {"tags": {}, "attrs": {}} for feat in _compute_features(html_list)]
+    if layer_n is None:
+        layer_n = __parse_valid_layer([feat for feat in features if feat.get("tags")] or features)
+    fused_vecs = fuse_features(features, layer_n=layer_n, k=k)
+
+    dist_mat = np.clip(1.0 - cosine_similarity(fused_vecs), 0.0, None)
+    np.fill_diagonal(dist_mat, 0.0)
+
+    sizes = np.array([len(html) for html in html_list], dtype=np.float32)
+    size_factor = 1.0 - float(size_weight) * (sizes / max(float(sizes.max()), 1.0))
+
+    # 第一个样本：平均距离最小（最典型）的页面，同样优先较小的页面
+    first = int(np.argmin(dist_mat.mean(axis=1) / np.maximum(size_factor, 1e-6)))
+    selected = [first]
+    min_dist = dist_mat[first].copy()
+
+    while len(selected) < n_samples:
+        scores = min_dist * size_factor
+        scores[selected] = -1.0
+        candidate = int(np.argmax(scores))
+        if min_dist[candidate] <= 0.0:
+            # 剩余页面与已选样本布局完全相同，按原顺序补足（仍优先小页面）
+            remaining = [i for i in np.argsort(-size_factor, kind="stable") if i not in selected]
+            selected.extend(int(i) for i in remaining[:n_samples - len(selected)])
+            break
+        selected.append(candidate)
+        min_dist = np.minimum(min_dist, dist_mat[candidate])
+
+    return selected
+
+
+def layout_signature(
+    html_list: List[str],
+    layer_n: int = 5,
+    k: float = 0.7,
+    max_features: int = 500,
+) -> Dict[str, float]:
+    """计算一组页面的布局签名：融合特征（与 ``fuse_features`` 相同的 tag/attr 加权）的归一化质心。
+
+    与 ``fuse_features`` 返回的矩阵不同，签名以特征名为键，不依赖具体批次的向量空间，
+    可以跨运行保存并用 ``signature_similarity`` 比较。
+
+    Args:
+        html_list: HTML 源码字符串列表。
+        layer_n: DOM 树层级深度（跨运行比较时需固定）。
+        k: tags 和 attrs 权重占比，k 表示 tags 权重，(1-k) 为 attrs 权重。
+        max_features: 保留权重最大的特征数。
+
+    Returns:
+        {特征名: 权重}，L2 归一化；无法提取特征时为空字典。
+    """
+
+    centroid: Dict[str, float] = {}
+    pages = 0
+    for feature in _compute_features(html_list):
+        if not feature:
+            continue
+        vector = {f"t:{key}": float(value) * k for key, value in __simp_tags(feature.get("tags", {}), layer_n).items()}
+        vector.update(
+            {f"a:{key}": float(value) * (1 - k) for key, value in __simp_tags(feature.get("attrs", {}), layer_n).items()}
+        )
+        norm = float(np.sqrt(sum(v * v for v in vector.values())))
+        if not norm:
+            continue
+        for key, value in vector.items():
+            centroid[key] = centroid.get(key, 0.0) + value / norm
+        pages += 1
+
+    if not pages:
+        return {}
+    top = sorted(centroid.items(), key=lambda item: (-item[1], item[0]))[:max_features]
+    norm = float(np.sqrt(sum(v * v for _, v in top)))
+    return {key: round(value / norm, 6) for key, value in top}
+
+
+def signature_similarity(signature1: Dict[str, float], signature2: Dict[str, float]) -> float:
+    """两个布局签名的 cosine 相似度（签名已归一化，直接求内积）。"""
+
+    if not signature1 or not signature2:
+        return 0.0
+    if len(signature1) > len(signature2):
+        signature1, signature2 = signature2, signature1
+    return float(sum(value * signature2.get(key, 0.0) for key, value in signature1.items()))
@@ -3,13 +3,16 @@
 从HTML和JSON Schema生成解析代码
 """
 import json
-import os
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Optional
 from loguru import logger
 from web2json.config.settings import settings
 from langchain_core.tools import tool
 from web2json.prompts.code_generator import CodeGeneratorPrompts
+from web2json.utils.usage_ledger import PHASE_CODE
+
+# 流式生成被提前终止后重新生成的次数
+_ABORTED_GENERATION_RETRIES = 1
 
 
 @tool
@@ -19,7 +22,9 @@ def generate_parser_code(
     output_dir: str = "generated_parsers",
     previous_parser_code: str = None,
     previous_parser_path: str = None,
-    round_num: int = 1
+    round_num: int = 1,
+    on_progress: Optional[Callable[[Dict], None]] = None,
+    validation_feedback: Optional[Dict] = None
 ) -> Dict:
     """
     从HTML和目标JSON生成或优化BeautifulSoup解析代码
@@ -31,6 +36,8 @@ def generate_parser_code(
         previous_parser_code: 前一轮的解析代码（用于优化）
         previous_parser_path: 前一轮的解析器路径（用于更新）
         round_num: 当前轮次号
+        on_progress: 流式生成的进度回调，参数为 {'lines', 'fields_done', 'fields_total'}（可选）
+        validation_feedback: 前一轮代码的本地验证结果，优化时只针对未通过的字段（可选）
 
     Returns:
         生成/优化结果，包括代码路径和配置路径
@@ -41,38 +48,52 @@ def generate_parser_code(
         else:
             logger.info(f"正在基于前一轮代码优化（第 {round_num} 轮）...")
 
-        # 使用封装的 LLMClient 以支持 token 追踪
-        from web2json.utils.llm_client import LLMClient
+        # 按路由档位获取 LLMClient（默认 large 档位，即 CODE_GEN_MODEL）
+        from web2json.utils.model_router import model_router
 
-        llm_client = LLMClient(
-            model=settings.code_gen_model,
-            api_key=os.getenv("OPENAI_API_KEY"),
-            api_base=os.getenv("OPENAI_API_BASE"),
-            temperature=settings.code_gen_temperature
-        )
+        code_tier = model_router.tier(model_router.route(PHASE_CODE))
+        llm_client = model_router.client(code_tier, temperature=settings.code_gen_temperature)
 
-        # 使用 Prompt 模块构建提示词
+        # 使用 Prompt 模块构建消息（静态指令 → 目标结构 → HTML，便于前缀缓存）
         if round_num == 1:
-            prompt = CodeGeneratorPrompts.get_initial_generation_prompt(
+            messages = CodeGeneratorPrompts.get_initial_generation_messages(
                 html_content,
                 target_json
             )
         else:
-            prompt = CodeGeneratorPrompts.get_optimization_prompt(
+            messages = CodeGeneratorPrompts.get_optimization_messages(
                 html_content,
                 target_json,
                 previous_parser_code,
-                round_num
+                round_num,
+                validation_report=validation_feedback
             )
 
-        # 调用 LLM 生成代码
-        messages = [
-            {"role": "system", "content": CodeGeneratorPrompts.get_system_message()},
-            {"role": "user", "content": prompt}
-        ]
-
-        # 使用 LLMClient 的 chat_completion 方法（自动记录 token）
-        generated_code = llm_client.chat_completion(messages)
+        if settings.code_gen_streaming:
+            # 流式生成：边生成边校验，明显失败的输出提前终止后重新生成
+            from web2json.tools.code_stream_validator import CodeStreamValidator
+            from web2json.utils.llm_client import GenerationAborted
+
+            for attempt in range(_ABORTED_GENERATION_RETRIES + 1):
+                try:
+                    generated_code = llm_client.stream_completion(
+                        messages,
+                        on_text=CodeStreamValidator(target_json, progress=on_progress),
+                        use_cache=attempt == 0,
+                        scenario="code_gen",
+                        phase=PHASE_CODE,
+                        tier=code_tier.name,
+                    )
+                    break
+                except GenerationAborted:
+                    if attempt >= _ABORTED_GENERATION_RETRIES:
+                        raise
+                    logger.info("重新生成解析代码...")
+        else:
+            # 使用 LLMClient 的 chat_completion 方法（自动记录 token）
+            generated_code = llm_client.chat_completion(
+                messages, scenario="code_gen", phase=PHASE_CODE, tier=code_tier.name
+            )
 
         # 清理 markdown 标记
         generated_code = generated_code.strip()
@@ -0,0 +1,148 @@
+"""
+解析代码流式校验
+在代码生成的流式输出过程中做增量检查，尽早发现明显失败的生成并终止，避免等满 max_tokens：
+
+- 输出开头不是代码（说明文字且没有代码块）
+- 已完整的代码前缀存在语法错误（连续两个检查点报同一位置）
+- 出现 main 入口时仍没有 WebPageParser 类
+- 陷入重复输出循环
+"""
+import ast
+import re
+from typing import Callable, Dict, List, Optional
+
+from web2json.utils.llm_client import GenerationAborted
+
+# 可以作为 Python 代码开头的行
+_CODE_START = re.compile(r"^(import |from |#|\"\"\"|'''|class |def |@|[A-Za-z_][A-Za-z0-9_]*\s*=)")
+# 顶层语句或类方法的起点，在这些行之前的代码前缀是语法完整的
+_BOUNDARY = re.compile(r"^( {0,4})(def |class |@|if __name__)")
+_EXTRACT_METHOD = re.compile(r"^\s+def _extract_(\w+)\s*\(", re.MULTILINE)
+
+# 判定输出不是代码前最多容忍的非空行数
+_PROSE_LINES = 3
+# 重复检测窗口：最近N个非空行中不同的行不超过 _REPEAT_DISTINCT 个即视为循环
+_REPEAT_WINDOW = 30
+_REPEAT_DISTINCT = 2
+# 进度上报的最小行数间隔
+_PROGRESS_LINES = 20
+
+
+class CodeStreamValidator:
+    """代码生成流式输出的增量校验器
+
+    作为 LLMClient.stream_completion 的 on_text 回调使用，每收到一块输出时以累计文本调用；
+    只在有新的完整行时做检查，判定失败时抛出 GenerationAborted
+
+    用法：
+        validator = CodeStreamValidator(target_json, progress=callback)
+        code = llm.stream_completion(messages, on_text=validator, ...)
+    """
+
+    def __init__(self, target_json: Dict, progress: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            target_json: 目标结构（用于统计已生成的字段提取方法）
+            progress: 进度回调，参数为 {'lines', 'fields_done', 'fields_total'}
+        """
+        self.fields = set(target_json or {})
+        self.progress = progress
+        self._line_count = 0
+        self._last_reported_lines = 0
+        self._last_reported_fields = 0
+        self._error_line: Optional[int] = None
+        self._error_boundary: Optional[int] = None
+
+    def __call__(self, text: str) -> None:
+        line_count = text.count("\n")
+        if line_count == self._line_count:
+            return
+        self._line_count = line_count
+
+        # 只检查已完整的行
+        lines = self._code_lines(text[:text.rfind("\n")])
+        if lines is None:
+            return
+        self._check_prose(lines)
+        self._check_entry(lines)
+        self._check_repetition(lines)
+        self._check_syntax(lines)
+        self._report(lines)
+
+    @staticmethod
+    def _code_lines(text: str) -> Optional[List[str]]:
+        """取出代码部分的行（去掉 ```python 代码块标记和其后的内容）"""
+        lines = text.split("\n")
+        for idx, line in enumerate(lines):
+            if line.strip().startswith("```"):
+                body = lines[idx + 1:]
+                for end, body_line in enumerate(body):
+                    if body_line.strip().startswith("```"):
+                        return body[:end]
+                return body
+        return lines
+
+    @staticmethod
+    def _check_prose(lines: List[str]) -> None:
+        non_empty = [line for line in lines if line.strip()]
+        if len(non_empty) >= _PROSE_LINES and not any(_CODE_START.match(line) for line in non_empty[:_PROSE_LINES]):
+            raise GenerationAborted(f"输出不是代码: {non_empty[0][:80]!r}")
+
+    @staticmethod
+    def _check_entry(lines: List[str]) -> None:
+        for line in lines:
+            if line.startswith("class WebPageParser"):
+                return
+            if line.startswith("def main") or line.startswith("if __name__"):
+                raise GenerationAborted("已生成 main 入口但缺少 WebPageParser 类")
+
+    @staticmethod
+    def _check_repetition(lines: List[str]) -> None:
+        recent = [line.strip() for line in lines if line.strip()][-_REPEAT_WINDOW:]
+        if len(recent) >= _REPEAT_WINDOW and len(set(recent)) <= _REPEAT_DISTINCT:
+            raise GenerationAborted(f"输出陷入重复循环: {recent[-1][:80]!r}")
+
+    def _check_syntax(self, lines: List[str]) -> None:
+        """解析到最后一个顶层语句/方法起点之前的代码前缀
+
+        前缀在语法上应当是完整的；同一错误位置在两个不同的检查点都出现时判定为真实错误
+        """
+        boundary = None
+        for idx in range(len(lines) - 1, 0, -1):
+            if _BOUNDARY.match(lines[idx]):
+                boundary = idx
+                break
+        if boundary is None or boundary == self._error_boundary:
+            return
+
+        try:
+            ast.parse("\n".join(lines[:boundary]))
+        except SyntaxError as e:
+            # 类定义刚开始、还没有方法体时前缀本身不完整，不算错误
+            if e.lineno is not None and e.lineno >= boundary:
+                return
+            if self._error_line == e.lineno:
+                raise GenerationAborted(f"生成的代码存在语法错误（第 {e.lineno} 行）: {e.msg}")
+            self._error_line = e.lineno
+            self._error_boundary = boundary
+            return
+        self._error_line = None
+        self._error_boundary = boundary
+
+    def _report(self, lines: List[str]) -> None:
+        if self.progress is None:
+            return
+        done = set(_EXTRACT_METHOD.findall("\n".join(lines)))
+        fields_done = len(done & self.fields) if self.fields else len(done)
+        if (
+            len(lines) - self._last_reported_lines < _PROGRESS_LINES
+            and fields_done == self._last_reported_fields
+        ):
+            return
+        self._last_reported_lines = len(lines)
+        self._last_reported_fields = fields_done
+        self.progress({
+            'lines': len(lines),
+            'fields_done': fields_done,
+            'fields_total': len(self.fields),
+        })
@@ -3,82 +3,114 @@ Schema提取和合并工具
 从HTML和视觉两个维度提取Schema，并进行合并
 """
 import json
-import re
 from typing import Dict, List
 from loguru import logger
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-import os
 
-from web2json.config.settings import settings
 from web2json.prompts.schema_extraction import SchemaExtractionPrompts
 from web2json.prompts.schema_merge import SchemaMergePrompts
+from web2json.utils.model_router import model_router
+from web2json.utils.usage_ledger import PHASE_MERGE, PHASE_SCHEMA
 
 
-def _parse_llm_response(response: str) -> Dict:
-    """解析模型响应中的JSON"""
-    import tempfile
-    from pathlib import Path
+def _expect_object(result) -> Dict:
+    if not isinstance(result, dict):
+        raise ValueError(f"模型返回的JSON不是对象: {type(result).__name__}")
+    return result
 
-    def try_fix_json(json_str: str) -> str:
-        """尝试修复常见的JSON格式问题"""
-        # 修复：缺少逗号（对象内）
-        json_str = re.sub(r'"\s*\n\s*"', '",\n  "', json_str)
 
-        # 修复：对象后缺少逗号
-        json_str = re.sub(r'}\s*\n\s*"', '},\n  "', json_str)
+def _expect_schema(result) -> Dict:
+    """校验返回的是非空 Schema：字段名到字段定义对象的映射"""
+    schema = _expect_object(result)
+    if not schema:
+        raise ValueError("模型返回的Schema为空")
+    invalid = [key for key, value in schema.items() if not isinstance(value, dict)]
+    if invalid:
+        raise ValueError(f"Schema字段定义不是对象: {invalid[:5]}")
+    return schema
 
-        # 修复：尾随逗号
-        json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
 
-        return json_str
+def _invoke_llm(messages: List[Dict], phase: str = PHASE_SCHEMA) -> Dict:
+    """同步调用模型，返回解析后的 JSON 对象（按阶段路由模型档位，结构化输出 + 容错解析）
 
+    合并结果额外校验字段定义，便宜档位的输出不合格时升级到更大的档位
+    """
+    validate = _expect_schema if phase == PHASE_MERGE else _expect_object
+    return model_router.chat_json(phase, messages, validate=validate, temperature=0.1)
+
+
+async def _ainvoke_llm(messages: List[Dict], phase: str = PHASE_SCHEMA) -> Dict:
+    """_invoke_llm 的异步版本"""
+    validate = _expect_schema if phase == PHASE_MERGE else _expect_object
+    return await model_router.achat_json(phase, messages, validate=validate, temperature=0.1)
+
+
+def _build_extraction_messages(html_content: str) -> List[Dict]:
+    """构建 HTML Schema 提取的消息（静态指令在前，HTML 在后，便于前缀缓存）"""
+    prompt = SchemaExtractionPrompts.get_html_extraction_prompt()
+    return [
+        {"role": "system", "content": f"你是一个专业的HTML分析专家。\n\n{prompt}"},
+        {"role": "user", "content": f"## HTML内容\n\n```html\n{html_content[:50000]}\n```"}
+    ]
+
+
+def _build_merge_messages(schemas: List[Dict]) -> List[Dict]:
+    """构建多 Schema 合并的消息"""
+    prompt = SchemaMergePrompts.get_merge_multiple_schemas_prompt(schemas)
+    return [
+        {"role": "system", "content": "你是一个专业的Schema整合专家。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _build_enrichment_messages(schema_template: Dict, html_content: str) -> List[Dict]:
+    """构建预定义 Schema 补充 xpath 的消息（静态指令 → Schema模板 → HTML，便于前缀缓存）"""
+    prompt = SchemaExtractionPrompts.get_schema_enrichment_prompt()
+
+    # 确保中文字段名正确序列化
     try:
-        # 尝试提取JSON代码块
-        json_match = re.search(r"```json\s*(.*?)\s*```", response, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-            try:
-                return json.loads(json_str)
-            except json.JSONDecodeError as e:
-                logger.warning(f"JSON解析失败，尝试修复: {str(e)}")
-                # 尝试修复JSON
-                fixed_json = try_fix_json(json_str)
-                try:
-                    return json.loads(fixed_json)
-                except:
-                    logger.debug(f"修复后的JSON: {fixed_json[:1000]}")
-                    raise
-
-        # 尝试提取普通JSON
-        match = re.search(r"\{.*\}", response, re.DOTALL)
-        if match:
-            json_str = match.group()
-            try:
-                return json.loads(json_str)
-            except json.JSONDecodeError:
-                fixed_json = try_fix_json(json_str)
-                return json.loads(fixed_json)
-
-        # 直接解析
-        return json.loads(response)
+        schema_str = json.dumps(schema_template, ensure_ascii=False, indent=2)
     except Exception as e:
-        logger.error(f"解析模型响应失败: {str(e)}")
+        logger.warning(f"JSON序列化失败，尝试使用ASCII模式: {e}")
+        schema_str = json.dumps(schema_template, ensure_ascii=True, indent=2)
 
-        # 保存完整响应到临时文件，便于调试
-        try:
-            temp_dir = Path("logs/llm_responses")
-            temp_dir.mkdir(parents=True, exist_ok=True)
-            import datetime
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            error_file = temp_dir / f"error_response_{timestamp}.txt"
-            error_file.write_text(response, encoding='utf-8')
-            logger.error(f"完整响应已保存到: {error_file}")
-        except:
-            pass
+    schema_message = f"## Schema模板\n\n```json\n{schema_str}\n```"
+    html_message = f"## HTML内容\n\n```html\n{html_content[:50000]}\n```"
+
+    # 确保消息内容是有效的UTF-8字符串
+    try:
+        # 清理可能存在的替代字符（surrogate characters）
+        schema_message = schema_message.encode('utf-8', errors='replace').decode('utf-8')
+        html_message = html_message.encode('utf-8', errors='replace').decode('utf-8')
+    except Exception as e:
+        logger.warning(f"消息编码处理失败: {e}")
+
+    return [
+        {"role": "system", "content": f"你是一个专业的HTML分析和XPath专家。\n\n{prompt}"},
+        {"role": "user", "content": schema_message},
+        {"role": "user", "content": html_message}
+    ]
+
+
+def _check_enriched_fields(schema_template: Dict, result: Dict) -> None:
+    """验证返回的字段是否与模板一致"""
+    template_keys = set(schema_template.keys())
+    result_keys = set(result.keys())
+    if template_keys != result_keys:
+        logger.warning(f"返回的Schema字段与模板不一致")
+        logger.warning(f"  模板字段: {template_keys}")
+        logger.warning(f"  返回字段: {result_keys}")
+        logger.warning(f"  缺失字段: {template_keys - result_keys}")
+        logger.warning(f"  多余字段: {result_keys - template_keys}")
 
-        logger.debug(f"原始响应（前1000字符）: {response[:1000]}")
-        raise Exception(f"解析模型响应失败: {str(e)}")
+
+def _raise_tool_error(message: str, e: Exception):
+    """记录详细错误并抛出统一格式的异常"""
+    import traceback
+    error_msg = f"{message}: {str(e)}"
+    logger.error(error_msg)
+    logger.error(f"详细错误: {traceback.format_exc()}")
+    raise Exception(error_msg)
 
 
 @tool
@@ -96,41 +128,18 @@ def extract_schema_from_html(html_content: str) -> Dict:
     """
     try:
         logger.info("正在从HTML提取Schema...")
+        return _invoke_llm(_build_extraction_messages(html_content))
+    except Exception as e:
+        _raise_tool_error("HTML Schema提取失败", e)
 
-        # 1. 获取Prompt
-        prompt = SchemaExtractionPrompts.get_html_extraction_prompt()
-
-        # 2. 调用LLM
-        model = ChatOpenAI(
-            model=settings.default_model,
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE"),
-            temperature=0.1
-        )
-
-        messages = [
-            {"role": "system", "content": "你是一个专业的HTML分析专家。"},
-            {"role": "user", "content": f"{prompt}\n\n## HTML内容\n\n```html\n{html_content[:50000]}\n```"}
-        ]
-
-        response = model.invoke(messages)
-
-        # 3. 解析响应
-        if hasattr(response, 'content'):
-            content = response.content
-        else:
-            content = str(response)
-
-        result = _parse_llm_response(content)
-
-        return result
 
+async def aextract_schema_from_html(html_content: str) -> Dict:
+    """extract_schema_from_html 的异步版本"""
+    try:
+        logger.info("正在从HTML提取Schema（异步）...")
+        return await _ainvoke_llm(_build_extraction_messages(html_content))
     except Exception as e:
-        import traceback
-        error_msg = f"HTML Schema提取失败: {str(e)}"
-        logger.error(error_msg)
-        logger.error(f"详细错误: {traceback.format_exc()}")
-        raise Exception(error_msg)
+        _raise_tool_error("HTML Schema提取失败", e)
 
 
 @tool
@@ -148,41 +157,18 @@ def merge_multiple_schemas(schemas: List[Dict]) -> Dict:
     """
     try:
         logger.info(f"正在合并 {len(schemas)} 个Schema...")
+        return _invoke_llm(_build_merge_messages(schemas), phase=PHASE_MERGE)
+    except Exception as e:
+        _raise_tool_error("多Schema合并失败", e)
 
-        # 1. 获取Prompt
-        prompt = SchemaMergePrompts.get_merge_multiple_schemas_prompt(schemas)
-
-        # 2. 调用LLM
-        model = ChatOpenAI(
-            model=settings.default_model,
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE"),
-            temperature=0.1
-        )
-
-        messages = [
-            {"role": "system", "content": "你是一个专业的Schema整合专家。"},
-            {"role": "user", "content": prompt}
-        ]
-
-        response = model.invoke(messages)
-
-        # 3. 解析响应
-        if hasattr(response, 'content'):
-            content = response.content
-        else:
-            content = str(response)
-
-        result = _parse_llm_response(content)
-
-        return result
 
+async def amerge_multiple_schemas(schemas: List[Dict]) -> Dict:
+    """merge_multiple_schemas 的异步版本"""
+    try:
+        logger.info(f"正在合并 {len(schemas)} 个Schema（异步）...")
+        return await _ainvoke_llm(_build_merge_messages(schemas), phase=PHASE_MERGE)
     except Exception as e:
-        import traceback
-        error_msg = f"多Schema合并失败: {str(e)}"
-        logger.error(error_msg)
-        logger.error(f"详细错误: {traceback.format_exc()}")
-        raise Exception(error_msg)
+        _raise_tool_error("多Schema合并失败", e)
 
 
 @tool
@@ -201,66 +187,23 @@ def enrich_schema_with_xpath(schema_template: Dict, html_content: str) -> Dict:
     """
     try:
         logger.info(f"正在为预定义Schema补充xpath信息（{len(schema_template)} 个字段）...")
-
-        # 1. 获取Prompt
-        prompt = SchemaExtractionPrompts.get_schema_enrichment_prompt()
-
-        # 2. 构建消息
-        # 确保中文字段名正确序列化
-        try:
-            schema_str = json.dumps(schema_template, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.warning(f"JSON序列化失败，尝试使用ASCII模式: {e}")
-            schema_str = json.dumps(schema_template, ensure_ascii=True, indent=2)
-
-        user_message = f"{prompt}\n\n## Schema模板\n\n```json\n{schema_str}\n```\n\n## HTML内容\n\n```html\n{html_content[:50000]}\n```"
-
-        # 确保消息内容是有效的UTF-8字符串
-        try:
-            # 清理可能存在的替代字符（surrogate characters）
-            user_message = user_message.encode('utf-8', errors='replace').decode('utf-8')
-        except Exception as e:
-            logger.warning(f"消息编码处理失败: {e}")
-
-        # 3. 调用LLM
-        model = ChatOpenAI(
-            model=settings.default_model,
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE"),
-            temperature=0.1
-        )
-
-        messages = [
-            {"role": "system", "content": "你是一个专业的HTML分析和XPath专家。"},
-            {"role": "user", "content": user_message}
-        ]
-
-        response = model.invoke(messages)
-
-        # 4. 解析响应
-        if hasattr(response, 'content'):
-            content = response.content
-        else:
-            content = str(response)
-
-        result = _parse_llm_response(content)
-
-        # 5. 验证返回的字段是否与模板一致
-        template_keys = set(schema_template.keys())
-        result_keys = set(result.keys())
-        if template_keys != result_keys:
-            logger.warning(f"返回的Schema字段与模板不一致")
-            logger.warning(f"  模板字段: {template_keys}")
-            logger.warning(f"  返回字段: {result_keys}")
-            logger.warning(f"  缺失字段: {template_keys - result_keys}")
-            logger.warning(f"  多余字段: {result_keys - template_keys}")
+        result = _invoke_llm(_build_enrichment_messages(schema_template, html_content))
+        _check_enriched_fields(schema_template, result)
 
         logger.success(f"成功为预定义Schema补充xpath信息")
         return result
+    except Exception as e:
+        _raise_tool_error("Schema补充失败", e)
 
+
+async def aenrich_schema_with_xpath(schema_template: Dict, html_content: str) -> Dict:
+    """enrich_schema_with_xpath 的异步版本"""
+    try:
+        logger.info(f"正在为预定义Schema补充xpath信息（{len(schema_template)} 个字段，异步）...")
+        result = await _ainvoke_llm(_build_enrichment_messages(schema_template, html_content))
+        _check_enriched_fields(schema_template, result)
+
+        logger.success(f"成功为预定义Schema补充xpath信息")
+        return result
     except Exception as e:
-        import traceback
-        error_msg = f"Schema补充失败: {str(e)}"
-        logger.error(error_msg)
-        logger.error(f"详细错误: {traceback.format_exc()}")
-        raise Exception(error_msg)
+        _raise_tool_error("Schema补充失败", e)
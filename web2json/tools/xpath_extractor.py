@@ -7,9 +7,28 @@ import json
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 from loguru import logger
+from lxml import etree
 
-from web2json.utils.llm_client import LLMClient
+from web2json.utils.json_repair import JSONRepairError
+from web2json.utils.model_router import model_router
 from web2json.prompts.xpath_extraction import XPathExtractionPrompts
+from web2json.utils.usage_ledger import PHASE_XPATH
+
+
+def _validate_xpath_map(result) -> Dict[str, str]:
+    """校验 LLM 返回的字段-XPath 映射：非空 JSON 对象，每个值都是可编译的 XPath 表达式"""
+    if not isinstance(result, dict):
+        raise ValueError(f"LLM返回的XPath映射不是JSON对象: {type(result).__name__}")
+    if not result:
+        raise ValueError("LLM返回的XPath映射为空")
+    for field, xpath in result.items():
+        if not isinstance(xpath, str) or not xpath.strip():
+            raise ValueError(f"字段 {field} 的XPath不是字符串: {xpath!r}")
+        try:
+            etree.XPath(xpath)
+        except etree.XPathSyntaxError as e:
+            raise ValueError(f"字段 {field} 的XPath无法编译: {xpath} ({e})")
+    return result
 
 
 class XPathExtractor:
@@ -196,9 +215,6 @@ class XPathExtractor:
             logger.error(f"读取parser文件失败: {e}")
             return {}
 
-        # 创建LLM客户端
-        llm = LLMClient.for_scenario("default")
-
         # 构建prompt
         prompt = XPathExtractionPrompts.get_xpath_extraction_prompt(parser_code)
 
@@ -206,28 +222,17 @@ class XPathExtractor:
         try:
             logger.info("调用LLM提取最优XPath表达式...")
             messages = [{"role": "user", "content": prompt}]
-            response = llm.chat_completion(messages)
-
-            # 解析JSON响应
-            # 尝试提取JSON部分（可能有```json标记）
-            response = response.strip()
-            if response.startswith("```json"):
-                response = response[7:]
-            if response.startswith("```"):
-                response = response[3:]
-            if response.endswith("```"):
-                response = response[:-3]
-            response = response.strip()
-
-            # 解析JSON
-            field_xpaths = json.loads(response)
+            # 按路由档位调用（默认便宜档位），XPath 无法编译时升级到更大的档位
+            field_xpaths = model_router.chat_json(PHASE_XPATH, messages, validate=_validate_xpath_map)
 
             logger.success(f"成功提取 {len(field_xpaths)} 个字段的最优XPath")
             return field_xpaths
 
-        except json.JSONDecodeError as e:
+        except JSONRepairError as e:
             logger.error(f"解析LLM响应失败: {e}")
-            logger.debug(f"LLM响应: {response}")
+            return {}
+        except ValueError as e:
+            logger.error(f"LLM返回的XPath映射无效: {e}")
             return {}
         except Exception as e:
             logger.error(f"LLM调用失败: {e}")
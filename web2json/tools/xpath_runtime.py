@@ -0,0 +1,269 @@
+"""
+XPath 编译运行时
+直接执行 CodePhase 产出的 xpaths.json：每个字段的 XPath 用 lxml.etree.XPath 预编译一次，
+每个页面只解析一次 DOM 后对所有字段求值；只有 XPath 结果为空的字段才回退到生成的 WebPageParser 类。
+
+与 WebPageParser 一样提供 parse(html) -> dict，可以直接替换批量解析中的解析器。
+也可以作为脚本运行，对同一批页面比较两种引擎的吞吐量和输出一致性：
+
+    python -m web2json.tools.xpath_runtime output/blog
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+from lxml import etree, html as lxml_html
+
+from web2json.utils.parser_loader import parser_loader
+
+# Schema 中表示多值字段的类型
+_LIST_TYPES = ('array', 'list')
+
+
+def _texts(result) -> List[Any]:
+    """XPath 结果转换为非空值列表（元素取文本内容，字符串去除首尾空白）"""
+    items = result if isinstance(result, list) else [result]
+    values = []
+    for item in items:
+        if isinstance(item, etree._Element):
+            item = item.text_content() if hasattr(item, 'text_content') else ''.join(item.itertext())
+        if isinstance(item, str):
+            item = item.strip()
+            if item:
+                values.append(str(item))
+        elif isinstance(item, float):
+            values.append(int(item) if item.is_integer() else item)
+        elif item is not None and item is not False:
+            values.append(item)
+    return values
+
+
+class XPathRuntime:
+    """按字段执行预编译 XPath 的解析器"""
+
+    def __init__(
+        self,
+        field_xpaths: Dict[str, Union[str, List[str]]],
+        schema: Optional[Dict[str, Any]] = None,
+        fallback_parser=None,
+    ):
+        """
+        Args:
+            field_xpaths: 字段到 XPath（或按优先级排列的 XPath 列表）的映射，即 xpaths.json 的内容
+            schema: 最终 Schema（决定输出字段及顺序，array 类型字段输出列表；为 None 时只输出 field_xpaths 中的字段）
+            fallback_parser: 生成的 WebPageParser 实例，XPath 结果为空的字段由它补齐（可选）
+        """
+        self.schema = schema or {}
+        self.fields = list(self.schema) or list(field_xpaths)
+        self.fallback_parser = fallback_parser
+        self.compiled: Dict[str, List[etree.XPath]] = {}
+        for field, xpaths in field_xpaths.items():
+            if isinstance(xpaths, str):
+                xpaths = [xpaths]
+            compiled = []
+            for xpath in xpaths or []:
+                if not isinstance(xpath, str) or not xpath.strip():
+                    continue
+                try:
+                    compiled.append(etree.XPath(xpath))
+                except etree.XPathSyntaxError as e:
+                    logger.warning(f"字段 {field} 的XPath无法编译，忽略: {xpath} ({e})")
+            if compiled:
+                self.compiled[field] = compiled
+        # xpaths.json 的键取自生成类的 _extract_xxx 方法名，未必与 Schema 字段一致；没有 XPath 的字段只能依赖生成类
+        self.uncovered_fields = [field for field in self.fields if field not in self.compiled]
+        if self.schema and self.uncovered_fields:
+            unused = [field for field in self.compiled if field not in self.schema]
+            logger.warning(
+                f"{len(self.uncovered_fields)}/{len(self.fields)} 个 Schema 字段没有可用的XPath，将回退到生成类: "
+                f"{self.uncovered_fields}" + (f"（xpaths.json 中未对应 Schema 的键: {unused}）" if unused else "")
+            )
+        # 最近一次 parse 中回退到生成类的字段
+        self.last_fallback: List[str] = []
+
+    def _is_list_field(self, field: str) -> bool:
+        field_def = self.schema.get(field)
+        return isinstance(field_def, dict) and str(field_def.get('type', '')).lower() in _LIST_TYPES
+
+    @staticmethod
+    def _parse_tree(html: str):
+        try:
+            return lxml_html.fromstring(html)
+        except ValueError:
+            # 带编码声明的字符串需要以字节形式解析
+            return lxml_html.fromstring(html.encode('utf-8'))
+        except etree.ParserError:
+            return None
+
+    def _evaluate(self, tree, field: str) -> Any:
+        for xpath in self.compiled.get(field, []):
+            try:
+                values = _texts(xpath(tree))
+            except etree.XPathEvalError:
+                continue
+            if values:
+                if self._is_list_field(field):
+                    return values
+                return values[0] if len(values) == 1 else " ".join(str(value) for value in values)
+        return None
+
+    def parse(self, html: str) -> Dict[str, Any]:
+        """解析页面：DOM 只构建一次，所有字段共用；XPath 结果为空的字段回退到生成类"""
+        tree = self._parse_tree(html) if html and html.strip() else None
+        result = {field: self._evaluate(tree, field) if tree is not None else None for field in self.fields}
+
+        self.last_fallback = [field for field, value in result.items() if value is None]
+        if self.last_fallback and self.fallback_parser is not None:
+            fallback_result = self.fallback_parser.parse(html) or {}
+            for field in self.last_fallback:
+                result[field] = fallback_result.get(field)
+        return result
+
+
+def load_xpath_runtime(xpaths_path: str, schema_path: Optional[str] = None, fallback_parser=None) -> XPathRuntime:
+    """
+    从 xpaths.json（和最终 Schema）构建运行时
+
+    Args:
+        xpaths_path: xpaths.json 路径
+        schema_path: final_schema.json 路径（可选）
+        fallback_parser: 回退用的 WebPageParser 实例（可选）
+    """
+    with open(xpaths_path, 'r', encoding='utf-8') as f:
+        field_xpaths = json.load(f)
+    schema = None
+    if schema_path and Path(schema_path).exists():
+        with open(schema_path, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+    return XPathRuntime(field_xpaths, schema=schema, fallback_parser=fallback_parser)
+
+
+def benchmark(html_contents: List[str], parser, runtime: XPathRuntime, repeat: int = 3) -> Dict[str, Any]:
+    """
+    在同一批页面上比较生成类与 XPath 运行时的吞吐量和输出一致性
+
+    Args:
+        html_contents: 页面 HTML（预先读入内存，不计文件 IO）
+        parser: 生成的 WebPageParser 实例
+        runtime: XPath 运行时（回退解析器应为同一个 parser）
+        repeat: 每个引擎重复的轮数（取最快一轮）
+
+    Returns:
+        {'pages', 'parser_pages_per_sec', 'xpath_pages_per_sec', 'speedup',
+         'fallback_pages', 'fallback_fields', 'agreement', 'field_agreement'}
+    """
+    def timed(engine) -> Tuple[float, List[Dict]]:
+        best, outputs = float('inf'), []
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            outputs = [engine(html) for html in html_contents]
+            best = min(best, time.perf_counter() - start)
+        return best, outputs
+
+    def safe_parse(html):
+        try:
+            return parser.parse(html) or {}
+        except Exception:
+            return {}
+
+    fallback_counts: Dict[str, int] = {}
+    fallback_pages = 0
+
+    def runtime_parse(html):
+        nonlocal fallback_pages
+        try:
+            output = runtime.parse(html)
+        except Exception:
+            output = {}
+        if runtime.last_fallback:
+            fallback_pages += 1
+            for field in runtime.last_fallback:
+                fallback_counts[field] = fallback_counts.get(field, 0) + 1
+        return output
+
+    parser_seconds, parser_outputs = timed(safe_parse)
+    xpath_seconds, xpath_outputs = timed(runtime_parse)
+    rounds = max(1, repeat)
+
+    field_agreement = {}
+    for field in runtime.fields:
+        same = sum(1 for a, b in zip(parser_outputs, xpath_outputs) if a.get(field) == b.get(field))
+        field_agreement[field] = round(same / max(len(html_contents), 1), 4)
+
+    pages = len(html_contents)
+    parser_rate = pages / parser_seconds if parser_seconds else 0.0
+    xpath_rate = pages / xpath_seconds if xpath_seconds else 0.0
+    return {
+        'pages': pages,
+        'parser_pages_per_sec': round(parser_rate, 1),
+        'xpath_pages_per_sec': round(xpath_rate, 1),
+        'speedup': round(xpath_rate / parser_rate, 2) if parser_rate else None,
+        'fallback_pages': fallback_pages // rounds,
+        'fallback_fields': {field: count // rounds for field, count in fallback_counts.items()},
+        'agreement': round(sum(field_agreement.values()) / max(len(field_agreement), 1), 4),
+        'field_agreement': field_agreement,
+    }
+
+
+def _run_html_files(output_dir: Path) -> List[str]:
+    """运行的输入页面：优先读取输入清单，否则使用 html_original 目录"""
+    from web2json.utils.input_manifest import MANIFEST_FILENAME, read_input_manifest
+
+    manifest_path = output_dir / MANIFEST_FILENAME
+    if manifest_path.exists():
+        return [entry.get('stored') or entry['path'] for entry in read_input_manifest(manifest_path)]
+    return sorted(str(path) for path in (output_dir / "html_original").glob("*.htm*"))
+
+
+def main():
+    """命令行入口：对一次运行的输出目录做引擎对比"""
+    parser = argparse.ArgumentParser(description="比较生成的解析器类与 XPath 运行时的吞吐量和输出一致性")
+    parser.add_argument("output_dir", help="ParserAgent 的输出目录（包含 final_parser.py 和 parsers/xpaths.json）")
+    parser.add_argument("-d", "--directory", help="页面目录（默认使用运行的输入清单或 html_original）")
+    parser.add_argument("-n", "--limit", type=int, default=0, help="最多使用的页面数（0 表示全部）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个引擎重复的轮数（取最快一轮）")
+    parser.add_argument("--json", action="store_true", help="在标准输出打印完整的 JSON 报告")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    xpaths_path = output_dir / "parsers" / "xpaths.json"
+    if not xpaths_path.exists():
+        logger.error(f"未找到 XPath 映射: {xpaths_path}")
+        sys.exit(1)
+
+    if args.directory:
+        html_files = sorted(str(path) for path in Path(args.directory).glob("*.htm*"))
+    else:
+        html_files = _run_html_files(output_dir)
+    if args.limit:
+        html_files = html_files[:args.limit]
+    if not html_files:
+        logger.error("没有可用于对比的页面")
+        sys.exit(1)
+
+    html_contents = [Path(path).read_text(encoding='utf-8', errors='replace') for path in html_files]
+    generated_parser = parser_loader.get(str(output_dir / "final_parser.py"))
+    runtime = load_xpath_runtime(
+        str(xpaths_path),
+        schema_path=str(output_dir / "schemas" / "final_schema.json"),
+        fallback_parser=generated_parser,
+    )
+    report = benchmark(html_contents, generated_parser, runtime, repeat=args.repeat)
+
+    logger.info(f"页面数: {report['pages']}")
+    logger.info(f"  生成类:     {report['parser_pages_per_sec']} 页/秒")
+    logger.info(f"  XPath运行时: {report['xpath_pages_per_sec']} 页/秒（{report['speedup']}x）")
+    logger.info(f"  回退页面: {report['fallback_pages']}，回退字段: {report['fallback_fields'] or '无'}")
+    logger.info(f"  输出一致率: {report['agreement']:.1%}")
+    for field, rate in report['field_agreement'].items():
+        logger.info(f"    - {field}: {rate:.1%}")
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+"""
+离线 OpenAI 兼容的 LLM 模拟服务
+按请求类型（Schema提取/补充/合并、代码生成、XPath提取）返回确定性的响应，
+可配置延迟分布、错误率和 token 数，用于在不调用真实服务的情况下压测整个流水线
+
+支持 stream=true（SSE），此时 latency 为首 token 延迟，其余按 latency_per_token 逐块输出；
+客户端中途断开时停止输出并计入 stream_aborted
+
+使用方式：
+    python -m web2json.utils.fake_llm_server --port 8765 --latency-median 1.5
+    export OPENAI_API_BASE=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from lxml import html as lxml_html
+from loguru import logger
+
+# 自动提取模式下尝试的候选字段（字段名 -> (描述, xpath)）
+_CANDIDATE_FIELDS = {
+    "title": ("页面标题", "//title/text()"),
+    "heading": ("主标题", "//h1//text()"),
+    "description": ("页面描述", "//meta[@name='description']/@content"),
+    "content": ("正文段落", "//p//text()"),
+}
+
+
+@dataclass
+class FakeLLMConfig:
+    """模拟服务配置"""
+    # 延迟分布：fixed 固定为 latency_median；lognormal 以 latency_median 为中位数、latency_sigma 为对数标准差
+    latency_distribution: str = "lognormal"
+    latency_median: float = 0.5
+    latency_sigma: float = 0.5
+    # 每个输出 token 额外耗时（秒），模拟生成速度
+    latency_per_token: float = 0.0
+    # 返回 503 / 429 的概率
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # token 计数：按字符数估算；completion_tokens 大于 0 时固定为该值
+    chars_per_token: float = 4.0
+    completion_tokens: int = 0
+    # 模拟服务端前缀缓存：除最后一条外的消息前缀若已出现过，按 OpenAI 格式在 usage 中报告 cached_tokens
+    prefix_cache: bool = True
+    # 是否支持 response_format=json_object；不支持时此类请求返回 400（模拟不兼容的后端）
+    json_mode_supported: bool = True
+    # 代码生成请求返回退化输出（不断重复的行、没有 WebPageParser 类）的概率，用于压测流式提前终止
+    degenerate_code_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """消息文本，兼容字符串和 content 块列表（带 cache_control 的消息）两种格式"""
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return str(content)
+
+
+def _json_blocks(text: str) -> List[str]:
+    return re.findall(r"```json\s*(.*?)```", text, re.DOTALL)
+
+
+def _json_block_after(text: str, marker: str) -> Optional[Dict]:
+    """解析 marker 最后一次出现之后的第一个 JSON 代码块（静态指令中也可能提到 marker）"""
+    idx = text.rfind(marker)
+    if idx < 0:
+        return None
+    blocks = _json_blocks(text[idx:])
+    if not blocks:
+        return None
+    try:
+        return json.loads(blocks[0])
+    except json.JSONDecodeError:
+        return None
+
+
+def _html_block(text: str) -> str:
+    match = re.search(r"```html\s*(.*?)```", text, re.DOTALL)
+    return match.group(1) if match else ""
+
+
+def _first_value(tree, xpath: str) -> Optional[str]:
+    if tree is None:
+        return None
+    try:
+        for value in tree.xpath(xpath):
+            value = str(value).strip()
+            if value:
+                return value
+    except Exception:
+        return None
+    return None
+
+
+def _parse_html(html_content: str):
+    try:
+        return lxml_html.fromstring(html_content) if html_content.strip() else None
+    except Exception:
+        return None
+
+
+def _field_xpaths(field: Dict) -> List[str]:
+    """兼容 xpath（字符串）和 xpaths（列表）两种写法"""
+    xpaths = field.get("xpaths") if isinstance(field, dict) else None
+    if isinstance(xpaths, list):
+        return [x for x in xpaths if x]
+    xpath = field.get("xpath") if isinstance(field, dict) else None
+    return [xpath] if xpath else []
+
+
+class FakeLLMBackend:
+    """根据请求内容生成确定性的模拟响应"""
+
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.stats: Counter = Counter()
+        self._in_flight = 0
+        self.peak_in_flight = 0
+        self._seen_prefixes: set = set()
+
+    # ---------- 请求分类与响应内容 ----------
+
+    @staticmethod
+    def classify(messages: List[Dict[str, Any]]) -> str:
+        text = "\n".join(_message_text(m) for m in messages)
+        if "Schema整合专家" in text:
+            return "schema_merge"
+        if "HTML分析和XPath专家" in text:
+            return "schema_enrich"
+        if "HTML分析专家" in text:
+            return "schema_extract"
+        if "Python代码生成" in text or ("WebPageParser" in text and "```html" in text):
+            return "code_gen"
+        if "最优XPath" in text:
+            return "xpath_extract"
+        return "other"
+
+    def build_content(self, kind: str, messages: List[Dict[str, Any]]) -> str:
+        text = "\n".join(_message_text(m) for m in messages)
+        if kind == "schema_extract":
+            return self._schema_response(self._extract_schema(_html_block(text)))
+        if kind == "schema_enrich":
+            template = _json_block_after(text, "Schema模板") or {}
+            return self._schema_response(self._enrich_schema(template, _html_block(text)))
+        if kind == "schema_merge":
+            return self._schema_response(self._merge_schemas(text))
+        if kind == "code_gen":
+            target = _json_block_after(text, "目标结构") or {}
+            return f"```python\n{self._parser_code(target)}```"
+        if kind == "xpath_extract":
+            return json.dumps(self._parser_xpaths(text), ensure_ascii=False, indent=2)
+        return "OK"
+
+    @staticmethod
+    def _schema_response(schema: Dict) -> str:
+        return f"```json\n{json.dumps(schema, ensure_ascii=False, indent=2)}\n```"
+
+    @staticmethod
+    def _extract_schema(html_content: str) -> Dict:
+        tree = _parse_html(html_content)
+        schema = {}
+        for name, (description, xpath) in _CANDIDATE_FIELDS.items():
+            value = _first_value(tree, xpath)
+            if value is not None:
+                schema[name] = {
+                    "type": "string",
+                    "description": description,
+                    "value_sample": value[:100],
+                    "xpath": xpath,
+                }
+        if not schema:
+            name, (description, xpath) = next(iter(_CANDIDATE_FIELDS.items()))
+            schema[name] = {"type": "string", "description": description, "value_sample": None, "xpath": xpath}
+        return schema
+
+    @staticmethod
+    def _enrich_schema(template: Dict, html_content: str) -> Dict:
+        tree = _parse_html(html_content)
+        enriched = {}
+        for name, field in template.items():
+            field = dict(field) if isinstance(field, dict) else {}
+            xpath = f"//*[contains(@class, '{name}') or @id='{name}']//text()"
+            field["xpath"] = xpath
+            field["value_sample"] = _first_value(tree, xpath)
+            enriched[name] = field
+        return enriched
+
+    @staticmethod
+    def _merge_schemas(text: str) -> Dict:
+        merged: Dict[str, Dict] = {}
+        for block in _json_blocks(text):
+            try:
+                schema = json.loads(block)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(schema, dict):
+                continue
+            for name, field in schema.items():
+                if not isinstance(field, dict):
+                    continue
+                entry = merged.setdefault(name, {
+                    "type": field.get("type", "string"),
+                    "description": field.get("description", ""),
+                    "value_sample": field.get("value_sample"),
+                    "xpaths": [],
+                })
+                for xpath in _field_xpaths(field):
+                    if xpath not in entry["xpaths"]:
+                        entry["xpaths"].append(xpath)
+        return merged
+
+    @staticmethod
+    def _degenerate_code() -> str:
+        return "import json\n\n" + "    value = value.strip()  # 清理空白\n" * 600
+
+    @staticmethod
+    def _parser_code(target: Dict) -> str:
+        lines = [
+            "from lxml import html as lxml_html",
+            "",
+            "",
+            "class WebPageParser:",
+            "    def parse(self, html: str) -> dict:",
+            "        try:",
+            "            tree = lxml_html.fromstring(html)",
+            "        except Exception:",
+            "            return {}",
+            "        return {",
+        ]
+        methods = []
+        for idx, (name, field) in enumerate(target.items()):
+            method = re.sub(r"\W", "_", str(name))
+            if not method.isidentifier() or method[0].isdigit():
+                method = f"field_{idx}"
+            lines.append(f"            {json.dumps(name, ensure_ascii=False)}: self._extract_{method}(tree),")
+            methods.append("")
+            methods.append(f"    def _extract_{method}(self, tree):")
+            for xpath in _field_xpaths(field) or ["//title/text()"]:
+                methods.append(f"        values = [str(v).strip() for v in tree.xpath({json.dumps(xpath, ensure_ascii=False)}) if str(v).strip()]")
+                methods.append("        if values:")
+                methods.append("            return values[0]")
+            methods.append("        return None")
+        lines.append("        }")
+        return "\n".join(lines + methods) + "\n"
+
+    @staticmethod
+    def _parser_xpaths(text: str) -> Dict[str, str]:
+        result = {}
+        for match in re.finditer(r"def _extract_(\w+)\(self, tree\):\s*\n\s*values = .*?tree\.xpath\((\".*?\")\)", text):
+            result[match.group(1)] = json.loads(match.group(2))
+        return result
+
+    # ---------- 延迟、错误与 token ----------
+
+    def _sample(self) -> Tuple[float, float]:
+        with self._lock:
+            roll = self._rng.random()
+            if self.config.latency_distribution == "fixed":
+                latency = self.config.latency_median
+            else:
+                latency = self._rng.lognormvariate(math.log(max(self.config.latency_median, 1e-6)), self.config.latency_sigma)
+        return roll, latency
+
+    def count_tokens(self, text: str) -> int:
+        return max(1, int(math.ceil(len(text) / self.config.chars_per_token)))
+
+    def _cached_prefix_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """按消息粒度模拟前缀缓存：返回已见过的最长前缀（不含最后一条消息）的 token 数，并登记本次的前缀"""
+        if not self.config.prefix_cache:
+            return 0
+        digest = hashlib.sha256()
+        cached_tokens = prefix_tokens = 0
+        with self._lock:
+            for message in messages[:-1]:
+                text = _message_text(message)
+                digest.update(f"{message.get('role')}\0{text}\0".encode("utf-8"))
+                prefix_tokens += self.count_tokens(text)
+                key = digest.hexdigest()
+                if key in self._seen_prefixes:
+                    cached_tokens = prefix_tokens
+                else:
+                    self._seen_prefixes.add(key)
+            self.stats["cached_prompt_tokens"] += cached_tokens
+        return cached_tokens
+
+    def handle(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        """处理一次 chat.completions 请求，返回 (状态码, 响应体, 额外响应头)"""
+        messages = payload.get("messages", [])
+        kind = self.classify(messages)
+        roll, latency = self._sample()
+
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[f"kind:{kind}"] += 1
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+
+        try:
+            json_mode = (payload.get("response_format") or {}).get("type") == "json_object"
+            if json_mode and not self.config.json_mode_supported:
+                with self._lock:
+                    self.stats["json_mode_rejected"] += 1
+                return 400, {"error": {"message": "response_format 'json_object' is not supported (fake)",
+                                       "type": "invalid_request_error"}}, {}
+            if roll < self.config.rate_limit_rate:
+                with self._lock:
+                    self.stats["rate_limited"] += 1
+                return 429, {"error": {"message": "Rate limit exceeded (fake)", "type": "rate_limit_error"}}, {"Retry-After": "1"}
+            if roll < self.config.rate_limit_rate + self.config.error_rate:
+                time.sleep(latency)
+                with self._lock:
+                    self.stats["errors"] += 1
+                return 503, {"error": {"message": "Service unavailable (fake)", "type": "server_error"}}, {}
+
+            with self._lock:
+                degenerate = kind == "code_gen" and self._rng.random() < self.config.degenerate_code_rate
+            content = self._degenerate_code() if degenerate else self.build_content(kind, messages)
+            if json_mode:
+                # JSON 模式下只输出 JSON 本身，去掉代码围栏
+                content = content.strip().removeprefix("```json").removesuffix("```").strip()
+            prompt_tokens = self.count_tokens("".join(_message_text(m) for m in messages))
+            cached_tokens = self._cached_prefix_tokens(messages)
+            completion_tokens = self.config.completion_tokens or self.count_tokens(content)
+            if payload.get("stream"):
+                # 流式请求：这里只等待首 token 延迟，生成耗时在逐块输出时体现
+                time.sleep(latency)
+            else:
+                time.sleep(latency + completion_tokens * self.config.latency_per_token)
+
+            body = {
+                "id": f"chatcmpl-fake-{self.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake-model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                },
+            }
+            return 200, body, {}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stream_chunks(self, body: Dict[str, Any], include_usage: bool):
+        """把完整响应拆成 SSE 数据块（按 latency_per_token 控制输出节奏）"""
+        content = body["choices"][0]["message"]["content"]
+        chunk_chars = max(1, int(self.config.chars_per_token * 8))
+        base = {key: body[key] for key in ("id", "created", "model")}
+        base["object"] = "chat.completion.chunk"
+
+        for start in range(0, len(content), chunk_chars):
+            piece = content[start:start + chunk_chars]
+            time.sleep(self.count_tokens(piece) * self.config.latency_per_token)
+            delta = {"content": piece}
+            if start == 0:
+                delta["role"] = "assistant"
+            yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        if include_usage:
+            yield {**base, "choices": [], "usage": body["usage"]}
+
+    def record_stream_abort(self) -> None:
+        with self._lock:
+            self.stats["stream_aborted"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**dict(self.stats), "in_flight": self._in_flight, "peak_in_flight": self.peak_in_flight}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    backend: FakeLLMBackend = None
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.backend.get_stats())
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        status, body, headers = self.backend.handle(payload)
+        if status == 200 and payload.get("stream"):
+            include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+            self._send_stream(body, include_usage)
+        else:
+            self._send_json(status, body, headers)
+
+    def _send_stream(self, body: Dict[str, Any], include_usage: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for chunk in self.backend.stream_chunks(body, include_usage):
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前终止了生成
+            self.backend.record_stream_abort()
+
+    def log_message(self, format, *args):
+        logger.debug(f"[fake-llm] {format % args}")
+
+
+class FakeLLMServer:
+    """模拟服务，可在后台线程中启动（用于测试和压测脚本）"""
+
+    def __init__(self, config: FakeLLMConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.backend = FakeLLMBackend(config or FakeLLMConfig())
+        handler = type("FakeLLMHandler", (_Handler,), {"backend": self.backend})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线 OpenAI 兼容 LLM 模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-distribution", choices=["fixed", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-median", type=float, default=0.5, help="延迟中位数（秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="对数正态分布的 sigma")
+    parser.add_argument("--latency-per-token", type=float, default=0.0, help="每个输出 token 的额外耗时（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--chars-per-token", type=float, default=4.0)
+    parser.add_argument("--completion-tokens", type=int, default=0, help="固定的输出 token 数（0 表示按内容估算）")
+    parser.add_argument("--no-prefix-cache", action="store_true", help="不模拟服务端前缀缓存")
+    parser.add_argument("--no-json-mode", action="store_true", help="拒绝 response_format=json_object 请求")
+    parser.add_argument("--degenerate-code-rate", type=float, default=0.0, help="代码生成返回退化输出的概率")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency_distribution=args.latency_distribution,
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        latency_per_token=args.latency_per_token,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        chars_per_token=args.chars_per_token,
+        completion_tokens=args.completion_tokens,
+        prefix_cache=not args.no_prefix_cache,
+        json_mode_supported=not args.no_json_mode,
+        degenerate_code_rate=args.degenerate_code_rate,
+        seed=args.seed,
+    )
+    server = FakeLLMServer(config, host=args.host, port=args.port)
+    logger.info(f"LLM模拟服务已启动: {server.base_url}")
+    logger.info(f"  export OPENAI_API_BASE={server.base_url} OPENAI_API_KEY=fake")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
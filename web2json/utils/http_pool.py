@@ -0,0 +1,120 @@
+"""
+共享 HTTP 连接池
+所有 LLM 客户端复用同一组 keep-alive 连接，并统计连接复用情况
+"""
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+
+from web2json.config.settings import settings
+
+
+class SharedHTTPPool:
+    """进程级共享的 HTTP 连接池
+
+    - 同步调用共享一个 httpx.Client
+    - 异步调用按事件循环各共享一个 httpx.AsyncClient（连接不能跨事件循环复用）
+    - 通过 httpcore 的 trace 扩展统计新建连接数，请求数减去新建连接数即复用次数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._requests = 0
+        self._new_connections = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.llm_http_max_connections,
+            max_keepalive_connections=settings.llm_http_max_keepalive_connections,
+            keepalive_expiry=settings.llm_http_keepalive_expiry,
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(settings.llm_http_timeout, connect=10.0)
+
+    def _record_request(self) -> None:
+        with self._lock:
+            self._requests += 1
+
+    def _record_connection(self, event_name: str) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self._new_connections += 1
+
+    def _on_request(self, request: httpx.Request) -> None:
+        self._record_request()
+        request.extensions["trace"] = lambda name, info: self._record_connection(name)
+
+    async def _on_async_request(self, request: httpx.Request) -> None:
+        self._record_request()
+
+        async def trace(name: str, info: Dict[str, Any]) -> None:
+            self._record_connection(name)
+
+        request.extensions["trace"] = trace
+
+    def get_client(self) -> httpx.Client:
+        """获取共享的同步 HTTP 客户端"""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    limits=self._limits(),
+                    timeout=self._timeout(),
+                    event_hooks={"request": [self._on_request]},
+                )
+            return self._client
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        """获取当前事件循环共享的异步 HTTP 客户端（无运行中的事件循环时按默认循环创建）"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        with self._lock:
+            if loop is None:
+                return httpx.AsyncClient(
+                    limits=self._limits(),
+                    timeout=self._timeout(),
+                    event_hooks={"request": [self._on_async_request]},
+                )
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    limits=self._limits(),
+                    timeout=self._timeout(),
+                    event_hooks={"request": [self._on_async_request]},
+                )
+                self._async_clients[loop] = client
+            return client
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接复用统计"""
+        with self._lock:
+            requests = self._requests
+            new_connections = self._new_connections
+        reused = max(requests - new_connections, 0)
+        return {
+            "requests": requests,
+            "new_connections": new_connections,
+            "reused_connections": reused,
+            "reuse_rate": round(reused / requests, 4) if requests else 0.0,
+        }
+
+    def close(self) -> None:
+        """关闭同步客户端（异步客户端随事件循环释放）"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+# 全局连接池实例
+http_pool = SharedHTTPPool()
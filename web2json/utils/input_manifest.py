@@ -0,0 +1,134 @@
+"""
+输入清单
+用文件列表（路径 + 内容哈希 + 大小）描述一次运行的输入 HTML，代替把每个文件复制到输出目录。
+需要在输出目录中放置文件时按 INPUT_MATERIALIZE 配置使用硬链接 / reflink / 复制：
+
+- manifest: 只写清单，不落地任何 HTML 字节（默认）
+- hardlink: 硬链接（跨文件系统时退回复制）
+- reflink:  写时复制克隆（仅支持的文件系统，如 Btrfs/XFS；不支持时退回复制）
+- copy:     复制
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from loguru import logger
+
+MANIFEST_FILENAME = "input_manifest.jsonl"
+MATERIALIZE_MODES = ("manifest", "hardlink", "reflink", "copy")
+
+# Linux FICLONE ioctl（include/uapi/linux/fs.h）
+_FICLONE = 0x40049409
+
+
+def file_digest(path: str) -> str:
+    """文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(src: str, dst: str) -> None:
+    import fcntl
+
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+
+
+def materialize(src: str, dst: str, mode: str) -> str:
+    """
+    在 dst 放置 src 的内容
+
+    Args:
+        src: 源文件
+        dst: 目标路径（已存在时先删除）
+        mode: hardlink / reflink / copy（manifest 视为不需要落地，直接返回）
+
+    Returns:
+        实际使用的方式（链接失败退回复制时为 copy）
+    """
+    if mode == "manifest":
+        return mode
+    if mode not in MATERIALIZE_MODES:
+        raise ValueError(f"未知的输入落地方式: {mode}（可选: {', '.join(MATERIALIZE_MODES)}）")
+
+    dst_path = Path(dst)
+    dst_path.parent.mkdir(parents=True, exist_ok=True)
+    if dst_path.exists() or dst_path.is_symlink():
+        if dst_path.samefile(src):
+            return mode
+        dst_path.unlink()
+
+    try:
+        if mode == "hardlink":
+            os.link(src, dst)
+            return mode
+        if mode == "reflink":
+            _reflink(src, dst)
+            return mode
+    except (OSError, ImportError) as e:
+        logger.debug(f"{mode} 失败，改为复制: {src} -> {dst}: {e}")
+        dst_path.unlink(missing_ok=True)
+
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def write_input_manifest(
+    html_files: Iterable[str],
+    output_dir: Path,
+    materialize_dir: Optional[Path] = None,
+    mode: str = "manifest",
+) -> Path:
+    """
+    写入输入清单（可选把文件按 mode 落地到 materialize_dir）
+
+    Args:
+        html_files: 输入 HTML 文件路径
+        output_dir: 清单所在目录
+        materialize_dir: 落地目录（mode 为 manifest 时忽略）
+        mode: 落地方式
+
+    Returns:
+        清单文件路径
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_FILENAME
+
+    modes: Dict[str, int] = {}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        for path in html_files:
+            src = Path(path)
+            entry = {
+                'path': str(src.absolute()),
+                'name': src.name,
+                'sha256': file_digest(path),
+                'size': src.stat().st_size,
+            }
+            if mode != "manifest" and materialize_dir is not None:
+                stored = Path(materialize_dir) / src.name
+                used = materialize(path, str(stored), mode)
+                modes[used] = modes.get(used, 0) + 1
+                entry['stored'] = str(stored)
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    if modes:
+        logger.info(f"输入文件已落地到 {materialize_dir}: {modes}")
+    return manifest_path
+
+
+def read_input_manifest(manifest_path: Path) -> List[Dict]:
+    """读取输入清单"""
+    entries = []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
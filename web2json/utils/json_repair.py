@@ -0,0 +1,364 @@
+"""
+容错 JSON 解析
+单遍扫描模型输出，边读边修复常见的格式问题后交给 json.loads：
+
+- 跳过 ```json 围栏、前后的说明文字和 // /* */ 注释
+- 补全缺失的逗号和冒号，删除多余/尾随逗号
+- 单引号字符串、字符串内的裸换行和未转义引号、非法转义
+- Python 字面量（True/False/None）、未加引号的键
+- 输出被截断时补全未闭合的字符串和括号
+
+支持分块 feed()，流式输出时可随时用 partial() 取得当前已接收部分的解析结果
+"""
+import json
+from typing import Any, List, Optional
+
+# 容器内的期望状态
+_EXPECT_KEY = "key"        # 对象：期望键或 }
+_EXPECT_COLON = "colon"    # 对象：键之后期望 :
+_EXPECT_VALUE = "value"    # 对象 : 之后 / 数组：期望值
+_EXPECT_COMMA = "comma"    # 值之后期望 , 或闭合括号
+
+_CLOSERS = {"{": "}", "[": "]"}
+_VALID_ESCAPES = set('"\\/bfnrtu')
+_NUMBER_CHARS = set("0123456789+-.eE")
+_LITERALS = {
+    "true": "true", "True": "true",
+    "false": "false", "False": "false",
+    "null": "null", "None": "null", "NaN": "null", "undefined": "null",
+}
+
+
+class JSONRepairError(ValueError):
+    """修复后仍无法解析为 JSON"""
+
+
+class IncrementalJSONParser:
+    """增量容错 JSON 解析器
+
+    用法：
+        parser = IncrementalJSONParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+            preview = parser.partial()   # 可选：当前已接收部分的解析结果
+        result = parser.finish()
+    """
+
+    def __init__(self):
+        self._pending = ""              # 尚未处理的输入（token 跨块时暂存）
+        self._out: List[str] = []       # 修复后的 JSON 文本
+        self._stack: List[str] = []     # 未闭合的容器（{ 或 [）
+        self._states: List[str] = []    # 每个容器当前的期望状态
+        self._quote: Optional[str] = None   # 当前字符串的引号，不在字符串内时为 None
+        self._string_is_key = False
+        self._escape = False
+        self._comment: Optional[str] = None  # 当前注释类型（// 或 /*）
+        self.done = False               # 根容器已闭合，后续输入全部忽略
+
+    @property
+    def started(self) -> bool:
+        return bool(self._out)
+
+    def feed(self, text: str) -> None:
+        """追加一段输入"""
+        if self.done or not text:
+            return
+        self._pending += text
+        self._process(final=False)
+
+    def partial(self) -> Any:
+        """返回当前已接收部分补全后的解析结果（尚未开始时返回 None）"""
+        if not self._out:
+            return None
+        try:
+            return json.loads(self._closed_text())
+        except json.JSONDecodeError:
+            return None
+
+    def finish(self) -> Any:
+        """结束输入，补全截断的结构并返回解析结果
+
+        Raises:
+            JSONRepairError: 输入中没有 JSON 或修复后仍无法解析
+        """
+        self._process(final=True)
+        if not self._out:
+            raise JSONRepairError("响应中未找到JSON对象或数组")
+        text = self._closed_text()
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise JSONRepairError(f"JSON修复失败: {e}") from e
+
+    # ---------- 状态 ----------
+
+    @property
+    def _state(self) -> Optional[str]:
+        return self._states[-1] if self._states else None
+
+    def _set_state(self, state: str) -> None:
+        if self._states:
+            self._states[-1] = state
+
+    def _in_object(self) -> bool:
+        return bool(self._stack) and self._stack[-1] == "{"
+
+    def _strip_trailing_comma(self, out: List[str]) -> None:
+        idx = len(out) - 1
+        while idx >= 0 and out[idx].isspace():
+            idx -= 1
+        if idx >= 0 and out[idx] == ",":
+            del out[idx]
+
+    def _begin_value(self) -> str:
+        """在写入一个键或值之前补齐分隔符，返回其角色（key / value）"""
+        state = self._state
+        if state == _EXPECT_COMMA:
+            self._out.append(",")
+            state = _EXPECT_KEY if self._in_object() else _EXPECT_VALUE
+        elif state == _EXPECT_COLON:
+            self._out.append(":")
+            state = _EXPECT_VALUE
+        self._set_state(state)
+        return "key" if state == _EXPECT_KEY else "value"
+
+    def _end_token(self, role: str) -> None:
+        self._set_state(_EXPECT_COLON if role == "key" else _EXPECT_COMMA)
+
+    def _dangling_fix(self) -> str:
+        """闭合对象前补全悬空的键（缺少冒号或值）"""
+        state = self._state
+        if self._in_object() and state == _EXPECT_COLON:
+            return ":null"
+        if self._in_object() and state == _EXPECT_VALUE:
+            return "null"
+        return ""
+
+    def _closed_text(self) -> str:
+        """在不改变内部状态的前提下，补全未闭合的字符串和括号"""
+        out = list(self._out)
+        states = list(self._states)
+        if self._quote is not None:
+            if self._escape:
+                out.append("\\\\")
+            out.append('"')
+            if self._string_is_key:
+                out.append(":null")
+            elif states:
+                states[-1] = _EXPECT_COMMA
+        # 只有最内层容器可能有悬空的键；外层容器的当前值就是内层容器本身
+        for depth, (container, state) in enumerate(zip(reversed(self._stack), reversed(states))):
+            self._strip_trailing_comma(out)
+            if depth == 0 and container == "{" and state == _EXPECT_COLON:
+                out.append(":null")
+            elif depth == 0 and container == "{" and state == _EXPECT_VALUE:
+                out.append("null")
+            out.append(_CLOSERS[container])
+        return "".join(out)
+
+    # ---------- 扫描 ----------
+
+    def _process(self, final: bool) -> None:
+        text = self._pending
+        n = len(text)
+        i = 0
+        while i < n and not self.done:
+            ch = text[i]
+
+            if self._comment is not None:
+                if self._comment == "//":
+                    if ch == "\n":
+                        self._comment = None
+                    i += 1
+                    continue
+                if ch == "*" and i + 1 >= n and not final:
+                    break
+                if text.startswith("*/", i):
+                    self._comment = None
+                    i += 2
+                else:
+                    i += 1
+                continue
+
+            if self._quote is not None:
+                consumed = self._consume_string_char(text, i, final)
+                if consumed == 0:
+                    break
+                i += consumed
+                continue
+
+            if not self._stack:
+                # 根容器之前的内容（围栏、说明文字）全部跳过
+                if ch in "{[":
+                    self._stack.append(ch)
+                    self._states.append(_EXPECT_KEY if ch == "{" else _EXPECT_VALUE)
+                    self._out.append(ch)
+                i += 1
+                continue
+
+            if ch.isspace():
+                self._out.append(ch)
+                i += 1
+            elif ch in "\"'":
+                self._string_is_key = self._begin_value() == "key"
+                self._quote = ch
+                self._out.append('"')
+                i += 1
+            elif ch in "{[":
+                self._begin_value()
+                self._stack.append(ch)
+                self._states.append(_EXPECT_KEY if ch == "{" else _EXPECT_VALUE)
+                self._out.append(ch)
+                i += 1
+            elif ch in "}]":
+                self._close_container()
+                i += 1
+            elif ch == ",":
+                state = self._state
+                if state == _EXPECT_COMMA:
+                    self._out.append(",")
+                    self._set_state(_EXPECT_KEY if self._in_object() else _EXPECT_VALUE)
+                elif state == _EXPECT_COLON:
+                    self._out.append(":null,")
+                    self._set_state(_EXPECT_KEY)
+                i += 1
+            elif ch == ":":
+                if self._state == _EXPECT_COLON:
+                    self._out.append(":")
+                    self._set_state(_EXPECT_VALUE)
+                i += 1
+            elif ch == "/":
+                if i + 1 >= n and not final:
+                    break
+                nxt = text[i + 1] if i + 1 < n else ""
+                if nxt in "/*":
+                    self._comment = "/" + nxt
+                    i += 2
+                else:
+                    i += 1
+            elif ch.isdigit() or ch in "+-." or ch.isalpha() or ch in "_$":
+                is_number = ch.isdigit() or ch in "+-."
+                end = i
+                while end < n and (
+                    text[end] in _NUMBER_CHARS if is_number else (text[end].isalnum() or text[end] in "_$")
+                ):
+                    end += 1
+                if end >= n and not final:
+                    break
+                self._write_bare_token(text[i:end], is_number=is_number)
+                i = end
+            else:
+                # 其他字符（反引号、全角符号等）不属于 JSON 结构，跳过
+                i += 1
+
+        self._pending = "" if self.done else text[i:]
+
+    def _consume_string_char(self, text: str, i: int, final: bool) -> int:
+        """处理字符串内的一个字符，返回消耗的字符数；需要更多输入才能判断时返回 0"""
+        ch = text[i]
+        if self._escape:
+            self._escape = False
+            if ch in _VALID_ESCAPES:
+                self._out.append("\\" + ch)
+            elif ch == "'":
+                self._out.append("'")
+            else:
+                # 非法转义（如 \d）保留为字面反斜杠
+                self._out.append("\\\\" + ch)
+            return 1
+        if ch == "\\":
+            self._escape = True
+            return 1
+        if ch == self._quote:
+            # 判断是闭合引号还是字符串内未转义的引号：看下一个非空白字符
+            j = i + 1
+            while j < len(text) and text[j].isspace():
+                j += 1
+            if j >= len(text) and not final:
+                return 0
+            nxt = text[j] if j < len(text) else ""
+            # 后面是分隔符/闭合括号/结尾，或换行后紧跟下一个字符串（缺逗号）时视为闭合
+            closes = nxt in ("", ",", ":", "}", "]") or (nxt in "\"'" and "\n" in text[i + 1:j])
+            if closes:
+                self._out.append('"')
+                self._quote = None
+                self._end_token("key" if self._string_is_key else "value")
+            else:
+                self._out.append('\\"')
+            return 1
+        if ch == '"':
+            self._out.append('\\"')
+        elif ch == "\n":
+            self._out.append("\\n")
+        elif ch == "\r":
+            self._out.append("\\r")
+        elif ch == "\t":
+            self._out.append("\\t")
+        elif ord(ch) < 0x20:
+            self._out.append(f"\\u{ord(ch):04x}")
+        else:
+            self._out.append(ch)
+        return 1
+
+    def _write_bare_token(self, token: str, is_number: bool) -> None:
+        """写入数字、字面量或未加引号的键"""
+        role = self._begin_value()
+        if role == "key":
+            self._out.append(json.dumps(token))
+        elif is_number:
+            number = token.lstrip("+")
+            if number.startswith("."):
+                number = "0" + number
+            elif number.startswith("-."):
+                number = "-0" + number[1:]
+            number = number.rstrip(".eE+-") or "0"
+            try:
+                json.loads(number)
+            except json.JSONDecodeError:
+                number = json.dumps(token)
+            self._out.append(number)
+        else:
+            self._out.append(_LITERALS.get(token, json.dumps(token)))
+        self._end_token(role)
+
+    def _close_container(self) -> None:
+        self._strip_trailing_comma(self._out)
+        self._out.append(self._dangling_fix())
+        container = self._stack.pop()
+        self._states.pop()
+        self._out.append(_CLOSERS[container])
+        if self._stack:
+            self._end_token("value")
+        else:
+            self.done = True
+
+
+def _fenced_json(text: str) -> Optional[str]:
+    """提取 ```json 围栏内的内容（没有闭合围栏时取到结尾）"""
+    start = text.find("```json")
+    if start < 0:
+        return None
+    start += len("```json")
+    end = text.find("```", start)
+    return text[start:end] if end >= 0 else text[start:]
+
+
+def parse_json_tolerant(text: str) -> Any:
+    """容错解析模型输出中的 JSON
+
+    先尝试对原文和 ```json 围栏内容直接 json.loads（快速路径），失败时再做单遍修复
+
+    Raises:
+        JSONRepairError: 输入中没有 JSON 或修复后仍无法解析
+    """
+    candidate = _fenced_json(text)
+    for source in (candidate, text.strip()):
+        if source:
+            try:
+                return json.loads(source)
+            except json.JSONDecodeError:
+                pass
+
+    parser = IncrementalJSONParser()
+    parser.feed(candidate if candidate is not None else text)
+    return parser.finish()
@@ -0,0 +1,184 @@
+"""
+LLM响应缓存 - 基于 SQLite 的内容寻址缓存
+以 (model, temperature, max_tokens, 请求参数, messages) 的哈希作为键，支持 TTL 过期、容量淘汰和命中率统计
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+
+class LLMResponseCache:
+    """LLM响应缓存
+
+    - 键: sha256(model + temperature + messages)，与调用方无关，相同 Prompt 即命中
+    - 过期: 写入超过 ttl_seconds 的条目视为失效（ttl_seconds <= 0 表示永不过期）
+    - 淘汰: 条目数超过 max_entries 时按最近访问时间淘汰最旧的条目
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int = 0, max_entries: int = 0):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite 数据库文件路径
+            ttl_seconds: 条目有效期（秒），<= 0 表示永不过期
+            max_entries: 最大条目数，<= 0 表示不限制
+        """
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_responses_accessed ON llm_responses(accessed_at)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: float,
+        messages: List[Dict[str, Any]],
+        max_tokens: Optional[int] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """根据模型、温度、最大 token 数、其他请求参数（如 response_format）和消息内容计算缓存键"""
+        payload = json.dumps(
+            {
+                "model": model,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "params": params or {},
+                "messages": messages,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的响应文本，未命中或已过期返回 None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, created_at = row
+            if self.ttl_seconds > 0 and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def set(self, key: str, model: str, response: str) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            model: 模型名称（仅用于排查）
+            response: 响应文本
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self.writes += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """清理过期条目并按容量淘汰（调用方需持有锁）"""
+        if self.ttl_seconds > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_responses WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+        if self.max_entries > 0:
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_responses WHERE key IN ("
+                    "SELECT key FROM llm_responses ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+    def delete(self, key: str) -> None:
+        """删除单个条目（如响应内容无法解析时）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+        logger.info(f"LLM响应缓存已清空: {self.db_path}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
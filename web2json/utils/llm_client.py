@@ -2,28 +2,73 @@
 LLM客户端封装 - 使用 LangChain 1.0
 支持基于场景的模型配置和 Token 追踪
 """
+import asyncio
+import contextlib
+import dataclasses
 import os
+import threading
+import time
+import weakref
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Literal
+from typing import Callable, List, Dict, Any, Optional, Literal
 
 import tiktoken
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from loguru import logger
 from web2json.config.settings import settings
+from web2json.utils.http_pool import http_pool
+from web2json.utils.json_repair import JSONRepairError, parse_json_tolerant
+from web2json.utils.llm_cache import LLMResponseCache
+from web2json.utils.llm_resilience import ResiliencePolicy, llm_resilience
+from web2json.utils.model_router import model_router
+from web2json.utils.rate_limiter import rate_limiter
+from web2json.utils.usage_ledger import UsageLedger, get_current_ledger
 
 # 加载项目根目录的 .env 文件
 project_root = Path(__file__).parent.parent
 env_path = project_root / ".env"
 load_dotenv(env_path)
 
-# 验证
-if not os.getenv("OPENAI_API_KEY"):
-    raise ValueError(f".env 文件路径: {env_path}, API Key未加载")
-
 # 定义场景类型
 ScenarioType = Literal["default", "code_gen", "agent"]
 
+# 结构化输出请求参数
+JSON_OBJECT_FORMAT = {"type": "json_object"}
+
+
+class GenerationAborted(Exception):
+    """流式生成过程中调用方判定输出无效，提前终止了生成"""
+
+
+class _CallAttempts:
+    """一次调用的全部尝试（含重试和对冲），每个尝试为 (输入 token, 输出 token, 命中前缀缓存的输入 token)
+
+    同步对冲中落后的请求无法中断，可能在调用已记入台账之后才返回；这样的尝试单独补记到台账
+    （不增加调用次数），被丢弃的对冲请求消耗的 token 同样计入用量和预算
+    """
+
+    def __init__(self, ledger: Optional[UsageLedger], phase: Optional[str], tier: Optional[str]):
+        self._ledger = ledger
+        self._phase = phase
+        self._tier = tier
+        self._lock = threading.Lock()
+        self._items: List[tuple] = []
+        self._closed = False
+
+    def append(self, attempt: tuple) -> None:
+        with self._lock:
+            if not self._closed:
+                self._items.append(attempt)
+                return
+        LLMClient._record_call(self._ledger, self._phase, [attempt], time.monotonic(), tier=self._tier, calls=0)
+
+    def close(self) -> List[tuple]:
+        """结束调用，返回已完成的尝试；之后完成的尝试直接补记到台账"""
+        with self._lock:
+            self._closed = True
+            return list(self._items)
+
 
 class LLMClient:
     """LLM客户端封装类 - 基于 LangChain 1.0
@@ -33,7 +78,8 @@ class LLMClient:
     2. 从Settings创建：LLMClient.from_settings(settings)
     3. 按场景创建：LLMClient.for_scenario("code_gen")
     
-    使用单例模式，同一配置的客户端会共享 token 统计
+    客户端池：按 (model, api_base, api_key, temperature) 复用实例，创建过程线程安全；
+    所有实例共享同一个 keep-alive HTTP 连接池和 token 统计
     """
     
     # 类级别的 token 统计（跨所有实例共享）
@@ -41,26 +87,51 @@ class LLMClient:
     _global_total_completion_tokens = 0
     _global_total_tokens = 0
     _global_request_count = 0
+    _usage_lock = threading.Lock()
     
-    # 单例字典，按 (model, api_base) 作为键
+    # 客户端池，按完整配置 (model, api_base, api_key, temperature) 作为键
     _instances: Dict[tuple, "LLMClient"] = {}
+    _instances_lock = threading.RLock()
+
+    # 进程级共享的响应缓存（所有 LLM 调用统一经过 chat_completion）
+    _response_cache: Optional[LLMResponseCache] = None
+    _cache_lock = threading.Lock()
+
+    # 拒绝过 response_format=json_object 的 (api_base, model)，之后不再请求结构化输出
+    _json_mode_unsupported: set = set()
+
+    # 同步调用的进程级并发上限（所有线程共享，大小取自 llm_max_concurrent_requests，0 表示不限制）
+    _sync_semaphore: Optional[threading.BoundedSemaphore] = None
+    _sync_semaphore_size: int = 0
+
+    # 异步调用的并发上限（每个事件循环一个信号量，大小取自 max_concurrent_extractions）
+    _async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+        weakref.WeakKeyDictionary()
+    )
+
+    @staticmethod
+    def _instance_key(api_key: Optional[str], api_base: Optional[str],
+                      model: Optional[str], temperature: float) -> tuple:
+        """计算客户端池的键（与 settings 中的默认值合并后）"""
+        return (
+            model or settings.default_model,
+            api_base or settings.openai_api_base,
+            api_key or settings.openai_api_key,
+            temperature,
+        )
 
     def __new__(cls, api_key: Optional[str] = None, api_base: Optional[str] = None,
                 model: Optional[str] = None, temperature: float = 0.3):
-        """使用单例模式，确保相同配置的客户端共享实例"""
-        # 获取实际的配置值（优先使用settings）
-        actual_api_base = api_base or settings.openai_api_base
-        actual_model = model or settings.default_model
+        """从客户端池获取实例，相同配置的调用方共享同一个客户端"""
+        instance_key = cls._instance_key(api_key, api_base, model, temperature)
 
-        # 使用 (model, api_base) 作为键
-        instance_key = (actual_model, actual_api_base)
+        with cls._instances_lock:
+            if instance_key not in cls._instances:
+                instance = super().__new__(cls)
+                instance._initialized = False  # 标记是否已初始化
+                cls._instances[instance_key] = instance
 
-        if instance_key not in cls._instances:
-            instance = super().__new__(cls)
-            cls._instances[instance_key] = instance
-            instance._initialized = False  # 标记是否已初始化
-
-        return cls._instances[instance_key]
+            return cls._instances[instance_key]
 
     def __init__(
         self,
@@ -77,32 +148,39 @@ class LLMClient:
             model: 模型名称
             temperature: 温度参数
         """
-        # 避免重复初始化
-        if self._initialized:
-            return
-
-        self.api_key = api_key or settings.openai_api_key
-        self.api_base = api_base or settings.openai_api_base
-        self.model = model or settings.default_model
-        self.temperature = temperature
-
-        # 初始化 tokenizer 用于本地 token 计数
-        try:
-            self.tokenizer = tiktoken.encoding_for_model(self.model)
-        except KeyError:
-            # 如果模型不在 tiktoken 的预设中，使用 cl100k_base 作为默认
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
-
-        # 使用 LangChain 1.0 的 ChatOpenAI（兼容所有模型）
-        self.client = ChatOpenAI(
-            model=self.model,
-            api_key=self.api_key,
-            base_url=self.api_base,
-            temperature=self.temperature
-        )
-
-        self._initialized = True
-        logger.info(f"LLM客户端初始化完成 - 模型: {self.model}, Base: {self.api_base}")
+        # 避免重复初始化（多个线程可能同时拿到同一个未初始化的实例）
+        with LLMClient._instances_lock:
+            if self._initialized:
+                return
+
+            self.api_key = api_key or settings.openai_api_key or os.getenv("OPENAI_API_KEY")
+            self.api_base = api_base or settings.openai_api_base
+            self.model = model or settings.default_model
+            self.temperature = temperature
+
+            # API Key 在真正创建客户端时才校验，导入模块本身不依赖 .env
+            if not self.api_key:
+                raise ValueError(f".env 文件路径: {env_path}, API Key未加载")
+
+            # 初始化 tokenizer 用于本地 token 计数
+            self.tokenizer = self._load_tokenizer(self.model)
+
+            # 使用 LangChain 1.0 的 ChatOpenAI（兼容所有模型），底层复用共享连接池
+            self.client = ChatOpenAI(
+                model=self.model,
+                api_key=self.api_key,
+                base_url=self.api_base,
+                temperature=self.temperature,
+                http_client=http_pool.get_client(),
+                max_retries=0,  # 重试由 llm_resilience 统一负责
+            )
+            # 异步调用按事件循环各持有一个客户端（异步连接不能跨事件循环复用）
+            self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ChatOpenAI]" = (
+                weakref.WeakKeyDictionary()
+            )
+
+            self._initialized = True
+            logger.info(f"LLM客户端初始化完成 - 模型: {self.model}, 温度: {self.temperature}, Base: {self.api_base}")
 
     @classmethod
     def from_settings(cls, settings, model: Optional[str] = None, temperature: Optional[float] = None):
@@ -171,6 +249,23 @@ class LLMClient:
             temperature=config["temperature"]
         )
 
+    @staticmethod
+    def _load_tokenizer(model: str):
+        """加载 tiktoken 编码，离线环境下编码文件无法下载时返回 None（改用字符数估算）"""
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # 如果模型不在 tiktoken 的预设中，使用 cl100k_base 作为默认
+            pass
+        except Exception as e:
+            logger.warning(f"tiktoken 编码加载失败，改用字符数估算 token: {e}")
+            return None
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken 编码加载失败，改用字符数估算 token: {e}")
+            return None
+
     def count_tokens(self, text: str) -> int:
         """计算文本的 token 数量
 
@@ -182,83 +277,660 @@ class LLMClient:
         """
         if not text:
             return 0
+        if self.tokenizer is None:
+            # 粗略估算：ASCII 约 4 个字符 1 个 token，其他字符（中文等）约 1 个字符 1 个 token
+            ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+            return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
         return len(self.tokenizer.encode(text))
 
-    def update_token_count(self, input_tokens: int, completion_tokens: int = 0) -> None:
+    def update_token_count(self, input_tokens: int, completion_tokens: int = 0, cached_tokens: int = 0) -> None:
         """更新 token 计数并打印统计信息
 
         Args:
             input_tokens: 输入 token 数
             completion_tokens: 输出 token 数
+            cached_tokens: 输入中命中服务端前缀缓存的 token 数
         """
-        # 更新全局统计
-        LLMClient._global_total_input_tokens += input_tokens
-        LLMClient._global_total_completion_tokens += completion_tokens
-        LLMClient._global_total_tokens = (
-            LLMClient._global_total_input_tokens + 
-            LLMClient._global_total_completion_tokens
-        )
-        LLMClient._global_request_count += 1
+        # 更新全局统计（多个线程会同时调用）
+        with LLMClient._usage_lock:
+            LLMClient._global_total_input_tokens += input_tokens
+            LLMClient._global_total_completion_tokens += completion_tokens
+            LLMClient._global_total_tokens = (
+                LLMClient._global_total_input_tokens +
+                LLMClient._global_total_completion_tokens
+            )
+            LLMClient._global_request_count += 1
+            cumulative_input = LLMClient._global_total_input_tokens
+            cumulative_completion = LLMClient._global_total_completion_tokens
+            cumulative_total = LLMClient._global_total_tokens
 
         # 按照指定格式打印 token 消耗
         logger.info(
-            f"Token usage: Input={input_tokens}, Completion={completion_tokens}, "
-            f"Cumulative Input={LLMClient._global_total_input_tokens}, "
-            f"Cumulative Completion={LLMClient._global_total_completion_tokens}, "
+            f"Token usage: Input={input_tokens}, Cached={cached_tokens}, Completion={completion_tokens}, "
+            f"Cumulative Input={cumulative_input}, "
+            f"Cumulative Completion={cumulative_completion}, "
             f"Total={input_tokens + completion_tokens}, "
-            f"Cumulative Total={LLMClient._global_total_tokens}"
+            f"Cumulative Total={cumulative_total}"
+        )
+
+    @classmethod
+    def get_response_cache(cls) -> Optional[LLMResponseCache]:
+        """获取共享的响应缓存（未启用时返回 None）"""
+        if not settings.llm_cache_enabled:
+            return None
+        with cls._cache_lock:
+            if cls._response_cache is None:
+                cls._response_cache = LLMResponseCache(
+                    db_path=settings.llm_cache_path,
+                    ttl_seconds=settings.llm_cache_ttl_seconds,
+                    max_entries=settings.llm_cache_max_entries,
+                )
+                logger.info(f"LLM响应缓存已启用: {settings.llm_cache_path}")
+            return cls._response_cache
+
+    def _get_async_client(self) -> ChatOpenAI:
+        """获取当前事件循环专用的异步 ChatOpenAI 客户端"""
+        loop = asyncio.get_running_loop()
+        with LLMClient._instances_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = ChatOpenAI(
+                    model=self.model,
+                    api_key=self.api_key,
+                    base_url=self.api_base,
+                    temperature=self.temperature,
+                    http_client=http_pool.get_client(),
+                    http_async_client=http_pool.get_async_client(),
+                    max_retries=0,
+                )
+                self._async_clients[loop] = client
+            return client
+
+    @classmethod
+    def _get_async_semaphore(cls) -> asyncio.Semaphore:
+        """获取当前事件循环的并发信号量"""
+        loop = asyncio.get_running_loop()
+        with cls._instances_lock:
+            semaphore = cls._async_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(max(1, settings.max_concurrent_extractions))
+                cls._async_semaphores[loop] = semaphore
+            return semaphore
+
+    @classmethod
+    def _request_slot(cls):
+        """占用一个同步请求并发名额（未配置上限时不限制）"""
+        size = settings.llm_max_concurrent_requests
+        if size <= 0:
+            return contextlib.nullcontext()
+        with cls._instances_lock:
+            if cls._sync_semaphore is None or cls._sync_semaphore_size != size:
+                cls._sync_semaphore = threading.BoundedSemaphore(size)
+                cls._sync_semaphore_size = size
+            return cls._sync_semaphore
+
+    def _cache_key(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        max_tokens: Optional[int] = None,
+        kwargs: Optional[Dict[str, Any]] = None
+    ) -> str:
+        effective_temperature = self.temperature if temperature is None else temperature
+        return LLMResponseCache.make_key(self.model, effective_temperature, messages, max_tokens, kwargs)
+
+    def invalidate_cached_response(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> None:
+        """删除某次请求的缓存响应（响应内容不可用时调用，避免后续重跑读到同一个坏结果）
+
+        参数需要与原请求一致（max_tokens 和 response_format 等请求参数都属于缓存键）
+        """
+        cache = self.get_response_cache()
+        if cache is not None:
+            cache.delete(self._cache_key(messages, temperature, max_tokens, kwargs))
+
+    def invalidate_cached_json_response(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        scenario: Optional[ScenarioType] = None,
+        phase: Optional[str] = None,
+        tier: Optional[str] = None,
+        **kwargs
+    ) -> None:
+        """删除某次 chat_json 请求的缓存响应（参数与 chat_json 相同；结构化输出和降级后的普通输出请求都删除）"""
+        self.invalidate_cached_response(messages, temperature, max_tokens, **kwargs)
+        self.invalidate_cached_response(messages, temperature, max_tokens, response_format=JSON_OBJECT_FORMAT, **kwargs)
+
+    def _lookup_cache(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        use_cache: bool,
+        max_tokens: Optional[int] = None,
+        kwargs: Optional[Dict[str, Any]] = None
+    ) -> tuple:
+        """查询响应缓存
+
+        Returns:
+            (cache, cache_key, cached_response)，未启用缓存时 cache 为 None
+        """
+        if not use_cache:
+            return None, None, None
+        cache = self.get_response_cache()
+        if cache is None:
+            return None, None, None
+
+        cache_key = self._cache_key(messages, temperature, max_tokens, kwargs)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"LLM响应缓存命中 - 模型: {self.model}")
+        return cache, cache_key, cached
+
+    @staticmethod
+    def _build_invoke_kwargs(
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """构建传给 invoke/ainvoke 的请求参数"""
+        invoke_kwargs = dict(kwargs)
+        if temperature is not None:
+            invoke_kwargs["temperature"] = temperature
+        if max_tokens is not None:
+            invoke_kwargs["max_tokens"] = max_tokens
+        return invoke_kwargs
+
+    def _estimate_input_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """估算消息列表的输入 token 数"""
+        input_text = ""
+        for msg in messages:
+            if isinstance(msg, dict) and 'content' in msg:
+                input_text += str(msg['content'])
+        return self.count_tokens(input_text)
+
+    # 每个请求最多附加的 cache_control 标记数（Anthropic 限制为 4 个）
+    _MAX_CACHE_BREAKPOINTS = 4
+
+    @classmethod
+    def _apply_cache_hints(cls, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """为前缀消息附加 cache_control 标记（未开启 llm_prompt_cache_hints 时原样返回）
+
+        Prompt 按 静态指令 → Schema → HTML 排列，除最后一条外的消息在同一次运行中保持不变，
+        标记在这些消息的末尾，使服务端可以缓存到每个断点为止的前缀
+        """
+        if not settings.llm_prompt_cache_hints or len(messages) < 2:
+            return messages
+
+        prefix_indexes = [
+            idx for idx, msg in enumerate(messages[:-1])
+            if isinstance(msg, dict) and isinstance(msg.get('content'), str) and msg['content']
+        ][-cls._MAX_CACHE_BREAKPOINTS:]
+        hinted = list(messages)
+        for idx in prefix_indexes:
+            hinted[idx] = {
+                **messages[idx],
+                'content': [{
+                    'type': 'text',
+                    'text': messages[idx]['content'],
+                    'cache_control': {'type': 'ephemeral'},
+                }],
+            }
+        return hinted
+
+    @staticmethod
+    def _cached_prompt_tokens(usage: Dict[str, Any]) -> int:
+        """从响应 usage 中读取命中服务端前缀缓存的输入 token 数
+
+        兼容 OpenAI（prompt_tokens_details.cached_tokens）和 DeepSeek（prompt_cache_hit_tokens）两种格式
+        """
+        details = usage.get('prompt_tokens_details') or {}
+        return details.get('cached_tokens') or usage.get('prompt_cache_hit_tokens') or 0
+
+    def _record_usage(self, messages: List[Dict[str, Any]], response) -> tuple:
+        """从响应中提取 token 使用情况并更新统计，返回 (输入 token, 输出 token, 命中缓存的输入 token)"""
+        cached_tokens = 0
+        if hasattr(response, 'response_metadata') and 'token_usage' in response.response_metadata:
+            usage = response.response_metadata['token_usage']
+            prompt_tokens = usage.get('prompt_tokens', 0)
+            completion_tokens = usage.get('completion_tokens', 0)
+            cached_tokens = self._cached_prompt_tokens(usage)
+        else:
+            # 如果无法从响应中获取，尝试估算
+            logger.warning("无法从响应中获取 token 使用信息，将进行估算")
+            prompt_tokens = self._estimate_input_tokens(messages)
+            completion_tokens = self.count_tokens(response.content)
+
+        # 更新并打印 token 统计
+        self.update_token_count(prompt_tokens, completion_tokens, cached_tokens)
+        return prompt_tokens, completion_tokens, cached_tokens
+
+    @staticmethod
+    def _record_call(
+        ledger: Optional[UsageLedger],
+        phase: Optional[str],
+        attempts: List[tuple],
+        started: float,
+        cached: bool = False,
+        tier: Optional[str] = None,
+        calls: int = 1
+    ) -> None:
+        """将一次调用（含重试和对冲的所有尝试）记录到当前任务的台账，指定档位时按档位价格计算费用"""
+        if ledger is None:
+            return
+        input_tokens = sum(prompt for prompt, _, _ in attempts)
+        completion_tokens = sum(completion for _, completion, _ in attempts)
+        ledger.record(
+            phase,
+            input_tokens=input_tokens,
+            completion_tokens=completion_tokens,
+            latency=time.monotonic() - started,
+            cached=cached,
+            cached_input_tokens=sum(cached_prompt for _, _, cached_prompt in attempts),
+            tier=tier,
+            cost=model_router.tier(tier).cost(input_tokens, completion_tokens) if tier else 0.0,
+            calls=calls,
         )
 
+    def _invoke_once(
+        self,
+        messages: List[Dict[str, Any]],
+        invoke_kwargs: Dict[str, Any],
+        estimated_tokens: int,
+        attempts: _CallAttempts
+    ):
+        """发送一次请求（单次尝试）：申请限流额度、调用模型、记录 token（追加到 attempts）"""
+        with self._request_slot():
+            # 超出 RPM/TPM 额度时在此排队等待
+            rate_limiter.acquire(estimated_tokens)
+
+            # 使用 LangChain 1.0 的 invoke 方法
+            response = self.client.invoke(self._apply_cache_hints(messages), **invoke_kwargs)
+        prompt_tokens, completion_tokens, cached_tokens = self._record_usage(messages, response)
+        attempts.append((prompt_tokens, completion_tokens, cached_tokens))
+        rate_limiter.reconcile(estimated_tokens, prompt_tokens + completion_tokens)
+        return response
+
+    async def _ainvoke_once(
+        self,
+        messages: List[Dict[str, Any]],
+        invoke_kwargs: Dict[str, Any],
+        estimated_tokens: int,
+        attempts: _CallAttempts
+    ):
+        """_invoke_once 的异步版本，占用一个并发信号量名额"""
+        async with self._get_async_semaphore():
+            await rate_limiter.aacquire(estimated_tokens)
+            response = await self._get_async_client().ainvoke(self._apply_cache_hints(messages), **invoke_kwargs)
+        prompt_tokens, completion_tokens, cached_tokens = self._record_usage(messages, response)
+        attempts.append((prompt_tokens, completion_tokens, cached_tokens))
+        rate_limiter.reconcile(estimated_tokens, prompt_tokens + completion_tokens)
+        return response
+
     def chat_completion(
         self,
         messages: List[Dict[str, Any]],
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        scenario: Optional[ScenarioType] = None,
+        phase: Optional[str] = None,
+        tier: Optional[str] = None,
         **kwargs
     ) -> str:
         """调用聊天完成API
 
+        相同 (model, temperature, max_tokens, 请求参数, messages) 的请求优先从响应缓存返回；
+        未命中时先按估算的输入 token 向全局限流器申请额度，超限则排队等待。
+        可重试错误按场景策略退避重试，端点连续失败时熔断，启用对冲时慢请求会被复制发送。
+        当前上下文绑定了用量台账时，调用前检查 token 预算，调用后按阶段记录用量
+
         Args:
             messages: 消息列表
-            temperature: 温度参数（可选）
+            temperature: 温度参数（可选，覆盖客户端默认值）
             max_tokens: 最大token数（可选）
+            use_cache: 是否使用响应缓存
+            scenario: 使用场景，决定重试/对冲策略（默认 default）
+            phase: 调用所属阶段（schema/merge/code/xpath），用于任务台账分类统计
+            tier: 调用所用的模型档位（small/default/large），用于台账按档位统计耗时和费用
             **kwargs: 其他参数
 
         Returns:
             模型响应文本
         """
+        ledger = get_current_ledger()
+        started = time.monotonic()
+        cache, cache_key, cached = self._lookup_cache(messages, temperature, use_cache, max_tokens, kwargs)
+        if cached is not None:
+            self._record_call(ledger, phase, [], started, cached=True, tier=tier)
+            return cached
+
+        invoke_kwargs = self._build_invoke_kwargs(temperature, max_tokens, kwargs)
+        estimated_tokens = self._estimate_input_tokens(messages)
+        if ledger is not None:
+            ledger.check_budget(estimated_tokens)
+
+        attempts = _CallAttempts(ledger, phase, tier)
         try:
-            # 使用 LangChain 1.0 的 invoke 方法
-            response = self.client.invoke(messages)
-            
-            # 从响应中提取 token 使用情况
-            if hasattr(response, 'response_metadata') and 'token_usage' in response.response_metadata:
-                usage = response.response_metadata['token_usage']
-                prompt_tokens = usage.get('prompt_tokens', 0)
-                completion_tokens = usage.get('completion_tokens', 0)
-                
-                # 更新并打印 token 统计
-                self.update_token_count(prompt_tokens, completion_tokens)
-            else:
-                # 如果无法从响应中获取，尝试估算
-                logger.warning("无法从响应中获取 token 使用信息，将进行估算")
-                # 估算输入 token
-                input_text = ""
-                for msg in messages:
-                    if isinstance(msg, dict) and 'content' in msg:
-                        input_text += str(msg['content'])
-                input_tokens = self.count_tokens(input_text)
-                
-                # 估算输出 token
-                completion_tokens = self.count_tokens(response.content)
-                
-                self.update_token_count(input_tokens, completion_tokens)
-            
+            response = llm_resilience.call(
+                lambda: self._invoke_once(messages, invoke_kwargs, estimated_tokens, attempts),
+                policy=ResiliencePolicy.for_scenario(scenario),
+                endpoint=self.api_base,
+                latency_key=(self.api_base, self.model),
+            )
+
+            if cache is not None:
+                cache.set(cache_key, self.model, response.content)
+
             return response.content
 
         except Exception as e:
             logger.error(f"LLM调用失败: {e}")
             raise
+        finally:
+            self._record_call(ledger, phase, attempts.close(), started, tier=tier)
+
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        scenario: Optional[ScenarioType] = None,
+        phase: Optional[str] = None,
+        tier: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """异步调用聊天完成API（与 chat_completion 共享缓存、token 统计和容错策略）
+
+        同一事件循环内的并发请求数受 max_concurrent_extractions 限制，RPM/TPM 与同步调用共享同一限流器
+
+        Args:
+            messages: 消息列表
+            temperature: 温度参数（可选，覆盖客户端默认值）
+            max_tokens: 最大token数（可选）
+            use_cache: 是否使用响应缓存
+            scenario: 使用场景，决定重试/对冲策略（默认 default）
+            phase: 调用所属阶段（schema/merge/code/xpath），用于任务台账分类统计
+            tier: 调用所用的模型档位（small/default/large），用于台账按档位统计耗时和费用
+            **kwargs: 其他参数
+
+        Returns:
+            模型响应文本
+        """
+        ledger = get_current_ledger()
+        started = time.monotonic()
+        cache, cache_key, cached = self._lookup_cache(messages, temperature, use_cache, max_tokens, kwargs)
+        if cached is not None:
+            self._record_call(ledger, phase, [], started, cached=True, tier=tier)
+            return cached
+
+        invoke_kwargs = self._build_invoke_kwargs(temperature, max_tokens, kwargs)
+        estimated_tokens = self._estimate_input_tokens(messages)
+        if ledger is not None:
+            ledger.check_budget(estimated_tokens)
+
+        attempts = _CallAttempts(ledger, phase, tier)
+        try:
+            response = await llm_resilience.acall(
+                lambda: self._ainvoke_once(messages, invoke_kwargs, estimated_tokens, attempts),
+                policy=ResiliencePolicy.for_scenario(scenario),
+                endpoint=self.api_base,
+                latency_key=(self.api_base, self.model),
+            )
+
+            if cache is not None:
+                cache.set(cache_key, self.model, response.content)
+
+            return response.content
+
+        except Exception as e:
+            logger.error(f"LLM调用失败: {e}")
+            raise
+        finally:
+            self._record_call(ledger, phase, attempts.close(), started, tier=tier)
+
+    def _stream_once(
+        self,
+        messages: List[Dict[str, Any]],
+        invoke_kwargs: Dict[str, Any],
+        estimated_tokens: int,
+        attempts: _CallAttempts,
+        on_text: Optional[Callable[[str], None]]
+    ) -> str:
+        """流式发送一次请求，每收到一块输出就把累计文本交给 on_text
+
+        on_text 抛出 GenerationAborted 时关闭连接停止生成，已生成部分按估算计入 token 统计
+        """
+        with self._request_slot():
+            return self._stream_in_slot(messages, invoke_kwargs, estimated_tokens, attempts, on_text)
+
+    def _stream_in_slot(
+        self,
+        messages: List[Dict[str, Any]],
+        invoke_kwargs: Dict[str, Any],
+        estimated_tokens: int,
+        attempts: _CallAttempts,
+        on_text: Optional[Callable[[str], None]]
+    ) -> str:
+        """_stream_once 的实际实现（已占用并发名额）"""
+        rate_limiter.acquire(estimated_tokens)
+
+        content = ""
+        usage = None
+        stream = self.client.stream(self._apply_cache_hints(messages), stream_usage=True, **invoke_kwargs)
+        try:
+            for chunk in stream:
+                if chunk.usage_metadata:
+                    usage = chunk.usage_metadata
+                if isinstance(chunk.content, str) and chunk.content:
+                    content += chunk.content
+                    if on_text is not None:
+                        on_text(content)
+        finally:
+            # 关闭生成器即关闭底层 HTTP 响应，服务端随之停止生成
+            stream.close()
+
+            if usage:
+                prompt_tokens = usage.get('input_tokens', 0)
+                completion_tokens = usage.get('output_tokens', 0)
+                cached_tokens = (usage.get('input_token_details') or {}).get('cache_read') or 0
+            else:
+                prompt_tokens = self._estimate_input_tokens(messages)
+                completion_tokens = self.count_tokens(content)
+                cached_tokens = 0
+            if content or usage:
+                self.update_token_count(prompt_tokens, completion_tokens, cached_tokens)
+                attempts.append((prompt_tokens, completion_tokens, cached_tokens))
+                rate_limiter.reconcile(estimated_tokens, prompt_tokens + completion_tokens)
+        return content
+
+    def stream_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        on_text: Optional[Callable[[str], None]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        scenario: Optional[ScenarioType] = None,
+        phase: Optional[str] = None,
+        tier: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """流式调用聊天完成API，返回完整响应文本
+
+        缓存、限流、预算检查和容错策略与 chat_completion 相同（流式请求不做对冲）。
+        on_text 在每收到一块输出时以累计文本调用，可用于增量校验和进度上报；
+        抛出 GenerationAborted 会立即关闭连接终止生成，该异常不重试、结果不缓存
+
+        Args:
+            messages: 消息列表
+            on_text: 累计文本回调（可选）
+            temperature: 温度参数（可选，覆盖客户端默认值）
+            max_tokens: 最大token数（可选）
+            use_cache: 是否使用响应缓存
+            scenario: 使用场景，决定重试策略（默认 default）
+            phase: 调用所属阶段（schema/merge/code/xpath），用于任务台账分类统计
+            tier: 调用所用的模型档位（small/default/large），用于台账按档位统计耗时和费用
+            **kwargs: 其他参数
+
+        Returns:
+            模型响应文本
+
+        Raises:
+            GenerationAborted: on_text 判定输出无效
+        """
+        ledger = get_current_ledger()
+        started = time.monotonic()
+        cache, cache_key, cached = self._lookup_cache(messages, temperature, use_cache, max_tokens, kwargs)
+        if cached is not None:
+            self._record_call(ledger, phase, [], started, cached=True, tier=tier)
+            if on_text is not None:
+                on_text(cached)
+            return cached
+
+        invoke_kwargs = self._build_invoke_kwargs(temperature, max_tokens, kwargs)
+        estimated_tokens = self._estimate_input_tokens(messages)
+        if ledger is not None:
+            ledger.check_budget(estimated_tokens)
+
+        # 流式请求的耗时取决于输出长度，复制请求只会重复消耗 token
+        policy = dataclasses.replace(ResiliencePolicy.for_scenario(scenario), hedge_enabled=False)
+        attempts = _CallAttempts(ledger, phase, tier)
+        try:
+            content = llm_resilience.call(
+                lambda: self._stream_once(messages, invoke_kwargs, estimated_tokens, attempts, on_text),
+                policy=policy,
+                endpoint=self.api_base,
+                latency_key=(self.api_base, self.model, "stream"),
+            )
+
+            if cache is not None:
+                cache.set(cache_key, self.model, content)
+
+            return content
+
+        except GenerationAborted as e:
+            logger.warning(f"流式生成已提前终止: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"LLM调用失败: {e}")
+            raise
+        finally:
+            self._record_call(ledger, phase, attempts.close(), started, tier=tier)
+
+    def _json_mode_enabled(self) -> bool:
+        return (
+            settings.llm_structured_output == "json_object"
+            and (self.api_base, self.model) not in LLMClient._json_mode_unsupported
+        )
+
+    def _disable_json_mode(self, error: Exception) -> None:
+        """后端拒绝 response_format 时记住该端点和模型，之后直接使用普通输出"""
+        with LLMClient._instances_lock:
+            LLMClient._json_mode_unsupported.add((self.api_base, self.model))
+        logger.warning(f"后端不支持结构化输出，降级为普通输出 - 模型: {self.model}: {error}")
+
+    @staticmethod
+    def _is_json_mode_rejected(error: Exception) -> bool:
+        status_code = getattr(error, "status_code", None)
+        message = str(error).lower()
+        return status_code in (400, 404, 422) and ("response_format" in message or "json_object" in message)
+
+    def _parse_json_content(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        request_kwargs: Dict[str, Any],
+        content: str
+    ) -> Any:
+        """容错解析 JSON 响应；无法解析时清除该响应的缓存后抛出 JSONRepairError"""
+        try:
+            return parse_json_tolerant(content)
+        except JSONRepairError:
+            logger.debug(f"无法解析的响应（前1000字符）: {content[:1000]}")
+            self.invalidate_cached_response(messages, temperature, max_tokens, **request_kwargs)
+            raise
+
+    def chat_json(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        scenario: Optional[ScenarioType] = None,
+        phase: Optional[str] = None,
+        tier: Optional[str] = None,
+        **kwargs
+    ) -> Any:
+        """调用模型并返回解析后的 JSON
+
+        后端支持时请求 response_format=json_object（不支持时自动降级并记住），
+        响应用容错解析器解析，截断、缺逗号等格式问题就地修复，不再整轮重跑
+
+        Returns:
+            解析后的 JSON 对象
+
+        Raises:
+            JSONRepairError: 响应中没有可修复的 JSON
+        """
+        call_kwargs = dict(
+            temperature=temperature, max_tokens=max_tokens, use_cache=use_cache,
+            scenario=scenario, phase=phase, tier=tier, **kwargs
+        )
+        json_mode = self._json_mode_enabled()
+        request_kwargs = dict(kwargs, response_format=JSON_OBJECT_FORMAT) if json_mode else dict(kwargs)
+        try:
+            if json_mode:
+                content = self.chat_completion(messages, response_format=JSON_OBJECT_FORMAT, **call_kwargs)
+            else:
+                content = self.chat_completion(messages, **call_kwargs)
+        except Exception as e:
+            if not (json_mode and self._is_json_mode_rejected(e)):
+                raise
+            self._disable_json_mode(e)
+            request_kwargs = dict(kwargs)
+            content = self.chat_completion(messages, **call_kwargs)
+        return self._parse_json_content(messages, temperature, max_tokens, request_kwargs, content)
+
+    async def achat_json(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        use_cache: bool = True,
+        scenario: Optional[ScenarioType] = None,
+        phase: Optional[str] = None,
+        tier: Optional[str] = None,
+        **kwargs
+    ) -> Any:
+        """chat_json 的异步版本"""
+        call_kwargs = dict(
+            temperature=temperature, max_tokens=max_tokens, use_cache=use_cache,
+            scenario=scenario, phase=phase, tier=tier, **kwargs
+        )
+        json_mode = self._json_mode_enabled()
+        request_kwargs = dict(kwargs, response_format=JSON_OBJECT_FORMAT) if json_mode else dict(kwargs)
+        try:
+            if json_mode:
+                content = await self.achat_completion(messages, response_format=JSON_OBJECT_FORMAT, **call_kwargs)
+            else:
+                content = await self.achat_completion(messages, **call_kwargs)
+        except Exception as e:
+            if not (json_mode and self._is_json_mode_rejected(e)):
+                raise
+            self._disable_json_mode(e)
+            request_kwargs = dict(kwargs)
+            content = await self.achat_completion(messages, **call_kwargs)
+        return self._parse_json_content(messages, temperature, max_tokens, request_kwargs, content)
 
     @classmethod
     def get_total_usage(cls) -> Dict[str, int]:
@@ -267,18 +939,45 @@ class LLMClient:
         Returns:
             包含统计信息的字典
         """
-        return {
-            "request_count": cls._global_request_count,
-            "total_input_tokens": cls._global_total_input_tokens,
-            "total_completion_tokens": cls._global_total_completion_tokens,
-            "total_tokens": cls._global_total_tokens
-        }
+        with cls._usage_lock:
+            return {
+                "request_count": cls._global_request_count,
+                "total_input_tokens": cls._global_total_input_tokens,
+                "total_completion_tokens": cls._global_total_completion_tokens,
+                "total_tokens": cls._global_total_tokens
+            }
+
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, Any]:
+        """获取响应缓存统计（命中数、未命中数、命中率等）"""
+        cache = cls.get_response_cache()
+        if cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **cache.get_stats()}
+
+    @classmethod
+    def get_pool_stats(cls) -> Dict[str, Any]:
+        """获取客户端池和 HTTP 连接复用统计"""
+        with cls._instances_lock:
+            client_count = len(cls._instances)
+        return {"clients": client_count, **http_pool.get_stats()}
+
+    @classmethod
+    def get_rate_limit_stats(cls) -> Dict[str, Any]:
+        """获取 RPM/TPM 限流统计（含排队等待时间）"""
+        return rate_limiter.get_stats()
+
+    @classmethod
+    def get_resilience_stats(cls) -> Dict[str, Any]:
+        """获取重试、对冲和熔断统计"""
+        return llm_resilience.get_stats()
 
     @classmethod
     def reset_usage(cls):
         """重置全局token使用统计"""
-        cls._global_total_input_tokens = 0
-        cls._global_total_completion_tokens = 0
-        cls._global_total_tokens = 0
-        cls._global_request_count = 0
+        with cls._usage_lock:
+            cls._global_total_input_tokens = 0
+            cls._global_total_completion_tokens = 0
+            cls._global_total_tokens = 0
+            cls._global_request_count = 0
         logger.info("Token使用统计已重置")
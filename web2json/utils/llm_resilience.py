@@ -0,0 +1,368 @@
+"""
+LLM 调用容错层
+分类重试（指数退避 + 抖动）、按端点熔断、基于 p95 延迟的对冲请求
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import httpx
+import openai
+from loguru import logger
+
+from web2json.config.settings import settings
+
+T = TypeVar("T")
+
+# 错误分类
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_SERVER = "server"
+ERROR_TIMEOUT = "timeout"
+ERROR_CONNECTION = "connection"
+ERROR_CLIENT = "client"
+
+RETRYABLE_ERRORS = {ERROR_RATE_LIMIT, ERROR_SERVER, ERROR_TIMEOUT, ERROR_CONNECTION}
+# 计入熔断的错误（429 由限流器负责，不代表端点故障）
+BREAKER_ERRORS = {ERROR_SERVER, ERROR_TIMEOUT, ERROR_CONNECTION}
+
+
+class CircuitOpenError(Exception):
+    """端点处于熔断状态，请求被直接拒绝"""
+
+
+def classify_error(exc: BaseException) -> str:
+    """将异常归类为可重试或不可重试的错误类型"""
+    if isinstance(exc, (openai.APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError)):
+        return ERROR_TIMEOUT
+    if isinstance(exc, (openai.APIConnectionError, httpx.TransportError)):
+        return ERROR_CONNECTION
+    if isinstance(exc, openai.RateLimitError):
+        return ERROR_RATE_LIMIT
+    if isinstance(exc, openai.APIStatusError):
+        if exc.status_code == 429:
+            return ERROR_RATE_LIMIT
+        if exc.status_code >= 500 or exc.status_code == 408:
+            return ERROR_SERVER
+    return ERROR_CLIENT
+
+
+def _retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """读取服务端返回的 Retry-After 头"""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+@dataclass
+class ResiliencePolicy:
+    """单个场景的容错策略"""
+    max_retries: int
+    base_delay: float
+    max_delay: float
+    hedge_enabled: bool
+    hedge_min_samples: int
+
+    @classmethod
+    def for_scenario(cls, scenario: Optional[str] = None) -> "ResiliencePolicy":
+        """从 settings 读取场景对应的策略（未知场景使用 default）"""
+        scenario_configs = {
+            "default": (settings.default_max_retries, settings.default_hedge_enabled),
+            "code_gen": (settings.code_gen_max_retries, settings.code_gen_hedge_enabled),
+            "agent": (settings.agent_max_retries, settings.agent_hedge_enabled),
+        }
+        max_retries, hedge_enabled = scenario_configs.get(scenario or "default", scenario_configs["default"])
+        return cls(
+            max_retries=max_retries,
+            base_delay=settings.llm_retry_base_delay,
+            max_delay=settings.llm_retry_max_delay,
+            hedge_enabled=hedge_enabled,
+            hedge_min_samples=settings.llm_hedge_min_samples,
+        )
+
+    def backoff_delay(self, attempt: int, exc: BaseException) -> float:
+        """第 attempt 次重试前的等待时间（full jitter），优先遵守 Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = _retry_after_seconds(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    """单个端点的熔断器
+
+    连续失败达到阈值后进入 open 状态，直接拒绝请求；
+    冷却期结束后进入 half_open，放行一个探测请求，成功则恢复，失败则重新熔断
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """是否放行本次请求"""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            tripped = self.failure_threshold > 0 and self._failures >= self.failure_threshold
+            if self._probing or tripped:
+                if self._opened_at is None or self._probing:
+                    logger.warning(f"LLM端点熔断：连续失败 {self._failures} 次，{self.reset_seconds:.0f}s 内拒绝请求")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class LLMResilience:
+    """进程级 LLM 容错执行器（熔断器和延迟统计按端点共享）"""
+
+    def __init__(self, latency_window: int = 200):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[Any, Deque[float]] = {}
+        self._latency_window = latency_window
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._rejected = 0
+
+    # ---------- 熔断与延迟统计 ----------
+
+    def get_breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=settings.llm_breaker_failure_threshold,
+                    reset_seconds=settings.llm_breaker_reset_seconds,
+                )
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def record_latency(self, latency_key: Any, seconds: float) -> None:
+        with self._lock:
+            window = self._latencies.get(latency_key)
+            if window is None:
+                window = deque(maxlen=self._latency_window)
+                self._latencies[latency_key] = window
+            window.append(seconds)
+
+    def hedge_delay(self, latency_key: Any, policy: ResiliencePolicy) -> Optional[float]:
+        """对冲请求的触发延迟（p95），样本不足或未启用时返回 None"""
+        if not policy.hedge_enabled:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies.get(latency_key, ()))
+        if len(samples) < max(policy.hedge_min_samples, 1):
+            return None
+        return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+    def _check_breaker(self, breaker: CircuitBreaker, endpoint: str) -> None:
+        if not breaker.allow():
+            with self._lock:
+                self._rejected += 1
+            raise CircuitOpenError(f"LLM端点熔断中，请求被拒绝: {endpoint}")
+
+    def _on_failure(self, breaker: CircuitBreaker, kind: str) -> None:
+        if kind in BREAKER_ERRORS:
+            breaker.record_failure()
+        else:
+            # 端点有响应（如 4xx/429），说明服务本身可用
+            breaker.record_success()
+
+    def _should_retry(self, kind: str, attempt: int, policy: ResiliencePolicy, exc: BaseException) -> Optional[float]:
+        """需要重试时返回等待秒数，否则返回 None"""
+        if kind not in RETRYABLE_ERRORS or attempt >= policy.max_retries:
+            return None
+        delay = policy.backoff_delay(attempt, exc)
+        with self._lock:
+            self._retries += 1
+        logger.warning(
+            f"LLM调用失败（{kind}），{delay:.1f}s 后第 {attempt + 1}/{policy.max_retries} 次重试: {exc}"
+        )
+        return delay
+
+    # ---------- 同步执行 ----------
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=max(settings.llm_http_max_connections, 2),
+                    thread_name_prefix="llm-hedge",
+                )
+            return self._hedge_executor
+
+    def _timed(self, fn: Callable[[], T], latency_key: Any) -> T:
+        started = time.monotonic()
+        result = fn()
+        self.record_latency(latency_key, time.monotonic() - started)
+        return result
+
+    def _call_hedged(self, fn: Callable[[], T], latency_key: Any, delay: Optional[float]) -> T:
+        if delay is None:
+            return self._timed(fn, latency_key)
+
+        executor = self._get_hedge_executor()
+        primary = executor.submit(self._timed, fn, latency_key)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        with self._lock:
+            self._hedges += 1
+        logger.info(f"LLM请求超过 p95 延迟 {delay:.1f}s，发送对冲请求")
+        hedge = executor.submit(self._timed, fn, latency_key)
+
+        # 取最先成功的结果；落后的请求无法中断，其结果被丢弃
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self._hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, fn: Callable[[], T], policy: ResiliencePolicy, endpoint: str, latency_key: Any) -> T:
+        """同步执行 fn，按策略重试、熔断和对冲"""
+        breaker = self.get_breaker(endpoint)
+        attempt = 0
+        while True:
+            self._check_breaker(breaker, endpoint)
+            try:
+                result = self._call_hedged(fn, latency_key, self.hedge_delay(latency_key, policy))
+                breaker.record_success()
+                return result
+            except Exception as e:
+                kind = classify_error(e)
+                self._on_failure(breaker, kind)
+                delay = self._should_retry(kind, attempt, policy, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    # ---------- 异步执行 ----------
+
+    async def _atimed(self, afn: Callable[[], Awaitable[T]], latency_key: Any) -> T:
+        started = time.monotonic()
+        result = await afn()
+        self.record_latency(latency_key, time.monotonic() - started)
+        return result
+
+    async def _acall_hedged(self, afn: Callable[[], Awaitable[T]], latency_key: Any, delay: Optional[float]) -> T:
+        if delay is None:
+            return await self._atimed(afn, latency_key)
+
+        primary = asyncio.ensure_future(self._atimed(afn, latency_key))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        with self._lock:
+            self._hedges += 1
+        logger.info(f"LLM请求超过 p95 延迟 {delay:.1f}s，发送对冲请求")
+        hedge = asyncio.ensure_future(self._atimed(afn, latency_key))
+
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            with self._lock:
+                                self._hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # 取消仍在进行的落后请求
+            for task in pending:
+                task.cancel()
+
+    async def acall(self, afn: Callable[[], Awaitable[T]], policy: ResiliencePolicy, endpoint: str, latency_key: Any) -> T:
+        """call 的异步版本，落后的对冲请求会被取消"""
+        breaker = self.get_breaker(endpoint)
+        attempt = 0
+        while True:
+            self._check_breaker(breaker, endpoint)
+            try:
+                result = await self._acall_hedged(afn, latency_key, self.hedge_delay(latency_key, policy))
+                breaker.record_success()
+                return result
+            except Exception as e:
+                kind = classify_error(e)
+                self._on_failure(breaker, kind)
+                delay = self._should_retry(kind, attempt, policy, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重试、对冲和熔断统计"""
+        with self._lock:
+            breakers = dict(self._breakers)
+            stats = {
+                "retries": self._retries,
+                "hedges": self._hedges,
+                "hedge_wins": self._hedge_wins,
+                "rejected_by_breaker": self._rejected,
+            }
+        stats["breakers"] = {endpoint: breaker.state for endpoint, breaker in breakers.items()}
+        return stats
+
+
+# 全局容错执行器实例
+llm_resilience = LLMResilience()
@@ -0,0 +1,171 @@
+"""
+模型路由
+按调用点（台账阶段 schema/merge/code/xpath）选择模型档位，便宜档位的输出未通过校验时才升级到更大的档位：
+
+- small:   SMALL_MODEL（未配置时与 default 相同）
+- default: DEFAULT_MODEL
+- large:   CODE_GEN_MODEL
+
+各档位的调用次数、token、耗时和费用记录到当前任务的用量台账
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from web2json.config.settings import settings
+from web2json.utils.json_repair import JSONRepairError
+from web2json.utils.usage_ledger import get_current_ledger
+
+# 模型档位（从小到大）
+TIER_SMALL = "small"
+TIER_DEFAULT = "default"
+TIER_LARGE = "large"
+TIER_ORDER = (TIER_SMALL, TIER_DEFAULT, TIER_LARGE)
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """一个模型档位"""
+    name: str
+    model: str
+    input_price: float = 0.0    # 美元 / 百万输入 token
+    output_price: float = 0.0   # 美元 / 百万输出 token
+
+    def cost(self, input_tokens: int, completion_tokens: int) -> float:
+        return (input_tokens * self.input_price + completion_tokens * self.output_price) / 1_000_000
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    """解析 "a:x,b:y" 格式的配置"""
+    pairs = {}
+    for item in value.split(","):
+        key, sep, val = item.partition(":")
+        if sep and key.strip():
+            pairs[key.strip()] = val.strip()
+    return pairs
+
+
+class ModelRouter:
+    """调用点到模型档位的路由（配置每次从 settings 读取，运行中修改 settings 立即生效）"""
+
+    def tier(self, name: str) -> ModelTier:
+        """获取档位配置，未知档位按 default 处理"""
+        models = {
+            TIER_SMALL: settings.small_model or settings.default_model,
+            TIER_DEFAULT: settings.default_model,
+            TIER_LARGE: settings.code_gen_model,
+        }
+        if name not in models:
+            name = TIER_DEFAULT
+        input_price, output_price = 0.0, 0.0
+        price = _parse_pairs(settings.llm_tier_prices).get(name)
+        if price:
+            try:
+                input_part, _, output_part = price.partition("/")
+                input_price = float(input_part)
+                output_price = float(output_part or input_part)
+            except ValueError:
+                logger.warning(f"无法解析档位 {name} 的价格配置: {price}")
+        return ModelTier(name=name, model=models[name], input_price=input_price, output_price=output_price)
+
+    def route(self, phase: str) -> str:
+        """调用点对应的档位（未配置时为 default）"""
+        tier = _parse_pairs(settings.llm_routes).get(phase, TIER_DEFAULT)
+        return tier if tier in TIER_ORDER else TIER_DEFAULT
+
+    def escalation(self, phase: str) -> List[ModelTier]:
+        """调用点的档位升级链：路由档位及更大的档位（跳过与前一档模型相同的档位）"""
+        start = TIER_ORDER.index(self.route(phase))
+        names = TIER_ORDER[start:] if settings.llm_route_fallback else TIER_ORDER[start:start + 1]
+
+        chain: List[ModelTier] = []
+        for name in names:
+            tier = self.tier(name)
+            if not chain or tier.model != chain[-1].model:
+                chain.append(tier)
+        return chain
+
+    @staticmethod
+    def client(tier: ModelTier, temperature: Optional[float] = None):
+        """获取档位对应的 LLMClient（复用客户端池）"""
+        from web2json.utils.llm_client import LLMClient
+
+        return LLMClient(
+            model=tier.model,
+            temperature=settings.default_temperature if temperature is None else temperature,
+        )
+
+    def client_for(self, phase: str, temperature: Optional[float] = None):
+        """获取调用点路由档位的 LLMClient（不需要校验升级的调用点使用）"""
+        return self.client(self.tier(self.route(phase)), temperature)
+
+    @staticmethod
+    def _on_rejected(tier: ModelTier, next_tier: ModelTier, phase: str, error: Exception) -> None:
+        ledger = get_current_ledger()
+        if ledger is not None:
+            ledger.record_fallback(tier.name)
+        logger.warning(f"{phase} 调用在 {tier.name} 档位（{tier.model}）的输出未通过校验，升级到 {next_tier.name} 档位: {error}")
+
+    def chat_json(
+        self,
+        phase: str,
+        messages: List[Dict[str, Any]],
+        validate: Optional[Callable[[Any], Any]] = None,
+        temperature: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """按路由档位调用 chat_json，输出无法解析或未通过校验时升级到下一档位
+
+        Args:
+            phase: 调用点（台账阶段）
+            messages: 消息列表
+            validate: 校验函数，不合格时抛出 ValueError，返回值作为最终结果（可选）
+            temperature: 温度参数（可选）
+            **kwargs: 传给 LLMClient.chat_json 的其他参数
+
+        Returns:
+            解析（并校验）后的 JSON
+
+        Raises:
+            ValueError: 所有档位的输出都未通过校验（含 JSONRepairError）
+        """
+        chain = self.escalation(phase)
+        for position, tier in enumerate(chain):
+            llm = self.client(tier, temperature)
+            try:
+                result = llm.chat_json(messages, temperature=temperature, phase=phase, tier=tier.name, **kwargs)
+                return validate(result) if validate is not None else result
+            except ValueError as e:
+                if not isinstance(e, JSONRepairError):
+                    # 解析成功但内容不合格的响应同样不应留在缓存里（包括最后一个档位的响应）
+                    llm.invalidate_cached_json_response(messages, temperature, **kwargs)
+                if position + 1 >= len(chain):
+                    raise
+                self._on_rejected(tier, chain[position + 1], phase, e)
+
+    async def achat_json(
+        self,
+        phase: str,
+        messages: List[Dict[str, Any]],
+        validate: Optional[Callable[[Any], Any]] = None,
+        temperature: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """chat_json 的异步版本"""
+        chain = self.escalation(phase)
+        for position, tier in enumerate(chain):
+            llm = self.client(tier, temperature)
+            try:
+                result = await llm.achat_json(messages, temperature=temperature, phase=phase, tier=tier.name, **kwargs)
+                return validate(result) if validate is not None else result
+            except ValueError as e:
+                if not isinstance(e, JSONRepairError):
+                    llm.invalidate_cached_json_response(messages, temperature, **kwargs)
+                if position + 1 >= len(chain):
+                    raise
+                self._on_rejected(tier, chain[position + 1], phase, e)
+
+
+# 全局路由实例
+model_router = ModelRouter()
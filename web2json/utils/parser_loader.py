@@ -0,0 +1,150 @@
+"""
+生成解析器的加载器
+按解析器文件的内容哈希加载模块（模块名 web2json_parser_<哈希>），不同任务的解析器不会互相覆盖，
+内容相同的解析器只执行一次模块代码。已实例化的 WebPageParser 保存在进程内的 LRU 缓存中，可跨线程复用。
+代码迭代和注册表验证中的候选解析器用 load(path, cache=False) 一次性加载，不进入缓存，也不留在 sys.modules 中
+"""
+import hashlib
+import importlib.util
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from web2json.config.settings import settings
+
+MODULE_PREFIX = "web2json_parser_"
+# 不缓存的候选解析器使用的临时模块名前缀
+CANDIDATE_PREFIX = "web2json_candidate_"
+
+
+class ParserLoader:
+    """线程安全的解析器实例 LRU 缓存
+
+    - 键: 解析器文件内容的 SHA-256（同一路径的文件被改写后自动加载新版本）
+    - 淘汰: 缓存的解析器数超过 max_size 时淘汰最久未使用的，并从 sys.modules 中移除其模块
+    - 同一个解析器并发首次加载时只执行一次模块代码；缓存中的 WebPageParser 实例由各线程共享，
+      生成的解析器应当是无状态的（parse 只依赖传入的 HTML）
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        """
+        Args:
+            max_size: 最多缓存的解析器数（默认使用 settings.parser_cache_size）
+        """
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._parsers: "OrderedDict[str, Any]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def max_size(self) -> int:
+        return max(1, self._max_size or settings.parser_cache_size)
+
+    @staticmethod
+    def _load_module(parser_path: str, module_name: str, keep: bool = True):
+        spec = importlib.util.spec_from_file_location(module_name, parser_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+            if not hasattr(module, 'WebPageParser'):
+                raise Exception("解析器中未找到WebPageParser类")
+        except BaseException:
+            sys.modules.pop(module_name, None)
+            raise
+        if not keep:
+            sys.modules.pop(module_name, None)
+        return module
+
+    def load(self, parser_path: str, cache: bool = True):
+        """
+        加载解析器实例
+
+        Args:
+            parser_path: 解析器文件路径
+            cache: 是否使用共享缓存。最终解析器使用缓存；验证中的候选解析器传 False，
+                每次以临时模块名重新加载，不占用缓存名额，也不留在 sys.modules 中
+
+        Returns:
+            WebPageParser 实例
+        """
+        if cache:
+            return self.get(parser_path)
+        module = self._load_module(parser_path, f"{CANDIDATE_PREFIX}{uuid.uuid4().hex}", keep=False)
+        return module.WebPageParser()
+
+    def get(self, parser_path: str):
+        """
+        获取解析器实例（缓存未命中时加载）
+
+        Args:
+            parser_path: 解析器文件路径
+
+        Returns:
+            WebPageParser 实例
+        """
+        digest = hashlib.sha256(Path(parser_path).read_bytes()).hexdigest()
+        with self._lock:
+            parser = self._parsers.get(digest)
+            if parser is not None:
+                self._parsers.move_to_end(digest)
+                self._hits += 1
+                return parser
+            load_lock = self._loading.setdefault(digest, threading.Lock())
+
+        with load_lock:
+            # 其他线程可能已经加载完成
+            with self._lock:
+                parser = self._parsers.get(digest)
+                if parser is not None:
+                    self._parsers.move_to_end(digest)
+                    self._hits += 1
+                    return parser
+
+            try:
+                module = self._load_module(parser_path, f"{MODULE_PREFIX}{digest[:16]}")
+                parser = module.WebPageParser()
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(digest, None)
+                raise
+
+            with self._lock:
+                self._loading.pop(digest, None)
+                self._misses += 1
+                self._parsers[digest] = parser
+                while len(self._parsers) > self.max_size:
+                    evicted, _ = self._parsers.popitem(last=False)
+                    sys.modules.pop(f"{MODULE_PREFIX}{evicted[:16]}", None)
+                    self._evictions += 1
+            return parser
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            for digest in self._parsers:
+                sys.modules.pop(f"{MODULE_PREFIX}{digest[:16]}", None)
+            self._parsers.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "cached": len(self._parsers),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# 全局解析器加载器实例
+parser_loader = ParserLoader()
@@ -0,0 +1,146 @@
+"""
+LLM 请求限流器
+基于令牌桶同时限制每分钟请求数（RPM）和每分钟 Token 数（TPM），超限时排队等待而不是报错
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict
+
+from loguru import logger
+
+from web2json.config.settings import settings
+
+
+class _TokenBucket:
+    """单个令牌桶：容量为每分钟额度，按秒匀速补充，允许预约为负数（欠额由后续等待偿还）"""
+
+    def __init__(self, per_minute: int, now: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated_at = now
+
+    def refill(self, now: float) -> None:
+        elapsed = max(now - self.updated_at, 0.0)
+        self.available = min(self.capacity, self.available + elapsed * self.rate)
+        self.updated_at = now
+
+    def take(self, amount: float) -> float:
+        """扣除额度，返回需要等待的秒数"""
+        # 单次请求超过整桶容量时按整桶计，避免永远无法满足
+        self.available -= min(amount, self.capacity)
+        if self.available >= 0:
+            return 0.0
+        return -self.available / self.rate
+
+
+class RateLimiter:
+    """进程级 RPM/TPM 限流器
+
+    - 发送前按估算的输入 Token 预约额度，需要等待时调用方阻塞（同步）或挂起（异步）
+    - 响应返回后用实际 Token 数校正 TPM 桶（补扣输出 Token 或退还多估部分）
+    - rpm/tpm 为 0 表示不限制对应维度
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._requests = _TokenBucket(rpm, now) if rpm > 0 else None
+        self._tokens = _TokenBucket(tpm, now) if tpm > 0 else None
+
+        self._acquired = 0
+        self._waited = 0
+        self._waiting = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "RateLimiter":
+        return cls(rpm=settings.llm_rate_limit_rpm, tpm=settings.llm_rate_limit_tpm)
+
+    @property
+    def enabled(self) -> bool:
+        return self._requests is not None or self._tokens is not None
+
+    def reserve(self, tokens: int) -> float:
+        """预约一次请求的额度，返回需要等待的秒数（不阻塞）"""
+        if not self.enabled:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests is not None:
+                self._requests.refill(now)
+                wait = max(wait, self._requests.take(1))
+            if self._tokens is not None:
+                self._tokens.refill(now)
+                wait = max(wait, self._tokens.take(tokens))
+
+            self._acquired += 1
+            if wait > 0:
+                self._waited += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            return wait
+
+    def acquire(self, tokens: int) -> float:
+        """同步获取额度，必要时阻塞等待，返回实际等待秒数"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"LLM限流：排队等待 {wait:.2f}s（预估 {tokens} tokens）")
+            self._enter_queue()
+            try:
+                time.sleep(wait)
+            finally:
+                self._leave_queue()
+        return wait
+
+    async def aacquire(self, tokens: int) -> float:
+        """异步获取额度，必要时挂起等待，返回实际等待秒数"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"LLM限流：排队等待 {wait:.2f}s（预估 {tokens} tokens）")
+            self._enter_queue()
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._leave_queue()
+        return wait
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """用实际消耗的 Token 数校正 TPM 桶"""
+        if self._tokens is None:
+            return
+        with self._lock:
+            self._tokens.refill(time.monotonic())
+            delta = actual_tokens - min(estimated_tokens, self._tokens.capacity)
+            self._tokens.available = min(self._tokens.capacity, self._tokens.available - delta)
+
+    def _enter_queue(self) -> None:
+        with self._lock:
+            self._waiting += 1
+
+    def _leave_queue(self) -> None:
+        with self._lock:
+            self._waiting -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计（含排队等待时间）"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "rpm": int(self._requests.capacity) if self._requests else 0,
+                "tpm": int(self._tokens.capacity) if self._tokens else 0,
+                "requests": self._acquired,
+                "waited_requests": self._waited,
+                "waiting": self._waiting,
+                "total_wait_seconds": round(self._total_wait, 3),
+                "avg_wait_seconds": round(self._total_wait / self._acquired, 3) if self._acquired else 0.0,
+                "max_wait_seconds": round(self._max_wait, 3),
+            }
+
+
+# 全局限流器实例
+rate_limiter = RateLimiter.from_settings()
@@ -0,0 +1,404 @@
+"""
+批量解析结果存储
+默认每个页面一个格式化 JSON 文件（result/<文件名>.json）。页面量很大时可以按 RESULT_FORMAT 写成分片：
+
+- jsonl:   紧凑 JSON Lines 分片（part-00000.jsonl[.gz|.zst]），每行 {"source": 源文件路径, "data": 解析结果}
+- parquet: Parquet 分片（part-00000.parquet），列类型由最终 Schema 决定（需要 pyarrow）
+
+分片达到大小上限后滚动到下一个分片，同时写入 index.jsonl 记录源文件到分片和偏移的映射
+（jsonl 为分片解压后的字节偏移，parquet 为行号）。结果以源文件的完整路径为键（不同目录下的同名文件互不覆盖），
+索引中的文件名只用于展示。下游通过 iter_results 流式读取，不需要关心存储格式；按源文件随机读取使用 ResultReader
+"""
+import gzip
+import io
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+RESULT_FORMATS = ("json", "jsonl", "parquet")
+COMPRESSIONS = ("none", "gzip", "zstd")
+INDEX_FILENAME = "index.jsonl"
+SHARD_PREFIX = "part-"
+# 结果目录中的增量解析清单（不是解析结果）
+PARSE_MANIFEST_FILENAME = "parse_manifest.json"
+
+_JSONL_SUFFIXES = {"none": ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+# Parquet 每个行组缓冲的记录数
+_PARQUET_ROW_GROUP = 1000
+
+
+def _open_shard_write(path: Path, compression: str):
+    if compression == "gzip":
+        return gzip.open(path, 'wb')
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+    return open(path, 'wb')
+
+
+def _open_shard_read(path: Path):
+    if path.name.endswith(".gz"):
+        return gzip.open(path, 'rb')
+    if path.name.endswith(".zst"):
+        import zstandard
+
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb')
+
+
+def _arrow_type(pa, field_def):
+    kind = str(field_def.get('type', '') if isinstance(field_def, dict) else '').lower()
+    if kind in ('array', 'list'):
+        return pa.list_(pa.string())
+    if kind in ('number', 'float'):
+        return pa.float64()
+    if kind in ('integer', 'int'):
+        return pa.int64()
+    if kind in ('boolean', 'bool'):
+        return pa.bool_()
+    return pa.string()
+
+
+def _as_text(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _coerce(pa, arrow_type, value):
+    """按列类型转换值；无法转换时抛出 ValueError"""
+    if value is None:
+        return None
+    if pa.types.is_list(arrow_type):
+        items = value if isinstance(value, list) else [value]
+        return [_as_text(item) for item in items]
+    if pa.types.is_floating(arrow_type):
+        return float(str(value).replace(',', '').strip()) if isinstance(value, str) else float(value)
+    if pa.types.is_integer(arrow_type):
+        number = float(str(value).replace(',', '').strip()) if isinstance(value, str) else float(value)
+        if not number.is_integer():
+            raise ValueError(f"不是整数: {value!r}")
+        return int(number)
+    if pa.types.is_boolean(arrow_type):
+        if isinstance(value, bool):
+            return value
+        if str(value).strip().lower() in ('true', 'yes', '1'):
+            return True
+        if str(value).strip().lower() in ('false', 'no', '0'):
+            return False
+        raise ValueError(f"不是布尔值: {value!r}")
+    return _as_text(value)
+
+
+def clear_shards(result_dir: Path) -> None:
+    """删除结果目录中上一次运行留下的分片和索引"""
+    result_dir = Path(result_dir)
+    for path in [*result_dir.glob(f"{SHARD_PREFIX}*"), result_dir / INDEX_FILENAME]:
+        path.unlink(missing_ok=True)
+
+
+class ResultShardWriter:
+    """分片结果写入器（单线程使用，由批量解析的主进程按完成顺序写入）"""
+
+    def __init__(
+        self,
+        result_dir: Path,
+        fmt: str = "jsonl",
+        compression: str = "none",
+        shard_size_mb: float = 256,
+        schema: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Args:
+            result_dir: 结果目录
+            fmt: jsonl / parquet
+            compression: none / gzip / zstd（jsonl 为整个分片的流式压缩，parquet 为列压缩编码）
+            shard_size_mb: 单个分片的大小上限（jsonl 按未压缩字节计，parquet 按写出的文件大小计）
+            schema: 最终 Schema（parquet 的列和类型；jsonl 不使用）
+        """
+        if fmt not in ("jsonl", "parquet"):
+            raise ValueError(f"未知的分片格式: {fmt}（可选: jsonl, parquet）")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"未知的压缩方式: {compression}（可选: {', '.join(COMPRESSIONS)}）")
+        if compression == "zstd" and fmt == "jsonl":
+            import zstandard  # noqa: F401  提前检查依赖
+        if fmt == "parquet":
+            import pyarrow  # noqa: F401
+
+        self.result_dir = Path(result_dir)
+        self.result_dir.mkdir(parents=True, exist_ok=True)
+        clear_shards(self.result_dir)
+
+        self.fmt = fmt
+        self.compression = compression
+        self.max_bytes = max(1, int(shard_size_mb * 1024 * 1024))
+        self.schema = schema or {}
+        self.records = 0
+        self.shards: List[str] = []
+        self.coerce_failures: Dict[str, int] = {}
+
+        self._index = open(self.result_dir / INDEX_FILENAME, 'w', encoding='utf-8')
+        self._shard = None
+        self._shard_path: Optional[Path] = None
+        self._shard_bytes = 0
+        self._shard_rows = 0
+        self._rows: List[Dict[str, Any]] = []
+        self._arrow_schema = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _shard_name(self) -> str:
+        suffix = ".parquet" if self.fmt == "parquet" else _JSONL_SUFFIXES[self.compression]
+        return f"{SHARD_PREFIX}{len(self.shards):05d}{suffix}"
+
+    def _open_next_shard(self) -> None:
+        self._close_shard()
+        self._shard_path = self.result_dir / self._shard_name()
+        self.shards.append(self._shard_path.name)
+        self._shard_bytes = 0
+        self._shard_rows = 0
+        if self.fmt == "jsonl":
+            self._shard = _open_shard_write(self._shard_path, self.compression)
+        else:
+            import pyarrow.parquet as pq
+
+            codec = {"none": "NONE", "gzip": "GZIP", "zstd": "ZSTD"}[self.compression]
+            self._shard = pq.ParquetWriter(str(self._shard_path), self._parquet_schema(), compression=codec)
+
+    def _close_shard(self) -> None:
+        if self._shard is None:
+            return
+        if self.fmt == "parquet":
+            self._flush_rows()
+        self._shard.close()
+        self._shard = None
+
+    def _parquet_schema(self):
+        if self._arrow_schema is None:
+            import pyarrow as pa
+
+            fields = [pa.field('source', pa.string())]
+            fields += [pa.field(name, _arrow_type(pa, field_def)) for name, field_def in self.schema.items()]
+            self._arrow_schema = pa.schema(fields)
+        return self._arrow_schema
+
+    def _flush_rows(self) -> None:
+        if not self._rows:
+            return
+        import pyarrow as pa
+
+        table = pa.Table.from_pylist(self._rows, schema=self._parquet_schema())
+        self._shard.write_table(table)
+        self._rows = []
+        self._shard_bytes = self._shard_path.stat().st_size
+
+    def _parquet_row(self, source: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        import pyarrow as pa
+
+        row = {'source': source}
+        for field in self._parquet_schema().names[1:]:
+            try:
+                row[field] = _coerce(pa, self._parquet_schema().field(field).type, data.get(field))
+            except (TypeError, ValueError):
+                row[field] = None
+                self.coerce_failures[field] = self.coerce_failures.get(field, 0) + 1
+        return row
+
+    def write(self, source: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        写入一条解析结果
+
+        Args:
+            source: 源文件路径（结果的键，批量解析传入绝对路径）
+            data: 解析结果
+
+        Returns:
+            索引记录 {'source', 'name', 'shard', 'offset'}
+        """
+        if self._shard is None or self._shard_bytes >= self.max_bytes:
+            self._open_next_shard()
+
+        if self.fmt == "jsonl":
+            line = json.dumps({'source': source, 'data': data}, ensure_ascii=False, separators=(',', ':')) + "\n"
+            payload = line.encode('utf-8')
+            offset = self._shard_bytes
+            self._shard.write(payload)
+            self._shard_bytes += len(payload)
+        else:
+            offset = self._shard_rows
+            self._rows.append(self._parquet_row(source, data))
+            self._shard_rows += 1
+            if len(self._rows) >= _PARQUET_ROW_GROUP:
+                self._flush_rows()
+
+        entry = {'source': source, 'name': Path(source).name, 'shard': self._shard_path.name, 'offset': offset}
+        self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.records += 1
+        return entry
+
+    def close(self) -> Dict[str, Any]:
+        """关闭当前分片和索引，返回写入统计"""
+        self._close_shard()
+        if not self._index.closed:
+            self._index.close()
+        if self.coerce_failures:
+            logger.warning(f"以下字段的部分值无法按 Schema 类型写入 Parquet，已写为空: {self.coerce_failures}")
+        return {
+            'format': self.fmt,
+            'compression': self.compression,
+            'records': self.records,
+            'shards': list(self.shards),
+            'index_file': str(self.result_dir / INDEX_FILENAME),
+        }
+
+
+def create_result_writer(
+    result_dir: Path,
+    fmt: str,
+    compression: str = "none",
+    shard_size_mb: float = 256,
+    schema: Optional[Dict[str, Any]] = None,
+) -> Optional[ResultShardWriter]:
+    """
+    按配置创建分片写入器；fmt 为 json 时返回 None（逐文件写入）
+
+    缺少可选依赖时降级：parquet 缺 pyarrow 改为 jsonl，zstd 缺 zstandard 改为 gzip
+    """
+    if fmt == "json":
+        clear_shards(result_dir)
+        return None
+    if fmt not in RESULT_FORMATS:
+        raise ValueError(f"未知的结果格式: {fmt}（可选: {', '.join(RESULT_FORMATS)}）")
+    try:
+        return ResultShardWriter(result_dir, fmt, compression, shard_size_mb, schema)
+    except ImportError as e:
+        if fmt == "parquet":
+            logger.warning(f"Parquet 输出需要 pyarrow（pip install pyarrow），改为 JSONL 分片: {e}")
+            return create_result_writer(result_dir, "jsonl", compression, shard_size_mb, schema)
+        logger.warning(f"zstd 压缩需要 zstandard（pip install zstandard），改为 gzip: {e}")
+        return ResultShardWriter(result_dir, fmt, "gzip", shard_size_mb, schema)
+
+
+def _shard_files(result_dir: Path) -> List[Path]:
+    return sorted(Path(result_dir).glob(f"{SHARD_PREFIX}*"))
+
+
+def _page_json_files(result_dir: Path) -> List[Path]:
+    return sorted(path for path in Path(result_dir).glob("*.json") if path.name != PARSE_MANIFEST_FILENAME)
+
+
+def result_files(result_dir: Path) -> List[Path]:
+    """结果目录中的结果文件（分片和索引，或逐页面的 JSON 文件）"""
+    result_dir = Path(result_dir)
+    shards = _shard_files(result_dir)
+    if shards:
+        index_path = result_dir / INDEX_FILENAME
+        return shards + ([index_path] if index_path.exists() else [])
+    return _page_json_files(result_dir)
+
+
+def _iter_shard(path: Path) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    if path.name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(str(path)).iter_batches():
+            for row in batch.to_pylist():
+                source = row.pop('source', None)
+                yield source, row
+        return
+    with _open_shard_read(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record.get('source'), record.get('data')
+
+
+def iter_results(result_dir: Path) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    流式读取解析结果（自动识别分片或逐文件格式）
+
+    Yields:
+        (源文件路径或结果文件名, 解析结果)；无法读取的逐页面 JSON 文件记录日志后跳过
+    """
+    result_dir = Path(result_dir)
+    shards = _shard_files(result_dir)
+    if shards:
+        for shard in shards:
+            yield from _iter_shard(shard)
+        return
+    for json_file in _page_json_files(result_dir):
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                yield json_file.name, json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"结果文件无法读取，跳过: {json_file}: {e}")
+
+
+class ResultReader:
+    """按源文件随机读取分片结果（索引在首次查询时加载一次，之后的查询直接查字典）"""
+
+    def __init__(self, result_dir: Path):
+        """
+        Args:
+            result_dir: 结果目录
+        """
+        self.result_dir = Path(result_dir)
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if self._index is None:
+            self._index = {}
+            index_path = self.result_dir / INDEX_FILENAME
+            if index_path.exists():
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            self._index[record.get('source')] = record
+        return self._index
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        """
+        读取单个源文件的解析结果（未压缩的 jsonl 分片直接定位，压缩分片需要顺序解压到偏移处）
+
+        Args:
+            source: 源文件路径（与写入时的 source 一致）
+
+        Returns:
+            解析结果；索引中没有该源文件时返回 None
+        """
+        entry = self._load_index().get(source)
+        if entry is None:
+            return None
+
+        shard_path = self.result_dir / entry['shard']
+        if shard_path.name.endswith(".parquet"):
+            for position, (_, data) in enumerate(_iter_shard(shard_path)):
+                if position == entry['offset']:
+                    return data
+            return None
+        with _open_shard_read(shard_path) as f:
+            if shard_path.suffix == ".jsonl":
+                f.seek(entry['offset'])
+            else:
+                remaining = entry['offset']
+                while remaining > 0:
+                    skipped = len(f.read(min(remaining, 1 << 20)))
+                    if not skipped:
+                        return None
+                    remaining -= skipped
+            return json.loads(f.readline()).get('data')
+
+
+def read_result(result_dir: Path, source: str) -> Optional[Dict[str, Any]]:
+    """读取单个源文件的解析结果（一次性查询；多次查询请复用 ResultReader）"""
+    return ResultReader(result_dir).get(source)
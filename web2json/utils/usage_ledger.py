@@ -0,0 +1,163 @@
+"""
+LLM 用量台账
+按一次运行（或一个 API 任务）记录每次 LLM 调用的 token、耗时和缓存命中，按阶段和模型档位汇总，并支持 token 预算
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# 阶段标签
+PHASE_SCHEMA = "schema"
+PHASE_MERGE = "merge"
+PHASE_CODE = "code"
+PHASE_XPATH = "xpath"
+PHASE_OTHER = "other"
+
+_current_ledger: contextvars.ContextVar[Optional["UsageLedger"]] = contextvars.ContextVar(
+    "web2json_usage_ledger", default=None
+)
+
+
+class BudgetExceededError(Exception):
+    """任务的 token 预算已用尽"""
+
+
+def _empty_bucket() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "cache_hits": 0,
+        "input_tokens": 0,
+        "cached_input_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "latency_seconds": 0.0,
+        "max_latency_seconds": 0.0,
+        "cost_usd": 0.0,
+    }
+
+
+class UsageLedger:
+    """线程安全的用量台账
+
+    通过 use_ledger() 绑定到当前上下文后，LLMClient 的每次调用都会记录到该台账；
+    contextvars 随 asyncio 任务和 asyncio.to_thread 传递，线程池中需用 copy_context() 显式传递
+    """
+
+    def __init__(self, budget_tokens: int = 0, name: str = ""):
+        """
+        Args:
+            budget_tokens: token 预算，0 表示不限制
+            name: 台账名称（任务ID或域名，用于日志）
+        """
+        self.budget_tokens = budget_tokens
+        self.name = name
+        self._lock = threading.Lock()
+        self._total = _empty_bucket()
+        self._phases: Dict[str, Dict[str, Any]] = {}
+        self._tiers: Dict[str, Dict[str, Any]] = {}
+        self._budget_exceeded = False
+
+    @property
+    def budget_exceeded(self) -> bool:
+        with self._lock:
+            return self._budget_exceeded
+
+    @property
+    def total_tokens(self) -> int:
+        with self._lock:
+            return self._total["total_tokens"]
+
+    def check_budget(self, estimated_tokens: int = 0) -> None:
+        """发送请求前检查预算，已用量加上预估输入超过预算时抛出 BudgetExceededError"""
+        if self.budget_tokens <= 0:
+            return
+        with self._lock:
+            spent = self._total["total_tokens"]
+            if spent + estimated_tokens > self.budget_tokens:
+                self._budget_exceeded = True
+                raise BudgetExceededError(
+                    f"Token预算超限: 已用 {spent} + 预估 {estimated_tokens} > 预算 {self.budget_tokens}"
+                    + (f"（{self.name}）" if self.name else "")
+                )
+
+    def record(
+        self,
+        phase: Optional[str],
+        input_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency: float = 0.0,
+        cached: bool = False,
+        cached_input_tokens: int = 0,
+        tier: Optional[str] = None,
+        cost: float = 0.0,
+        calls: int = 1,
+    ) -> None:
+        """记录一次调用
+
+        cached 表示命中本地响应缓存（计为一次调用，token 为 0）；
+        cached_input_tokens 是输入中命中服务端前缀缓存的部分，已包含在 input_tokens 内；
+        tier 为调用所用的模型档位（经模型路由的调用才有），cost 为按档位价格计算的费用（美元）；
+        calls 为计入的调用次数（补记已记账调用的落后对冲请求时为 0，只累加 token 和费用）
+        """
+        phase = phase or PHASE_OTHER
+        with self._lock:
+            targets = [self._phases.setdefault(phase, _empty_bucket()), self._total]
+            if tier:
+                targets.append(self._tier_bucket(tier))
+            for target in targets:
+                target["calls"] += calls
+                target["cache_hits"] += int(cached)
+                target["input_tokens"] += input_tokens
+                target["cached_input_tokens"] += cached_input_tokens
+                target["completion_tokens"] += completion_tokens
+                target["total_tokens"] += input_tokens + completion_tokens
+                target["latency_seconds"] += latency
+                target["max_latency_seconds"] = max(target["max_latency_seconds"], latency)
+                target["cost_usd"] += cost
+            if 0 < self.budget_tokens < self._total["total_tokens"]:
+                self._budget_exceeded = True
+
+    def _tier_bucket(self, tier: str) -> Dict[str, Any]:
+        bucket = self._tiers.get(tier)
+        if bucket is None:
+            bucket = self._tiers[tier] = {**_empty_bucket(), "fallbacks": 0}
+        return bucket
+
+    def record_fallback(self, tier: str) -> None:
+        """记录一次档位升级：该档位的输出未通过校验，改用更大的档位重新调用"""
+        with self._lock:
+            self._tier_bucket(tier)["fallbacks"] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出台账（可直接序列化为 JSON）"""
+        with self._lock:
+            def export(bucket: Dict[str, Any]) -> Dict[str, Any]:
+                result = dict(bucket)
+                result["latency_seconds"] = round(result["latency_seconds"], 3)
+                result["max_latency_seconds"] = round(result["max_latency_seconds"], 3)
+                result["cost_usd"] = round(result["cost_usd"], 6)
+                return result
+
+            return {
+                "budget_tokens": self.budget_tokens,
+                "budget_exceeded": self._budget_exceeded,
+                "total": export(self._total),
+                "phases": {phase: export(bucket) for phase, bucket in self._phases.items()},
+                "tiers": {tier: export(bucket) for tier, bucket in self._tiers.items()},
+            }
+
+
+def get_current_ledger() -> Optional[UsageLedger]:
+    """获取当前上下文绑定的台账"""
+    return _current_ledger.get()
+
+
+@contextmanager
+def use_ledger(ledger: UsageLedger) -> Iterator[UsageLedger]:
+    """在当前上下文中绑定台账"""
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
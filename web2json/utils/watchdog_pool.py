@@ -0,0 +1,191 @@
+"""
+带看门狗的工作进程池
+每个工作进程一次只处理一个任务，主进程监控每个任务的耗时和工作进程常驻内存（RSS）相对任务开始时的增长：
+超过时间或内存上限、或工作进程异常退出时，杀掉该进程并记录失败原因，再启动新的工作进程继续处理后续任务。
+内存上限只计单个任务期间的增长，不计与父进程共享的页面、初始化占用和之前任务留下的内存。
+
+工作进程入口的约定：worker_main(conn, *worker_args)，完成初始化后先 conn.send(WORKER_READY)，
+再循环 conn.recv() 取任务，收到 None 时退出，每个任务处理完后 conn.send(结果)
+"""
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+# 主进程检查超时和内存的间隔（秒）
+_POLL_INTERVAL = 0.05
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+# 工作进程完成初始化的就绪消息
+WORKER_READY = "__watchdog_ready__"
+
+
+def process_rss(pid: int) -> Optional[int]:
+    """进程当前的常驻内存（字节）；平台不支持（非 Linux）或进程已退出时返回 None"""
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Worker:
+    def __init__(self, ctx, worker_main: Callable, worker_args: Sequence):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(child_conn, *worker_args), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.task: Optional[int] = None
+        self.started = 0.0
+        self.baseline: Optional[int] = None
+
+    def assign(self, index: int, task: Any) -> None:
+        # 工作进程空闲（阻塞在 recv）时的 RSS 作为本任务的内存基线
+        self.baseline = process_rss(self.process.pid)
+        self.task = index
+        self.started = time.monotonic()
+        self.conn.send(task)
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+
+class WatchdogPool:
+    """按任务限制时间和内存的工作进程池"""
+
+    def __init__(
+        self,
+        worker_main: Callable,
+        worker_args: Sequence = (),
+        workers: int = 1,
+        timeout: float = 0,
+        max_rss_mb: float = 0,
+    ):
+        """
+        Args:
+            worker_main: 工作进程入口（模块级函数）
+            worker_args: 传给工作进程入口的附加参数
+            workers: 工作进程数
+            timeout: 单个任务的耗时上限（秒），0 表示不限制
+            max_rss_mb: 单个任务期间工作进程常驻内存增长的上限（MB），0 表示不限制（仅支持 Linux）
+        """
+        self.worker_main = worker_main
+        self.worker_args = tuple(worker_args)
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_rss = int(max_rss_mb * 1024 * 1024)
+        # 因超时、内存超限或异常退出而重启的工作进程数
+        self.restarts = 0
+        self._ctx = multiprocessing.get_context()
+
+    def _failure(self, worker: _Worker) -> Optional[Dict[str, Any]]:
+        """检查正在处理任务的工作进程是否超时或超出内存"""
+        elapsed = time.monotonic() - worker.started
+        if self.timeout and elapsed > self.timeout:
+            return {'reason': 'timeout', 'seconds': round(elapsed, 3), 'error': f"解析超时（超过 {self.timeout}s）"}
+        if self.max_rss and worker.baseline is not None:
+            rss = process_rss(worker.process.pid)
+            if rss is not None and rss - worker.baseline > self.max_rss:
+                return {
+                    'reason': 'memory',
+                    'seconds': round(elapsed, 3),
+                    'error': (
+                        f"内存超限（单页增长 {(rss - worker.baseline) / 1048576:.0f}MB > "
+                        f"{self.max_rss / 1048576:.0f}MB，RSS {rss / 1048576:.0f}MB）"
+                    ),
+                }
+        return None
+
+    def _start_failure(self, worker: _Worker) -> Dict[str, Any]:
+        return {
+            'reason': 'crash',
+            'seconds': 0.0,
+            'error': f"工作进程初始化失败（退出码 {worker.process.exitcode}）",
+        }
+
+    def run(self, tasks: List[Any]) -> Iterator[Tuple[int, Any, Optional[Dict[str, Any]]]]:
+        """
+        处理所有任务，按完成顺序产出结果
+
+        Yields:
+            (任务下标, 工作进程返回的结果, None) 或 (任务下标, None, 失败信息 {'reason', 'seconds', 'error'})
+        """
+        if self.max_rss and process_rss(os.getpid()) is None:
+            logger.warning("当前平台无法读取进程内存，单页内存上限不生效（仅支持 Linux）")
+
+        queue = deque(enumerate(tasks))
+        pool = [_Worker(self._ctx, self.worker_main, self.worker_args) for _ in range(min(self.workers, len(tasks)))]
+        try:
+            while True:
+                for worker in pool:
+                    if worker.ready and worker.task is None and queue:
+                        worker.assign(*queue.popleft())
+                busy = [worker for worker in pool if worker.task is not None]
+                starting = [worker for worker in pool if not worker.ready]
+                if not busy and not (starting and queue):
+                    break
+
+                ready = wait([worker.conn for worker in busy + starting], timeout=_POLL_INTERVAL)
+                for position, worker in enumerate(pool):
+                    if not worker.ready:
+                        if worker.conn not in ready:
+                            continue
+                        try:
+                            worker.ready = worker.conn.recv() == WORKER_READY
+                        except (EOFError, OSError):
+                            worker.ready = False
+                        if worker.ready:
+                            continue
+                        # 初始化失败时让一个排队任务记为失败，保证总能推进
+                        worker.kill()
+                        self.restarts += 1
+                        pool[position] = _Worker(self._ctx, self.worker_main, self.worker_args)
+                        if queue:
+                            index, _ = queue.popleft()
+                            yield index, None, self._start_failure(worker)
+                        continue
+                    if worker.task is None:
+                        continue
+                    index = worker.task
+                    if worker.conn in ready:
+                        try:
+                            result = worker.conn.recv()
+                        except (EOFError, OSError):
+                            worker.process.join(timeout=1)
+                            failure = {
+                                'reason': 'crash',
+                                'seconds': round(time.monotonic() - worker.started, 3),
+                                'error': f"工作进程异常退出（退出码 {worker.process.exitcode}）",
+                            }
+                        else:
+                            worker.task = None
+                            yield index, result, None
+                            continue
+                    else:
+                        failure = self._failure(worker)
+                        if failure is None:
+                            continue
+
+                    # 杀掉出问题的工作进程（内存超限时连同之前任务留下的内存一起回收），换一个新的继续处理后续任务
+                    worker.kill()
+                    self.restarts += 1
+                    pool[position] = _Worker(self._ctx, self.worker_main, self.worker_args)
+                    yield index, None, failure
+        finally:
+            for worker in pool:
+                worker.stop()
@@ -42,6 +42,7 @@ class ParserGenerateRequest(BaseModel):
 
     # 高级选项
     html_simplify_mode: Optional[str] = Field(None, description="HTML简化模式：xpath/aggressive/conservative")
+    token_budget: Optional[int] = Field(None, description="本任务的LLM Token预算（超出后提前终止，默认取 TASK_TOKEN_BUDGET）")
 
     class Config:
         json_schema_extra = {
@@ -98,6 +99,7 @@ class TaskStatus(BaseModel):
     completed_at: Optional[float] = Field(None, description="完成时间（Unix时间戳）")
     result: Optional[Dict[str, Any]] = Field(None, description="结果数据（仅completed状态）")
     error: Optional[str] = Field(None, description="错误信息（仅failed状态）")
+    usage: Optional[Dict[str, Any]] = Field(None, description="LLM用量台账（按阶段统计的Token、耗时、缓存命中）")
 
     class Config:
         json_schema_extra = {
@@ -109,7 +111,14 @@ class TaskStatus(BaseModel):
                 "started_at": 1704369600.0,
                 "completed_at": None,
                 "result": None,
-                "error": None
+                "error": None,
+                "usage": {
+                    "budget_tokens": 200000,
+                    "budget_exceeded": False,
+                    "total": {"calls": 4, "cache_hits": 1, "input_tokens": 52000, "completion_tokens": 6100,
+                              "total_tokens": 58100, "latency_seconds": 41.2, "max_latency_seconds": 15.8},
+                    "phases": {}
+                }
             }
         }
 
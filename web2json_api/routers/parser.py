@@ -10,12 +10,14 @@
 6. GET /results/{task_id} - 获取所有解析结果数据（JSON格式）
 """
 from fastapi import APIRouter, BackgroundTasks, WebSocket, WebSocketDisconnect, HTTPException, Query
-from fastapi.responses import FileResponse, Response, JSONResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from typing import Literal
 import logging
 import json
 from pathlib import Path
 
+from web2json.utils.result_store import iter_results
+
 from web2json_api.models.parser import (
     ParserGenerateRequest,
     ParserGenerateResponse,
@@ -294,7 +296,7 @@ async def get_task_results(task_id: str):
     获取所有解析结果数据（JSON格式）
 
     **功能：**
-    - 读取result/目录下的所有JSON文件
+    - 流式读取result/目录下的解析结果（逐文件JSON或JSONL/Parquet分片）
     - 返回所有解析结果的数组
 
     **返回：**
@@ -302,7 +304,7 @@ async def get_task_results(task_id: str):
 
     **注意：**
     - 只有completed状态的任务才能获取结果
-    - 如果文件太多，可能需要较长时间加载
+    - 结果边读边输出，count 字段位于响应末尾
     """
     logger.info(f"GET /api/parser/results/{task_id}")
 
@@ -327,26 +329,14 @@ async def get_task_results(task_id: str):
     if not result_dir.exists():
         raise HTTPException(status_code=404, detail="Result directory not found")
 
-    # 读取所有JSON文件
-    all_results = []
-    json_files = sorted(result_dir.glob("*.json"))
-
-    logger.info(f"Loading {len(json_files)} result files from {result_dir}")
-
-    for json_file in json_files:
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                all_results.append(data)
-        except Exception as e:
-            logger.error(f"Failed to load {json_file}: {e}")
-            # 跳过无法加载的文件
-            continue
-
-    logger.info(f"Successfully loaded {len(all_results)} results")
-
-    return JSONResponse(content={
-        "success": True,
-        "count": len(all_results),
-        "results": all_results
-    })
+    def stream():
+        # 逐条输出，不在内存中拼装全部结果（无法读取的结果文件由 iter_results 跳过）
+        count = 0
+        yield '{"success": true, "results": ['
+        for _, data in iter_results(result_dir):
+            yield ("," if count else "") + json.dumps(data, ensure_ascii=False)
+            count += 1
+        yield f'], "count": {count}}}'
+        logger.info(f"Streamed {count} results from {result_dir}")
+
+    return StreamingResponse(stream(), media_type="application/json")
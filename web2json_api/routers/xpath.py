@@ -108,7 +108,7 @@ async def generate_xpaths(request: XPathGenerateRequest):
         logger.info(f"收到XPath生成请求: {len(request.fields)} 个字段, {sample_count} 个样本")
 
         # 调用服务生成XPath
-        output_fields = xpath_service.generate_xpaths(
+        output_fields = await xpath_service.agenerate_xpaths(
             html_contents=request.html_contents,
             html_content=request.html_content,
             fields=request.fields,
@@ -13,6 +13,7 @@ from typing import Dict, Optional, List
 import logging
 
 from web2json.agent.orchestrator import ParserAgent
+from web2json.utils.result_store import result_files
 from web2json_api.models.parser import ParserGenerateRequest
 
 logger = logging.getLogger(__name__)
@@ -75,7 +76,8 @@ class ParserService:
             agent = ParserAgent(
                 output_dir=str(output_dir),
                 schema_mode=request.schema_mode,
-                schema_template=self._build_schema_template(request) if request.schema_mode == "predefined" else None
+                schema_template=self._build_schema_template(request) if request.schema_mode == "predefined" else None,
+                usage_ledger=task.usage_ledger
             )
 
             # 阶段2-4: 执行解析器生成
@@ -173,6 +175,9 @@ class ParserService:
             # 更新 agent 的回调函数
             agent.progress_callback = progress_callback
             agent.executor.progress_callback = progress_callback
+            # 阶段管理器在创建时已持有回调，需要一并更新（代码生成的流式进度经此推送到WebSocket）
+            agent.executor.schema_phase.progress_callback = progress_callback
+            agent.executor.code_phase.progress_callback = progress_callback
 
             # 调用ParserAgent的generate_parser方法
             result = agent.generate_parser(
@@ -195,7 +200,8 @@ class ParserService:
                 "parser_path": result.get("parser_path", ""),
                 "schema_path": result.get("config_path", ""),
                 "results_dir": result.get("results_dir", ""),
-                "parsed_files": self._get_parsed_files_info(result.get("results_dir", ""))
+                "parsed_files": self._get_parsed_files_info(result.get("results_dir", "")),
+                "usage": result.get("usage"),
             }
 
         except Exception as e:
@@ -233,7 +239,6 @@ class ParserService:
         Returns:
             List[str]: HTML文件路径列表
         """
-        html_files = []
         html_dir = output_dir / "html_original"
         html_dir.mkdir(parents=True, exist_ok=True)
 
@@ -245,17 +250,25 @@ class ParserService:
         if request.html_content:
             html_contents.append(request.html_content)
 
-        # 保存HTML内容到文件
+        # 上传内容是唯一的一份 HTML：在工作线程中一次性写入，输入清单由 ParserAgent 记录，
+        # 之后的处理（HtmlProcessor、批量解析）直接引用这些文件，不再复制
+        html_files = await asyncio.to_thread(self._write_html_files, html_contents, html_dir)
+        await self.task_manager.broadcast_log(
+            task_id,
+            "info",
+            f"Saved {len(html_files)} HTML samples"
+        )
+
+        return html_files
+
+    @staticmethod
+    def _write_html_files(html_contents: List[str], html_dir: Path) -> List[str]:
+        """写入上传的HTML内容"""
+        html_files = []
         for i, html_content in enumerate(html_contents):
             file_path = html_dir / f"sample_{i:04d}.html"
             file_path.write_text(html_content, encoding='utf-8')
             html_files.append(str(file_path))
-            await self.task_manager.broadcast_log(
-                task_id,
-                "info",
-                f"Saved HTML sample {i+1}/{len(html_contents)}"
-            )
-
         return html_files
 
     def _build_schema_template(self, request: ParserGenerateRequest) -> Optional[Dict]:
@@ -298,11 +311,11 @@ class ParserService:
             return []
 
         files_info = []
-        for json_file in sorted(results_path.glob("*.json")):
+        for result_file in result_files(results_path):
             files_info.append({
-                "filename": json_file.name,
-                "size": json_file.stat().st_size,
-                "path": str(json_file)
+                "filename": result_file.name,
+                "size": result_file.stat().st_size,
+                "path": str(result_file)
             })
 
         return files_info
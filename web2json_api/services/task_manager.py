@@ -17,6 +17,8 @@ from pathlib import Path
 from fastapi import WebSocket
 import logging
 
+from web2json.config.settings import settings
+from web2json.utils.usage_ledger import UsageLedger
 from web2json_api.models.parser import (
     ParserGenerateRequest,
     TaskStatus as TaskStatusModel,
@@ -41,6 +43,7 @@ class Task:
     cancel_flag: bool = False
     output_dir: Optional[Path] = None
     message_buffer: List[ProgressMessage] = field(default_factory=list)
+    usage_ledger: Optional[UsageLedger] = None
 
 
 class TaskManager:
@@ -83,10 +86,12 @@ class TaskManager:
         task_id = str(uuid.uuid4())
         output_dir = Path(f"output/temp_{task_id}")
 
+        budget = request.token_budget if request.token_budget is not None else settings.task_token_budget
         task = Task(
             task_id=task_id,
             request=request,
-            output_dir=output_dir
+            output_dir=output_dir,
+            usage_ledger=UsageLedger(budget_tokens=budget, name=task_id)
         )
 
         self.tasks[task_id] = task
@@ -247,7 +252,8 @@ class TaskManager:
             started_at=task.started_at,
             completed_at=task.completed_at,
             result=task.result,
-            error=task.error
+            error=task.error,
+            usage=task.usage_ledger.to_dict() if task.usage_ledger else None
         )
 
     async def add_websocket(self, task_id: str, websocket: WebSocket):
@@ -3,10 +3,16 @@ XPath生成服务
 
 支持多样本迭代学习，提高XPath准确率
 """
+import asyncio
 from typing import List, Dict, Optional
 from loguru import logger
 
-from web2json.tools.schema_extraction import enrich_schema_with_xpath, merge_multiple_schemas
+from web2json.tools.schema_extraction import (
+    enrich_schema_with_xpath,
+    merge_multiple_schemas,
+    aenrich_schema_with_xpath,
+    amerge_multiple_schemas,
+)
 from web2json_api.models.field import FieldInput, FieldOutput
 
 
@@ -57,6 +63,74 @@ class XPathService:
         logger.info(f"总共收集到 {len(samples)} 个HTML样本")
         return samples
 
+    @staticmethod
+    def _build_schema_template(fields: List[FieldInput]) -> Dict:
+        """根据用户字段构建schema模板"""
+        schema_template = {}
+        for field in fields:
+            schema_template[field.name] = {
+                "type": field.field_type,
+                "description": field.description or "",
+                "value_sample": [],
+                "xpaths": [""]
+            }
+
+        logger.info(f"Schema模板字段: {list(schema_template.keys())}")
+        return schema_template
+
+    @staticmethod
+    def _to_field_outputs(fields: List[FieldInput], final_schema: Dict) -> List[FieldOutput]:
+        """将最终schema转换回前端格式"""
+        output_fields = []
+        for field in fields:
+            field_name = field.name
+            if field_name in final_schema:
+                enriched_data = final_schema[field_name]
+
+                # 提取XPath（可能是列表，取第一个）
+                xpaths = enriched_data.get("xpaths", [""])
+                if isinstance(xpaths, list) and xpaths:
+                    xpath = xpaths[0]
+                else:
+                    xpath = str(xpaths or "")
+
+                # 提取value_sample（可能是列表或字符串）
+                value_sample_raw = enriched_data.get("value_sample", [])
+                if isinstance(value_sample_raw, list):
+                    value_sample = value_sample_raw
+                elif value_sample_raw:
+                    value_sample = [str(value_sample_raw)]
+                else:
+                    value_sample = []
+
+                output_fields.append(FieldOutput(
+                    name=field_name,
+                    description=field.description,
+                    field_type=field.field_type,
+                    xpath=xpath,
+                    value_sample=value_sample
+                ))
+            else:
+                # 如果agent没有返回该字段，使用空XPath
+                logger.warning(f"字段 {field_name} 未在返回结果中找到")
+                output_fields.append(FieldOutput(
+                    name=field_name,
+                    description=field.description,
+                    field_type=field.field_type,
+                    xpath="",
+                    value_sample=[]
+                ))
+
+        logger.success(f"成功为 {len(output_fields)} 个字段生成XPath")
+        return output_fields
+
+    @staticmethod
+    def _resolve_iteration_rounds(html_samples: List[str], iteration_rounds: Optional[int]) -> int:
+        """确定迭代轮数（None表示使用所有样本）"""
+        if iteration_rounds is None:
+            return len(html_samples)
+        return min(iteration_rounds, len(html_samples))
+
     @staticmethod
     def generate_xpaths_with_iteration(
         html_samples: List[str],
@@ -80,27 +154,12 @@ class XPathService:
             包含XPath的字段列表
         """
         try:
-            # 1. 确定迭代轮数
-            if iteration_rounds is None:
-                iteration_rounds = len(html_samples)
-            else:
-                iteration_rounds = min(iteration_rounds, len(html_samples))
-
+            iteration_rounds = XPathService._resolve_iteration_rounds(html_samples, iteration_rounds)
             logger.info(f"开始为 {len(fields)} 个字段生成XPath（使用 {iteration_rounds} 个样本）")
 
-            # 2. 构建schema模板
-            schema_template = {}
-            for field in fields:
-                schema_template[field.name] = {
-                    "type": field.field_type,
-                    "description": field.description or "",
-                    "value_sample": [],
-                    "xpaths": [""]
-                }
-
-            logger.info(f"Schema模板字段: {list(schema_template.keys())}")
+            schema_template = XPathService._build_schema_template(fields)
 
-            # 3. 对每个样本调用agent生成schema
+            # 对每个样本调用agent生成schema
             enriched_schemas = []
             for i, html_content in enumerate(html_samples[:iteration_rounds]):
                 logger.info(f"处理第 {i+1}/{iteration_rounds} 个样本...")
@@ -113,61 +172,58 @@ class XPathService:
                 enriched_schemas.append(enriched_schema)
                 logger.success(f"第 {i+1} 个样本处理完成")
 
-            # 4. 如果只有一个样本，直接使用
+            # 如果只有一个样本，直接使用；否则合并多个schema
             if len(enriched_schemas) == 1:
                 logger.info("单样本模式，直接使用生成的schema")
                 final_schema = enriched_schemas[0]
             else:
-                # 5. 合并多个schema
                 logger.info(f"合并 {len(enriched_schemas)} 个schema...")
                 final_schema = merge_multiple_schemas.invoke({
                     "schemas": enriched_schemas
                 })
                 logger.success("Schema合并完成")
 
-            # 6. 转换回前端格式
-            output_fields = []
-            for field in fields:
-                field_name = field.name
-                if field_name in final_schema:
-                    enriched_data = final_schema[field_name]
-
-                    # 提取XPath（可能是列表，取第一个）
-                    xpaths = enriched_data.get("xpaths", [""])
-                    if isinstance(xpaths, list) and xpaths:
-                        xpath = xpaths[0]
-                    else:
-                        xpath = str(xpaths or "")
-
-                    # 提取value_sample（可能是列表或字符串）
-                    value_sample_raw = enriched_data.get("value_sample", [])
-                    if isinstance(value_sample_raw, list):
-                        value_sample = value_sample_raw
-                    elif value_sample_raw:
-                        value_sample = [str(value_sample_raw)]
-                    else:
-                        value_sample = []
-
-                    output_fields.append(FieldOutput(
-                        name=field_name,
-                        description=field.description,
-                        field_type=field.field_type,
-                        xpath=xpath,
-                        value_sample=value_sample
-                    ))
-                else:
-                    # 如果agent没有返回该字段，使用空XPath
-                    logger.warning(f"字段 {field_name} 未在返回结果中找到")
-                    output_fields.append(FieldOutput(
-                        name=field_name,
-                        description=field.description,
-                        field_type=field.field_type,
-                        xpath="",
-                        value_sample=[]
-                    ))
-
-            logger.success(f"成功为 {len(output_fields)} 个字段生成XPath")
-            return output_fields
+            return XPathService._to_field_outputs(fields, final_schema)
+
+        except Exception as e:
+            logger.error(f"生成XPath失败: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+            raise Exception(f"XPath生成失败: {str(e)}")
+
+    @staticmethod
+    async def agenerate_xpaths_with_iteration(
+        html_samples: List[str],
+        fields: List[FieldInput],
+        iteration_rounds: Optional[int] = None
+    ) -> List[FieldOutput]:
+        """
+        generate_xpaths_with_iteration 的异步版本
+
+        各样本的补充请求并发发出（并发度受 max_concurrent_extractions 限制），
+        全部完成后再合并
+        """
+        try:
+            iteration_rounds = XPathService._resolve_iteration_rounds(html_samples, iteration_rounds)
+            logger.info(f"开始为 {len(fields)} 个字段生成XPath（使用 {iteration_rounds} 个样本，异步）")
+
+            schema_template = XPathService._build_schema_template(fields)
+
+            enriched_schemas = await asyncio.gather(*[
+                aenrich_schema_with_xpath(schema_template, html_content)
+                for html_content in html_samples[:iteration_rounds]
+            ])
+            logger.success(f"{len(enriched_schemas)} 个样本处理完成")
+
+            if len(enriched_schemas) == 1:
+                logger.info("单样本模式，直接使用生成的schema")
+                final_schema = enriched_schemas[0]
+            else:
+                logger.info(f"合并 {len(enriched_schemas)} 个schema...")
+                final_schema = await amerge_multiple_schemas(list(enriched_schemas))
+                logger.success("Schema合并完成")
+
+            return XPathService._to_field_outputs(fields, final_schema)
 
         except Exception as e:
             logger.error(f"生成XPath失败: {str(e)}")
@@ -204,6 +260,22 @@ class XPathService:
             html_samples, fields, iteration_rounds
         )
 
+    @staticmethod
+    async def agenerate_xpaths(
+        html_contents: Optional[List[str]],
+        html_content: Optional[str],
+        fields: List[FieldInput],
+        iteration_rounds: Optional[int] = None
+    ) -> List[FieldOutput]:
+        """generate_xpaths 的异步版本"""
+        html_samples = XPathService.collect_html_samples(
+            html_contents, html_content
+        )
+
+        return await XPathService.agenerate_xpaths_with_iteration(
+            html_samples, fields, iteration_rounds
+        )
+
 
 # 全局实例
 xpath_service = XPathService()
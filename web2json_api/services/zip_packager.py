@@ -11,6 +11,9 @@ from pathlib import Path
 from typing import Optional
 import logging
 
+from web2json.utils.input_manifest import MANIFEST_FILENAME, read_input_manifest
+from web2json.utils.result_store import result_files
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,25 +60,22 @@ class ZipPackager:
                     zf.write(schema_path, "schema.json")
                     logger.info("Added schema.json to ZIP")
 
-                # 3. 添加所有解析结果JSON
+                # 3. 添加所有解析结果（逐文件JSON，或分片和索引）
                 results_dir = output_dir / "result"
                 if results_dir.exists():
-                    for json_file in results_dir.glob("*.json"):
-                        zf.write(json_file, f"results/{json_file.name}")
-                    logger.info(f"Added {len(list(results_dir.glob('*.json')))} result files to ZIP")
+                    files = result_files(results_dir)
+                    for result_file in files:
+                        zf.write(result_file, f"results/{result_file.name}")
+                    logger.info(f"Added {len(files)} result files to ZIP")
 
                 # 4. 生成并添加README.md
                 readme_content = ZipPackager._generate_readme(parser_path, schema_path)
                 zf.writestr("README.md", readme_content)
                 logger.info("Added README.md to ZIP")
 
-                # 5. 可选：添加HTML文件
+                # 5. 可选：添加HTML文件（自包含导出，输入只以清单形式记录时从清单中的源文件读取）
                 if include_html:
-                    html_dir = output_dir / "html_original"
-                    if html_dir.exists():
-                        for html_file in html_dir.glob("*.html"):
-                            zf.write(html_file, f"html_original/{html_file.name}")
-                        logger.info("Added original HTML files to ZIP")
+                    ZipPackager._add_html_files(zf, output_dir)
 
             logger.info(f"ZIP file created successfully: {zip_path} ({zip_path.stat().st_size} bytes)")
             return zip_path
@@ -84,6 +84,31 @@ class ZipPackager:
             logger.error(f"Failed to create ZIP file: {e}", exc_info=True)
             raise
 
+    @staticmethod
+    def _add_html_files(zf: zipfile.ZipFile, output_dir: Path) -> None:
+        """
+        将原始HTML写入ZIP的 html_original/ 目录
+
+        优先使用输入清单（input_manifest.jsonl）中的源文件，没有清单时使用 html_original 目录
+
+        Args:
+            zf: ZIP文件
+            output_dir: 输出目录
+        """
+        manifest_path = output_dir / MANIFEST_FILENAME
+        if manifest_path.exists():
+            html_paths = [Path(entry['path']) for entry in read_input_manifest(manifest_path)]
+        else:
+            html_paths = sorted((output_dir / "html_original").glob("*.html"))
+
+        added = set()
+        for html_path in html_paths:
+            if html_path.name in added or not html_path.exists():
+                continue
+            zf.write(html_path, f"html_original/{html_path.name}")
+            added.add(html_path.name)
+        logger.info(f"Added {len(added)} original HTML files to ZIP")
+
     @staticmethod
     def _generate_readme(parser_path: Path, schema_path: Path) -> str:
         """
@@ -106,7 +131,7 @@ This ZIP file contains the generated parser and parsed results.
 parser_results.zip
 ├── parser.py              # Python parser code (ready to use)
 ├── schema.json            # Field definitions and XPath expressions
-├── results/               # Parsed JSON results (one per input HTML)
+├── results/               # Parsed results (one JSON per input HTML, or shards)
 │   ├── sample_0000.json
 │   ├── sample_0001.json
 │   └── ...
@@ -146,6 +171,10 @@ python parser.py <html_file_or_url>
 All HTML files have been parsed and results are in the `results/` directory.
 Each JSON file corresponds to one input HTML file.
 
+For large runs the results may be sharded instead (`part-00000.jsonl[.gz|.zst]` or
+`part-00000.parquet`). Each JSON Lines record is `{"source": <html file>, "data": {...}}`,
+and `index.jsonl` maps every source file to its shard and offset.
+
 ## Schema
 
 The `schema.json` file contains field definitions including: